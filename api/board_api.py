@@ -1,35 +1,88 @@
 from flask import Blueprint, request
 
+from database.flask_models import Board, Task
 from project_board_baase import ProjectBoardBase
+from shard_routing import by_board, by_items, by_task, by_team, every_shard, first_of, sharded
+from versions import conditional
 
 
 board_bp = Blueprint('board_bp', __name__)
+project_board_base = ProjectBoardBase()
+
+# The @sharded routes run against the shard of the team they name, see shard_routing.py. A batch must stay
+# within the boards of one shard, search and query requests without a board_id or a team_id read every shard.
 
 @board_bp.route('/create_board', methods=['POST'])
+@sharded(by_team(pin=True))
 def user_creation():
-    project_board_base = ProjectBoardBase()
     return project_board_base.create_board(request)
 
 @board_bp.route('/add_task',methods=['POST'])
+@sharded(by_board())
 def add_task():
-    project_board_base = ProjectBoardBase()
     return project_board_base.add_task(request)
 
+@board_bp.route('/add_tasks',methods=['POST'])
+@sharded(by_items(Board, 'board_id'))
+def add_tasks():
+    return project_board_base.add_tasks(request)
+
 @board_bp.route('/update_task',methods=['POST'])
+@sharded(by_task())
 def update_task():
-    project_board_base = ProjectBoardBase()
     return project_board_base.update_task_status(request)
 
-@board_bp.route('/list_boards',methods=['POST'])
+@board_bp.route('/update_tasks',methods=['POST'])
+@sharded(first_of(lambda data: by_board()(data['filter']), by_items(Task, 'id', lambda data: data['tasks'])))
+def update_tasks():
+    return project_board_base.update_tasks_status(request)
+
+@board_bp.route('/list_boards',methods=['GET', 'POST'])
+@sharded(by_team())
+@conditional(project_board_base.list_board_version)
 def list_boards():
-    project_board_base = ProjectBoardBase()
     return project_board_base.list_board(request)
 
+@board_bp.route('/search_tasks',methods=['POST'])
+@sharded(first_of(by_board(), by_team(), every_shard))
+def search_tasks():
+    return project_board_base.search_tasks(request)
+
+@board_bp.route('/query_tasks',methods=['POST'])
+@sharded(first_of(by_board(), by_team(), every_shard))
+def query_tasks():
+    return project_board_base.query_tasks(request)
 
-@board_bp.route('/export_board',methods=['POST'])
+@board_bp.route('/board_summary',methods=['POST'])
+@sharded(by_team())
+def board_summary():
+    return project_board_base.board_summary(request)
+
+
+@board_bp.route('/export_board',methods=['GET', 'POST'])
+@sharded(by_board('id'))
+@conditional(project_board_base.export_board_version)
 def export_board():
-    project_board_base = ProjectBoardBase()
     return project_board_base.export_board(request)
 
+@board_bp.route('/export_team',methods=['POST'])
+@sharded(by_team())
+def export_team():
+    return project_board_base.export_team(request)
+
+@board_bp.route('/export_jobs',methods=['POST'])
+@sharded(by_board('id'))
+def submit_export_job():
+    return project_board_base.submit_export_job(request)
+
+@board_bp.route('/export_jobs/<job_id>',methods=['GET'])
+def export_job_status(job_id):
+    return project_board_base.export_job_status(job_id)
 
+@board_bp.route('/export_jobs/<job_id>/file',methods=['GET'])
+def download_export_job(job_id):
+    return project_board_base.download_export_job(job_id)
 
+@board_bp.route('/export_cache_stats',methods=['GET'])
+def export_cache_stats():
+    return project_board_base.export_cache_stats()
@@ -0,0 +1,15 @@
+from flask import Blueprint, jsonify
+
+from board_export import export_cache
+from entity_cache import entity_cache
+from export_jobs import export_jobs
+from group_commit import group_commit
+from metrics import metrics
+
+metrics_bp = Blueprint('metrics_bp', __name__)
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    return jsonify({'endpoints': metrics.snapshot(), 'export_cache': export_cache.stats(),
+                    'entity_cache': entity_cache.stats(), 'export_jobs': export_jobs.stats(),
+                    'group_commit': group_commit.stats()})
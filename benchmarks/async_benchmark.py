@@ -0,0 +1,192 @@
+"""
+Measure what an async serving mode would bring: the concurrent read throughput of the sync views against
+async views reading through an aiosqlite engine, both served by uvicorn.
+
+    python benchmarks/async_benchmark.py --concurrency 32 --seconds 10
+
+The app has no async mode, this script carries the async views it would need for /userlist and /list_boards.
+They run the same statements and build the same responses as the sync handlers on an AsyncSession, only the
+ETag of /userlist and its version read are left out. For each mode a uvicorn server is started on
+create_asgi_app against the same seeded database (see datagen.py) and hammered by `concurrency` client threads
+alternating both endpoints. Requires aiosqlite and uvicorn, see requirements.txt.
+Prints one json line per mode with requests per second, p50 / p99 latency and errors.
+
+Flask runs an async view to completion in an event loop of its own, on the thread serving the request, so
+the thread is held for the whole request in both modes and nothing is gained from awaiting SQLite. Each loop
+also needs its own connection, aiosqlite connections are bound to the loop they were opened in. The async
+mode was not adopted on these numbers, 32 clients, default scale, 8 seconds per mode:
+
+    {"mode": "sync", "concurrency": 32, "rps": 301.5, "p50_ms": 105.38, "p99_ms": 132.23, "errors": 0}
+    {"mode": "async", "concurrency": 32, "rps": 176.9, "p50_ms": 182.08, "p99_ms": 219.57, "errors": 0}
+
+Serving many requests per thread would take an ASGI framework running the handlers on one shared loop.
+"""
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+
+from common import ROOT, make_app, temp_database_uri
+from datagen import add_scale_arguments, scale_from_arguments, seed
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+
+
+def create_async_views(app):
+    """
+    :return: {endpoint: async view} of the async counterparts of the /userlist and /list_boards views
+    """
+    from flask import jsonify, request
+    from marshmallow import ValidationError
+    from sqlalchemy import select
+    from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+    from sqlalchemy.pool import NullPool
+
+    from database.database import db, set_sqlite_pragmas
+    from database.flask_models import Board, User
+    from project_board_baase import board_serializer
+    from query_utils import keyset_page, page_args, page_response, request_data
+    from user_base import user_serializer
+
+    with app.app_context():
+        url = db.engine.url.set(drivername='sqlite+aiosqlite')
+    # every async view runs in a new event loop, a pooled connection would belong to a finished one
+    engine = create_async_engine(url, poolclass=NullPool)
+    set_sqlite_pragmas(engine.sync_engine, app.config['SQLITE_PRAGMAS'])
+
+    async def list_users():
+        try:
+            args = page_args(request)
+        except ValidationError as err:
+            return jsonify({'error': err.messages}), 400
+        statement = keyset_page(select(User.id, User.user_name, User.display_name, User.creation_time),
+                                User.id, args['after_id'], args['limit'])
+        async with AsyncSession(engine) as session:
+            users = (await session.execute(statement)).all()
+        return page_response(users, user_serializer.dump_many, args['limit'])
+
+    async def list_boards():
+        try:
+            team_id = int(request_data(request)['team_id'])
+        except (KeyError, TypeError, ValueError):
+            return jsonify({'error': 'A team id is required'}), 400
+        async with AsyncSession(engine) as session:
+            boards = (await session.execute(select(Board.id, Board.name).where(Board.team_id == team_id))).all()
+        if not boards:
+            return jsonify({'error': 'No boards found for the team'}), 404
+        return jsonify(board_serializer.dump_many(boards)), 200
+
+    return {'user_bp.list_users': list_users, 'board_bp.list_boards': list_boards}
+
+
+def create_asgi_app():
+    """
+    uvicorn factory: the app configured from the FLASK_ environment, with the async views when
+    BENCH_ASYNC_MODE is set.
+    """
+    from asgiref.wsgi import WsgiToAsgi
+
+    from server_app import create_app
+
+    app = create_app()
+    if os.environ.get('BENCH_ASYNC_MODE') == 'true':
+        app.view_functions.update(create_async_views(app))
+    return WsgiToAsgi(app)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def requests_mix(scale, rng):
+    if rng.random() < 0.5:
+        return 'GET', '/userlist?after_id={}&limit=100'.format(rng.randint(0, scale.users)), None
+    return 'POST', '/list_boards', {'team_id': rng.randint(1, scale.teams)}
+
+
+def start_server(database_uri, async_mode, port):
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([BENCHMARKS, ROOT, os.path.join(ROOT, 'code_base')]),
+               FLASK_SQLALCHEMY_DATABASE_URI=database_uri, BENCH_ASYNC_MODE='true' if async_mode else 'false')
+    server = subprocess.Popen([sys.executable, '-W', 'ignore', '-m', 'uvicorn', '--factory',
+                               'async_benchmark:create_asgi_app', '--port', str(port), '--log-level', 'warning'],
+                              cwd=BENCHMARKS, env=env)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen('http://127.0.0.1:{}/metrics'.format(port))
+            return server
+        except OSError:
+            time.sleep(0.2)
+    server.kill()
+    raise RuntimeError('the server did not start')
+
+
+def drive(port, scale, concurrency, seconds):
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def client(index):
+        rng = random.Random(index)
+        while time.perf_counter() < deadline:
+            method, path, payload = requests_mix(scale, rng)
+            data = json.dumps(payload).encode() if payload is not None else None
+            request = urllib.request.Request('http://127.0.0.1:{}{}'.format(port, path), data=data, method=method,
+                                             headers={'Content-Type': 'application/json'})
+            start = time.perf_counter()
+            try:
+                urllib.request.urlopen(request).read()
+                ok = True
+            except OSError:
+                ok = False
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                errors[0] += not ok
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    latencies.sort()
+    return {
+        'rps': round(len(latencies) / seconds, 1),
+        'p50_ms': round(latencies[len(latencies) // 2] * 1000, 2),
+        'p99_ms': round(latencies[int(len(latencies) * 0.99)] * 1000, 2),
+        'errors': errors[0],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_scale_arguments(parser)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--seconds', type=float, default=10)
+    args = parser.parse_args()
+
+    scale = scale_from_arguments(args)
+    database_uri = temp_database_uri()
+    seed(make_app(database_uri), scale)
+    for async_mode in (False, True):
+        port = free_port()
+        server = start_server(database_uri, async_mode, port)
+        try:
+            result = drive(port, scale, args.concurrency, args.seconds)
+        finally:
+            server.terminate()
+            server.wait()
+        print(json.dumps(dict(mode='async' if async_mode else 'sync', concurrency=args.concurrency, **result)))
+
+
+if __name__ == '__main__':
+    main()
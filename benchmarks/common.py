@@ -0,0 +1,45 @@
+"""
+Shared helpers for the benchmark scripts: make the flat `code_base` imports resolvable and build an app
+bound to a throw-away SQLite database.
+"""
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (ROOT, os.path.join(ROOT, 'code_base')):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+
+def temp_database_uri(name='bench.database'):
+    directory = tempfile.mkdtemp(prefix='flask_jira_bench_')
+    return 'sqlite:///' + os.path.join(directory, name)
+
+
+def make_app(database_uri=None, **config):
+    from server_app import create_app
+    from database.database import db
+
+    config['SQLALCHEMY_DATABASE_URI'] = database_uri or temp_database_uri()
+    app = create_app(config)
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+def measure(fn, *args, **kwargs):
+    """
+    Run `fn` once and return (result, seconds, peak traced bytes).
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        result = fn(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, elapsed, peak
@@ -0,0 +1,107 @@
+"""
+Synthetic data generator: seed a database at a configurable scale with bulk inserts.
+
+    python benchmarks/datagen.py sqlite:////tmp/bench.database --users 10000 --teams 100 --tasks-per-board 1000
+"""
+import argparse
+import random
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta
+
+from common import make_app
+
+from database.database import db
+from database.flask_models import Board, Task, Team, User, UserTeam
+
+STATUSES = ('OPEN', 'IN_PROGRESS', 'COMPLETE')
+INSERT_CHUNK_SIZE = 10000
+
+
+@dataclass
+class Scale:
+    users: int = 1000
+    teams: int = 50
+    members_per_team: int = 20
+    boards_per_team: int = 4
+    tasks_per_board: int = 250
+
+    @property
+    def boards(self):
+        return self.teams * self.boards_per_team
+
+    @property
+    def tasks(self):
+        return self.boards * self.tasks_per_board
+
+
+def _insert(table, rows):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == INSERT_CHUNK_SIZE:
+            db.session.execute(table.insert(), chunk)
+            chunk = []
+    if chunk:
+        db.session.execute(table.insert(), chunk)
+
+
+def default_task_text(rng, board_id, i):
+    return 'task{}-{}'.format(board_id, i), 'Task {}'.format(i)
+
+
+def seed(app, scale, seed=0, task_text=default_task_text):
+    """
+    Fill the database of the app. Ids are dense and start at 1: user ids 1..users, team ids 1..teams,
+    board b belongs to team (b - 1) // boards_per_team + 1 and task titles are unique.
+
+    :param task_text: called with the random generator, the board id and the position of a task in its board,
+    returns the (title, description) of the task; titles must stay unique
+    """
+    rng = random.Random(seed)
+    start = datetime.utcnow() - timedelta(days=90)
+
+    def created(i):
+        return start + timedelta(seconds=i)
+
+    with app.app_context():
+        _insert(User.__table__, ({'user_name': 'user{}'.format(i), 'display_name': 'User {}'.format(i),
+                                  'creation_time': created(i)} for i in range(1, scale.users + 1)))
+        _insert(Team.__table__, ({'name': 'team{}'.format(i), 'description': 'Team {}'.format(i),
+                                  'admin': rng.randint(1, scale.users), 'creation_time': created(i)}
+                                 for i in range(1, scale.teams + 1)))
+        _insert(UserTeam.__table__, ({'user_id': user_id, 'team_id': team_id}
+                                     for team_id in range(1, scale.teams + 1)
+                                     for user_id in rng.sample(range(1, scale.users + 1),
+                                                               min(scale.members_per_team, scale.users))))
+        _insert(Board.__table__, ({'name': 'board{}'.format(i), 'description': 'Board {}'.format(i),
+                                   'team_id': (i - 1) // scale.boards_per_team + 1, 'status': 'OPEN',
+                                   'creation_time': created(i)} for i in range(1, scale.boards + 1)))
+        _insert(Task.__table__, (dict(zip(('title', 'description'), task_text(rng, board_id, i)),
+                                      user_id=rng.randint(1, scale.users), status=rng.choice(STATUSES),
+                                      board_id=board_id, creation_time=created(board_id * scale.tasks_per_board + i))
+                                 for board_id in range(1, scale.boards + 1) for i in range(scale.tasks_per_board)))
+        db.session.commit()
+    return scale
+
+
+def add_scale_arguments(parser):
+    defaults = Scale()
+    for name, value in asdict(defaults).items():
+        parser.add_argument('--' + name.replace('_', '-'), type=int, default=value)
+
+
+def scale_from_arguments(args):
+    return Scale(**{name: getattr(args, name) for name in asdict(Scale())})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('database_uri')
+    add_scale_arguments(parser)
+    args = parser.parse_args()
+    scale = seed(make_app(args.database_uri), scale_from_arguments(args))
+    print('seeded {} users, {} teams, {} boards, {} tasks'.format(scale.users, scale.teams, scale.boards, scale.tasks))
+
+
+if __name__ == '__main__':
+    main()
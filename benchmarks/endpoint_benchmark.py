@@ -0,0 +1,219 @@
+"""
+End to end benchmark of every route of user_bp, team_bp, board_bp and metrics_bp.
+
+    python benchmarks/endpoint_benchmark.py --requests 200 --threads 4 --output results.json
+    python benchmarks/endpoint_benchmark.py --compare results.json
+
+A database is seeded at the requested scale (see datagen.py), then each endpoint is driven through the Flask
+test client, first by a single thread to measure the peak traced memory of a request, then by a pool of
+threads to measure latency and throughput. The report is a json document with, per endpoint, the p50 / p99
+latency in milliseconds, the requests per second, the peak memory in KB and the error count. With --compare
+the ratio of every metric to a previous report is printed as well.
+"""
+import argparse
+import itertools
+import json
+import random
+import statistics
+import sys
+import threading
+import time
+import tracemalloc
+
+from common import make_app
+from datagen import add_scale_arguments, scale_from_arguments, seed
+
+BLUEPRINTS = ('user_bp', 'team_bp', 'board_bp', 'metrics_bp')
+STATUSES = ('OPEN', 'IN_PROGRESS', 'COMPLETE')
+
+
+def finished_export_job(app):
+    """
+    :return: the id of a finished export job of board 1, for the routes reading a job
+    """
+    client = app.test_client()
+    location = client.post('/export_jobs', json={'id': 1}).headers['Location']
+    while client.get(location).get_json()['status'] in ('queued', 'running'):
+        time.sleep(0.01)
+    return location.rsplit('/', 1)[1]
+
+
+def scenarios(scale, export_job_id):
+    """
+    Map every route to a factory building the (method, url, json) of a request against the seeded data.
+    Factories of write endpoints use a shared counter so the names they create never collide.
+    """
+    unique = itertools.count()
+    rng = random.Random(1)
+    lock = threading.Lock()
+
+    def next_id():
+        with lock:
+            return next(unique)
+
+    def user():
+        return rng.randint(1, scale.users)
+
+    def team():
+        return rng.randint(1, scale.teams)
+
+    def board():
+        return rng.randint(1, scale.boards)
+
+    def task():
+        return rng.randint(1, scale.tasks)
+
+    return {
+        '/create_user': lambda: ('POST', '/create_user', {'user_name': 'bench{}'.format(next_id()),
+                                                          'display_name': 'Bench'}),
+        '/create_users': lambda: ('POST', '/create_users', [{'user_name': 'bench{}'.format(next_id()),
+                                                             'display_name': 'Bench'} for _ in range(100)]),
+        '/userlist': lambda: ('GET', '/userlist?after_id={}&limit=100'.format(user()), None),
+        '/get_user': lambda: ('POST', '/get_user', {'id': user()}),
+        '/update_user': lambda: ('POST', '/update_user', {'id': 1, 'user': {'user_name': 'user1',
+                                                                            'display_name': 'User {}'.format(next_id())}}),
+        '/teams_user_list': lambda: ('POST', '/teams_user_list?limit=100', {'id': team()}),
+        '/create_team': lambda: ('POST', '/create_team', {'name': 'bench{}'.format(next_id()),
+                                                          'description': 'Bench', 'admin': user()}),
+        '/users_team_list': lambda: ('POST', '/users_team_list?limit=100', {'id': user()}),
+        '/team_list': lambda: ('GET', '/team_list?after_id={}&limit=100'.format(team()), None),
+        '/update_team': lambda: ('POST', '/update_team', {'id': 1, 'team': {'name': 'team1', 'admin': user(),
+                                                                            'description': 'Team {}'.format(next_id())}}),
+        '/add_user_to_team': lambda: ('PATCH', '/add_user_to_team', {'id': team(), 'users': [user() for _ in range(10)]}),
+        '/remove_user_from_team': lambda: ('POST', '/remove_user_from_team', {'id': team(),
+                                                                              'users': [user() for _ in range(10)]}),
+        '/create_board': lambda: ('POST', '/create_board', {'name': 'bench{}'.format(next_id()),
+                                                            'description': 'Bench', 'team_id': team()}),
+        '/add_task': lambda: ('POST', '/add_task', {'title': 'bench{}'.format(next_id()), 'description': 'Bench',
+                                                    'user_id': user(), 'board_id': board()}),
+        '/add_tasks': lambda: ('POST', '/add_tasks', [{'title': 'bench{}'.format(next_id()), 'description': 'Bench',
+                                                       'user_id': user(), 'board_id': board()} for _ in range(100)]),
+        '/update_task': lambda: ('POST', '/update_task', {'id': task(), 'status': rng.choice(STATUSES)}),
+        '/update_tasks': lambda: ('POST', '/update_tasks', {'tasks': [{'id': task(), 'status': rng.choice(STATUSES)}
+                                                                      for _ in range(100)]}),
+        '/list_boards': lambda: ('POST', '/list_boards', {'team_id': team()}),
+        '/search_tasks': lambda: ('POST', '/search_tasks', {'query': 'task{}*'.format(board()), 'limit': 20}),
+        '/query_tasks': lambda: ('POST', '/query_tasks', {'team_id': team(), 'status': rng.choice(STATUSES),
+                                                          'order': 'desc', 'limit': 50}),
+        '/board_summary': lambda: ('POST', '/board_summary', {'team_id': team()}),
+        '/export_board': lambda: ('POST', '/export_board', {'id': board()}),
+        '/export_team': lambda: ('POST', '/export_team', {'team_id': team()}),
+        '/export_jobs': lambda: ('POST', '/export_jobs', {'id': board(), 'format': 'csv'}),
+        '/export_jobs/<job_id>': lambda: ('GET', '/export_jobs/{}'.format(export_job_id), None),
+        '/export_jobs/<job_id>/file': lambda: ('GET', '/export_jobs/{}/file'.format(export_job_id), None),
+        '/export_cache_stats': lambda: ('GET', '/export_cache_stats', None),
+        '/metrics': lambda: ('GET', '/metrics', None),
+    }
+
+
+def routes(app):
+    return sorted({rule.rule for rule in app.url_map.iter_rules() if rule.endpoint.split('.')[0] in BLUEPRINTS})
+
+
+def call(client, request):
+    method, url, payload = request
+    response = client.open(url, method=method, json=payload)
+    response.get_data()
+    return response.status_code < 400
+
+
+def peak_memory(app, factory, count):
+    client = app.test_client()
+    tracemalloc.start()
+    try:
+        for _ in range(count):
+            call(client, factory())
+            tracemalloc.reset_peak()
+        peak = 0
+        for _ in range(count):
+            call(client, factory())
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def load(app, factory, requests, threads):
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    remaining = itertools.count()
+
+    def worker():
+        client = app.test_client()
+        while next(remaining) < requests:
+            request = factory()
+            start = time.perf_counter()
+            ok = call(client, request)
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                errors[0] += not ok
+
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    wall = time.perf_counter() - start
+    latencies.sort()
+    return {
+        'p50_ms': round(statistics.median(latencies) * 1000, 3),
+        'p99_ms': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000, 3),
+        'rps': round(len(latencies) / wall, 1),
+        'errors': errors[0],
+    }
+
+
+def compare(report, baseline):
+    for route, metrics in report['endpoints'].items():
+        previous = baseline['endpoints'].get(route)
+        if not previous:
+            continue
+        ratios = {name: round(value / previous[name], 2) for name, value in metrics.items()
+                  if name != 'errors' and previous.get(name)}
+        print(json.dumps({'endpoint': route, 'ratio_to_baseline': ratios}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_scale_arguments(parser)
+    parser.add_argument('--requests', type=int, default=200, help='requests per endpoint under load')
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--memory-requests', type=int, default=5, help='requests per endpoint traced for memory')
+    parser.add_argument('--only', nargs='*', help='restrict the run to these routes')
+    parser.add_argument('--output', help='write the json report to this file')
+    parser.add_argument('--compare', help='previous json report to compare with')
+    args = parser.parse_args()
+
+    scale = scale_from_arguments(args)
+    app = make_app()
+    seed(app, scale)
+    factories = scenarios(scale, finished_export_job(app))
+    missing = [route for route in routes(app) if route not in factories]
+    if missing:
+        sys.exit('no benchmark scenario for: {}'.format(', '.join(missing)))
+
+    report = {'scale': scale.__dict__, 'requests': args.requests, 'threads': args.threads, 'endpoints': {}}
+    for route in routes(app):
+        if args.only and route not in args.only:
+            continue
+        metrics = load(app, factories[route], args.requests, args.threads)
+        metrics['peak_kb'] = round(peak_memory(app, factories[route], args.memory_requests) / 1024, 1)
+        report['endpoints'][route] = metrics
+        print(json.dumps(dict(endpoint=route, **metrics)), file=sys.stderr)
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    if args.compare:
+        with open(args.compare) as previous:
+            compare(report, json.load(previous))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""
+Measure the entity cache on lookups concentrated on a few hot ids.
+
+    python benchmarks/entity_cache_benchmark.py --requests 5000 --hot 20
+
+/get_user, /teams_user_list and /add_task are called with ids drawn from `hot` users, teams and boards,
+once with the cache disabled and once with the local backend, against the same database. Prints one json
+line per endpoint and backend with the requests per second, SQL statements per request and the hit rate.
+"""
+import argparse
+import itertools
+import json
+import random
+import time
+
+from common import make_app, temp_database_uri
+from datagen import add_scale_arguments, scale_from_arguments, seed
+from sqlalchemy import event
+
+from database.database import db
+
+
+def requests(hot, requests_count, unique):
+    rng = random.Random(1)
+    return {
+        '/get_user': [('/get_user', {'id': rng.randint(1, hot)}) for _ in range(requests_count)],
+        '/teams_user_list': [('/teams_user_list?limit=20', {'id': rng.randint(1, hot)}) for _ in range(requests_count)],
+        '/add_task': [('/add_task', {'title': 'hot{}'.format(next(unique)), 'description': 'Hot', 'user_id': 1,
+                                     'board_id': rng.randint(1, hot)}) for _ in range(requests_count)],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    add_scale_arguments(parser)
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--hot', type=int, default=20, help='number of distinct ids looked up')
+    args = parser.parse_args()
+
+    scale = scale_from_arguments(args)
+    database_uri = temp_database_uri()
+    seed(make_app(database_uri), scale)
+    unique = itertools.count()
+    for backend in (None, 'entity_cache.LocalBackend'):
+        app = make_app(database_uri, ENTITY_CACHE_BACKEND=backend)
+        client = app.test_client()
+        with app.app_context():
+            engine = db.engine
+        statements = itertools.count()
+        event.listen(engine, 'before_cursor_execute', lambda *_: next(statements))
+        for route, calls in requests(args.hot, args.requests, unique).items():
+            first_statement = next(statements)
+            start = time.perf_counter()
+            for url, payload in calls:
+                response = client.post(url, json=payload)
+                assert response.status_code < 400, (url, response.status_code)
+            elapsed = time.perf_counter() - start
+            stats = client.get('/metrics').json['entity_cache']
+            print(json.dumps({'endpoint': route, 'backend': backend, 'rps': round(len(calls) / elapsed, 1),
+                              'statements_per_request': round((next(statements) - first_statement - 1) / len(calls), 2),
+                              'hit_rate': stats['hit_rate']}))
+
+
+if __name__ == '__main__':
+    main()
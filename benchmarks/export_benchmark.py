@@ -0,0 +1,69 @@
+"""
+Compare the streaming board export with the former pandas + tabulate implementation, and measure the
+csv, ndjson and json exports of the same board.
+
+    python benchmarks/export_benchmark.py --tasks 100000
+
+Prints one json line per implementation with its latency and peak traced memory.
+"""
+import argparse
+import json
+from functools import partial
+
+from common import make_app, measure
+from datagen import Scale, seed
+
+from database.database import db
+from database.flask_models import Task, User
+
+
+def export_with_pandas(board_id):
+    """
+    The export as it was implemented before the streaming engine, minus the temp file.
+    """
+    import pandas as pd
+    from tabulate import tabulate
+
+    df = pd.read_sql(db.session.query(Task.id, Task.title, User.user_name, Task.status).filter(Task.board_id == board_id).
+                     join(User, User.id == Task.user_id).statement, db.engine)
+    df['task'] = df['id'].map(str) + '-->' + df['title'] + '(' + df['user_name'] + ')'
+    df = df[['task', 'status']]
+    df = df.pivot(columns='status', values='task')
+    df = df.reindex(columns=['OPEN', 'IN_PROGRESS', 'COMPLETE'], fill_value=None)
+    df = df.fillna('')
+    return len(tabulate(df, headers='keys', showindex=False, tablefmt='psql'))
+
+
+def export_streaming(board_id):
+    from board_export import render_board_table
+
+    return sum(len(chunk) for chunk in render_board_table(board_id))
+
+
+def export_tasks(board_id, export_format):
+    from board_export import render_board_tasks
+
+    _, chunks = render_board_tasks(board_id, export_format)
+    return sum(len(chunk) for chunk in chunks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--tasks', type=int, default=100000)
+    parser.add_argument('--users', type=int, default=1000)
+    args = parser.parse_args()
+
+    app = make_app()
+    seed(app, Scale(users=args.users, teams=1, members_per_team=0, boards_per_team=1, tasks_per_board=args.tasks))
+    with app.app_context():
+        engines = [('pandas', export_with_pandas), ('streaming', export_streaming)]
+        engines += [(export_format, partial(export_tasks, export_format=export_format))
+                    for export_format in ('csv', 'ndjson', 'json')]
+        for name, export in engines:
+            size, seconds, peak = measure(export, 1)
+            print(json.dumps({'engine': name, 'tasks': args.tasks, 'bytes': size,
+                              'seconds': round(seconds, 3), 'peak_mb': round(peak / 2 ** 20, 1)}))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+"""
+Measure the latency of a cheap endpoint while large board exports are requested, with the exports served
+inline by /export_board and submitted as background jobs to /export_jobs.
+
+    python benchmarks/export_jobs_benchmark.py --tasks-per-board 20000 --server-threads 4
+
+Requests are served by a pool of --server-threads threads, like the request threads of a WSGI server. Export
+clients request the boards of team 1 in turn while probe clients call /get_user. With jobs an export client
+submits, polls every 50ms and downloads the result. The export cache is disabled so every inline export is
+rendered. In the "fresh" modes a task is added to the board before each export, so no job is coalesced with
+a previous one and every job renders. Prints one json line per mode with the /get_user latency and the
+export throughput.
+"""
+import argparse
+import itertools
+import json
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from common import make_app, temp_database_uri
+from datagen import add_scale_arguments, scale_from_arguments, seed
+
+POLL_SECONDS = 0.05
+FRESH_IDS = itertools.count()
+
+
+class Server:
+    """
+    Run the requests of many clients on a fixed pool of threads, the way a WSGI server would.
+    """
+
+    def __init__(self, app, threads):
+        self.client = app.test_client()
+        self.pool = ThreadPoolExecutor(threads)
+
+    def call(self, method, url, payload=None):
+        def run():
+            response = self.client.open(url, method=method, json=payload)
+            body = response.get_data()
+            response.close()
+            return response.status_code, response.headers, body
+        return self.pool.submit(run).result()
+
+
+def export_inline(server, board_id):
+    _, _, body = server.call('POST', '/export_board', {'id': board_id})
+    return len(body)
+
+
+def export_job(server, board_id):
+    status, headers, _ = server.call('POST', '/export_jobs', {'id': board_id})
+    location = headers['Location']
+    while status == 202:
+        time.sleep(POLL_SECONDS)
+        status, _, body = server.call('GET', location)
+        if json.loads(body)['status'] in ('queued', 'running'):
+            status = 202
+    _, _, body = server.call('GET', location + '/file')
+    return len(body)
+
+
+def fresh(export):
+    def export_fresh(server, board_id):
+        server.call('POST', '/add_task', {'title': 'bench{}'.format(next(FRESH_IDS)), 'description': 'Bench',
+                                         'user_id': 1, 'board_id': board_id})
+        return export(server, board_id)
+    return export_fresh
+
+
+def run(server, export, board_ids, export_clients, probe_clients, seconds):
+    stop = threading.Event()
+    latencies = []
+    exported = [0, 0]
+    lock = threading.Lock()
+
+    def exporter(offset):
+        index = offset
+        while not stop.is_set():
+            size = export(server, board_ids[index % len(board_ids)])
+            index += 1
+            with lock:
+                exported[0] += 1
+                exported[1] += size
+
+    def probe(offset):
+        user_id = offset + 1
+        while not stop.is_set():
+            start = time.perf_counter()
+            server.call('POST', '/get_user', {'id': user_id})
+            with lock:
+                latencies.append(time.perf_counter() - start)
+            time.sleep(0.005)
+
+    threads = [threading.Thread(target=exporter, args=(i,)) for i in range(export_clients)]
+    threads += [threading.Thread(target=probe, args=(i,)) for i in range(probe_clients)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    latencies.sort()
+    return {'probe_requests': len(latencies),
+            'probe_p50_ms': round(statistics.median(latencies) * 1000, 2),
+            'probe_p99_ms': round(latencies[int(len(latencies) * 0.99)] * 1000, 2),
+            'exports': exported[0], 'export_mb': round(exported[1] / 1e6, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    add_scale_arguments(parser)
+    parser.add_argument('--server-threads', type=int, default=4)
+    parser.add_argument('--export-clients', type=int, default=4)
+    parser.add_argument('--probe-clients', type=int, default=2)
+    parser.add_argument('--job-workers', type=int, default=1)
+    parser.add_argument('--seconds', type=float, default=10)
+    args = parser.parse_args()
+
+    scale = scale_from_arguments(args)
+    database_uri = temp_database_uri()
+    seed(make_app(database_uri), scale)
+    board_ids = list(range(1, scale.boards_per_team + 1))
+
+    modes = (('inline', export_inline), ('jobs', export_job),
+             ('inline fresh', fresh(export_inline)), ('jobs fresh', fresh(export_job)))
+    for mode, export in modes:
+        app = make_app(database_uri, EXPORT_CACHE_MAX_BYTES=0, EXPORT_JOB_WORKERS=args.job_workers,
+                       EXPORT_SPOOL_DIR=tempfile.mkdtemp(prefix='flask_jira_spool_'))
+        result = run(Server(app, args.server_threads), export, board_ids, args.export_clients,
+                     args.probe_clients, args.seconds)
+        print(json.dumps(dict({'mode': mode, 'server_threads': args.server_threads,
+                               'export_clients': args.export_clients, 'tasks_per_board': scale.tasks_per_board},
+                              **result)))
+
+
+if __name__ == '__main__':
+    main()
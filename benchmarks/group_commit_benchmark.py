@@ -0,0 +1,103 @@
+"""
+Measure the throughput of concurrent task writes committed one by one and with group commit.
+
+    python benchmarks/group_commit_benchmark.py --writers 16 --seconds 5 --synchronous FULL --max-batch 64 --max-wait-ms 2
+
+Writer threads drive their own Flask test client against a shared app, like the request threads of a
+WSGI server, alternating /add_task and /update_task on the boards of a seeded database. Every mode starts
+from the same seeded file. Prints one json line per mode with the writes per second, their p50 and p99
+latency, the failed writes and, with group commit, the mean batch size.
+"""
+import argparse
+import itertools
+import json
+import os
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+
+from common import make_app
+from datagen import Scale, seed
+
+from config import Config
+from database.database import db
+from group_commit import group_commit
+
+STATUSES = ('OPEN', 'IN_PROGRESS', 'COMPLETE')
+
+
+def run(app, scale, writers, seconds):
+    titles = itertools.count()
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def writer(offset):
+        client = app.test_client()
+        board_id = offset % scale.boards + 1
+        for i in itertools.count():
+            if time.perf_counter() >= deadline:
+                return
+            start = time.perf_counter()
+            if i % 2:
+                task_id = (offset * 7919 + i) % scale.tasks + 1
+                response = client.post('/update_task', json={'id': task_id, 'status': STATUSES[i % 3]})
+            else:
+                response = client.post('/add_task', json={'title': 'bench{}'.format(next(titles)),
+                                                          'description': 'Bench', 'user_id': 1, 'board_id': board_id})
+            elapsed = time.perf_counter() - start
+            with lock:
+                if response.status_code in (200, 201):
+                    latencies.append(elapsed)
+                else:
+                    errors[0] += 1
+
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    latencies.sort()
+    return {'writes_per_s': round(len(latencies) / seconds, 1),
+            'p50_ms': round(statistics.median(latencies) * 1000, 2),
+            'p99_ms': round(latencies[int(len(latencies) * 0.99)] * 1000, 2),
+            'write_errors': errors[0]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--writers', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--synchronous', default='NORMAL', choices=['OFF', 'NORMAL', 'FULL'])
+    parser.add_argument('--max-batch', type=int, default=Config.GROUP_COMMIT_MAX_BATCH)
+    parser.add_argument('--max-wait-ms', type=float, default=Config.GROUP_COMMIT_MAX_WAIT_MS)
+    args = parser.parse_args()
+
+    scale = Scale(users=1000, teams=20, members_per_team=10, boards_per_team=5, tasks_per_board=200)
+    seeded = make_app()
+    seed(seeded, scale)
+    with seeded.app_context():
+        seeded_path = db.engine.url.database
+        db.engine.dispose()
+
+    for enabled in (False, True):
+        path = os.path.join(tempfile.mkdtemp(prefix='flask_jira_group_commit_'), 'bench.database')
+        shutil.copyfile(seeded_path, path)
+        app = make_app('sqlite:///' + path, GROUP_COMMIT=enabled, GROUP_COMMIT_MAX_BATCH=args.max_batch,
+                       GROUP_COMMIT_MAX_WAIT_MS=args.max_wait_ms, SQLITE_POOL_SIZE=args.writers + 1,
+                       SQLITE_PRAGMAS=dict(Config.SQLITE_PRAGMAS, synchronous=args.synchronous))
+        before = group_commit.stats()
+        result = run(app, scale, args.writers, args.seconds)
+        after = group_commit.stats()
+        batches = after['batches'] - before['batches']
+        if enabled:
+            result['mean_batch'] = round((after['writes'] - before['writes']) / batches, 2) if batches else 0
+        print(json.dumps(dict({'mode': 'group commit' if enabled else 'commit per request', 'writers': args.writers,
+                               'synchronous': args.synchronous}, **result)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+Check that a page of team members, or of the teams of a user, costs a fixed number of SQL statements.
+
+    python benchmarks/membership_statement_check.py
+
+Teams of growing sizes are seeded and their first, a middle and the last page are requested from
+/teams_user_list, along with the whole team and the teams of users belonging to a growing number of teams
+from /users_team_list. The statements of every request are counted; the script exits with status 1 when a
+count depends on the size of the team or on the number of teams.
+"""
+import sys
+
+from common import make_app
+from datagen import Scale, seed
+from sqlalchemy import event
+
+from database.database import db
+from database.flask_models import UserTeam
+
+SIZES = (10, 100, 1000)
+PAGE_SIZE = 50
+
+
+def seed_memberships(app):
+    """
+    Team i has SIZES[i - 1] members starting from user i, so user j belongs to the j first teams for j <= len(SIZES).
+    """
+    seed(app, Scale(users=max(SIZES) + len(SIZES), teams=len(SIZES), members_per_team=0, boards_per_team=0,
+                    tasks_per_board=0))
+    with app.app_context():
+        db.session.execute(UserTeam.__table__.insert(), [
+            {'team_id': team + 1, 'user_id': team + user + 1} for team, size in enumerate(SIZES) for user in range(size)
+        ])
+        db.session.commit()
+
+
+def count_statements(engine, client, url, payload):
+    statements = []
+
+    def count(*args):
+        statements.append(args[2])
+
+    event.listen(engine, 'before_cursor_execute', count)
+    try:
+        response = client.post(url, json=payload)
+        response.get_data()
+        response.close()
+    finally:
+        event.remove(engine, 'before_cursor_execute', count)
+    assert response.status_code == 200, (url, response.status_code)
+    return len(statements)
+
+
+def main():
+    app = make_app()
+    seed_memberships(app)
+    client = app.test_client()
+    with app.app_context():
+        engine = db.engine
+
+    counts = {}
+    for team, size in enumerate(SIZES, 1):
+        for label, after_id in (('first page', 0), ('middle page', size // 2), ('last page', max(size - PAGE_SIZE, 0))):
+            url = '/teams_user_list?after_id={}&limit={}'.format(after_id, PAGE_SIZE)
+            counts.setdefault('team members, ' + label, {})[size] = count_statements(engine, client, url, {'id': team})
+        counts.setdefault('team members, unpaged', {})[size] = \
+            count_statements(engine, client, '/teams_user_list', {'id': team})
+    for user in range(1, len(SIZES) + 1):
+        url = '/users_team_list?limit={}'.format(PAGE_SIZE)
+        counts.setdefault('user teams', {})[user] = count_statements(engine, client, url, {'id': user})
+
+    failures = 0
+    for name, by_size in counts.items():
+        fixed = len(set(by_size.values())) == 1
+        failures += not fixed
+        print('{:<28} {} {}'.format(name, by_size, 'ok' if fixed else 'GROWS WITH THE DATA'))
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,122 @@
+"""
+Check that every hot query of the API is answered through an index.
+
+    python benchmarks/query_plan_check.py [--verbose]
+
+Each endpoint is called once through the Flask test client against a small seeded database. Every SELECT,
+UPDATE and DELETE it issues is captured and run again under EXPLAIN QUERY PLAN with the same parameters;
+a plan step that scans a whole table is reported and the script exits with status 1.
+"""
+import argparse
+import base64
+import json
+import re
+import sys
+
+from common import make_app
+from datagen import Scale, seed
+from sqlalchemy import event
+
+from database.database import db
+
+# Creation range and page position of the /query_tasks calls, see code_base/task_query.py
+AFTER, BEFORE = '2000-01-01T00:00:00', '2100-01-01T00:00:00'
+QUERY_TASKS_CURSOR = base64.urlsafe_b64encode(json.dumps([AFTER, 1]).encode()).decode()
+
+# (method, url, json) of the calls to check, with a cursor on the list endpoints so they use keyset paging
+CALLS = [
+    ('post', '/create_user', {'user_name': 'plan_user', 'display_name': 'Plan'}),
+    ('get', '/userlist?after_id=1&limit=10', None),
+    ('post', '/get_user', {'id': 1}),
+    ('post', '/update_user', {'id': 1, 'user': {'user_name': 'user1', 'display_name': 'Renamed'}}),
+    ('post', '/create_team', {'name': 'plan_team', 'description': 'Plan', 'admin': 1}),
+    ('get', '/team_list?after_id=1&limit=10', None),
+    ('post', '/update_team', {'id': 1, 'team': {'name': 'team1', 'description': 'Updated', 'admin': 1}}),
+    ('patch', '/add_user_to_team', {'id': 1, 'users': [1, 2, 3]}),
+    ('post', '/teams_user_list', {'id': 1}),
+    ('post', '/teams_user_list?after_id=1&limit=10', {'id': 1}),
+    ('post', '/users_team_list?after_id=0&limit=10', {'id': 1}),
+    ('post', '/remove_user_from_team', {'id': 1, 'users': [3]}),
+    ('post', '/create_board', {'name': 'plan_board', 'description': 'Plan', 'team_id': 1}),
+    ('post', '/list_boards', {'team_id': 1}),
+    ('post', '/add_task', {'title': 'plan_task', 'description': 'Plan', 'user_id': 1, 'board_id': 1}),
+    ('post', '/add_tasks', [{'title': 'plan_task_{}'.format(i), 'user_id': 1, 'board_id': 1} for i in range(3)]),
+    ('post', '/update_task', {'id': 1, 'status': 'IN_PROGRESS'}),
+    ('post', '/update_tasks', {'tasks': [{'id': 2, 'status': 'COMPLETE'}, {'id': 3, 'status': 'OPEN'}]}),
+    ('post', '/update_tasks', {'filter': {'board_id': 1, 'status': 'OPEN'}, 'status': 'IN_PROGRESS'}),
+    ('post', '/board_summary', {'team_id': 1}),
+] + [
+    # Every filter of /query_tasks alone and with a status or a creation range, in both orders
+    ('post', '/query_tasks', dict(filters, order=order, limit=10))
+    for filters in ({'user_id': 1}, {'user_id': 1, 'status': 'OPEN'}, {'user_id': 1, 'created_after': AFTER},
+                    {'status': 'OPEN'}, {'status': 'OPEN', 'created_after': AFTER},
+                    {'board_id': 1}, {'board_id': 1, 'status': 'OPEN'}, {'board_id': 1, 'user_id': 2},
+                    {'team_id': 1}, {'team_id': 1, 'status': 'OPEN'}, {'team_id': 1, 'created_before': BEFORE},
+                    {'created_after': AFTER}, {'created_after': AFTER, 'created_before': BEFORE})
+    for order in ('asc', 'desc')
+] + [
+    ('post', '/query_tasks', {'team_id': 1, 'status': 'OPEN', 'limit': 10, 'cursor': QUERY_TASKS_CURSOR}),
+    ('post', '/query_tasks', {'user_id': 1, 'order': 'desc', 'limit': 10, 'cursor': QUERY_TASKS_CURSOR}),
+    ('post', '/search_tasks', {'query': 'task1', 'team_id': 1, 'status': 'OPEN'}),
+    ('post', '/export_board', {'id': 1}),
+    ('post', '/export_board', {'id': 1, 'format': 'ndjson'}),
+    ('post', '/export_team', {'team_id': 1}),
+    ('post', '/export_jobs', {'id': 1, 'format': 'csv'}),
+]
+
+
+def full_scans(plan):
+    # An FTS5 table constrained by MATCH is read through its index, its plan step reads "VIRTUAL TABLE INDEX 0:M..."
+    return [detail for detail in plan if detail.startswith('SCAN ') and detail != 'SCAN CONSTANT ROW'
+            and not re.search(r'VIRTUAL TABLE INDEX \d+:M', detail)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--verbose', action='store_true', help='print the plan of every statement')
+    args = parser.parse_args()
+
+    app = make_app(SQLITE_TUNED=False, EXPORT_CACHE_MAX_BYTES=0)
+    seed(app, Scale(users=50, teams=5, members_per_team=5, boards_per_team=1, tasks_per_board=40))
+    client = app.test_client()
+
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().split(None, 1)[0].upper() in ('SELECT', 'UPDATE', 'DELETE', 'INSERT'):
+            captured.append((statement, parameters[0] if executemany else parameters))
+
+    failures = 0
+    with app.app_context():
+        engine = db.engine
+    for method, url, payload in CALLS:
+        event.listen(engine, 'before_cursor_execute', capture)
+        try:
+            response = getattr(client, method)(url, json=payload)
+            # Streamed responses only run their queries as they are read
+            response.get_data()
+            response.close()
+        finally:
+            event.remove(engine, 'before_cursor_execute', capture)
+        if response.status_code >= 400:
+            print('{} {} failed with {}'.format(method.upper(), url, response.status_code))
+            failures += 1
+        with engine.connect() as connection:
+            for statement, parameters in captured:
+                if statement.lstrip().upper().startswith('INSERT') and 'SELECT' not in statement.upper():
+                    continue
+                rows = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).fetchall()
+                plan = [row[-1] for row in rows]
+                scans = full_scans(plan)
+                if scans or args.verbose:
+                    print('{} {}\n  {}\n  -> {}'.format(method.upper(), url, ' '.join(statement.split()),
+                                                       '; '.join(plan)))
+                failures += bool(scans)
+        captured.clear()
+
+    print('{} statement(s) with a full table scan'.format(failures) if failures else 'every hot query uses an index')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,99 @@
+"""
+Compare /search_tasks, served by the FTS5 index, with the LIKE scan it replaces.
+
+    python benchmarks/search_benchmark.py --tasks 1000000
+
+Tasks get titles and descriptions drawn from a synthetic vocabulary with a skewed word frequency, so
+searches for rare, middling and common words can be measured. Prints one json line per query and engine
+with the matches and the median latency.
+"""
+import argparse
+import itertools
+import json
+import statistics
+import time
+
+from common import make_app
+from datagen import Scale, seed
+from sqlalchemy import or_
+
+from database.database import db
+from database.flask_models import Task
+
+VOCABULARY_SIZE = 20000
+BOARDS = 1000
+
+
+def word(rank):
+    return 'w{}'.format(rank)
+
+
+def vocabulary_text():
+    """
+    :return: a task_text function of datagen.seed drawing 4 title and 10 description words from the vocabulary
+    """
+    cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(VOCABULARY_SIZE)))
+    vocabulary = [word(rank) for rank in range(VOCABULARY_SIZE)]
+
+    def task_text(rng, board_id, i):
+        words = rng.choices(vocabulary, cum_weights=cum_weights, k=14)
+        return '{} {}-{}'.format(' '.join(words[:4]), board_id, i), ' '.join(words[4:])
+    return task_text
+
+
+def like_search(term, limit):
+    pattern = '%{}%'.format(term)
+    return db.session.query(Task.id).filter(or_(Task.title.like(pattern), Task.description.like(pattern))) \
+        .order_by(Task.id).limit(limit).all()
+
+
+def median_ms(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return result, round(statistics.median(timings) * 1000, 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--tasks', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--limit', type=int, default=50)
+    args = parser.parse_args()
+
+    scale = Scale(users=100, teams=100, members_per_team=5, boards_per_team=BOARDS // 100,
+                  tasks_per_board=max(args.tasks // BOARDS, 1))
+    app = make_app()
+    start = time.perf_counter()
+    seed(app, scale, task_text=vocabulary_text())
+    print(json.dumps({'seeded_tasks': scale.tasks, 'seconds': round(time.perf_counter() - start, 1)}))
+
+    client = app.test_client()
+    queries = [
+        ('rare word', {'query': word(VOCABULARY_SIZE - 1)}),
+        ('middling word', {'query': word(500)}),
+        ('common word', {'query': word(0)}),
+        ('two words', {'query': '{} {}'.format(word(10), word(200))}),
+        ('prefix', {'query': word(1234)[:4] + '*'}),
+        ('common word, one team', {'query': word(0), 'team_id': 7}),
+    ]
+    for name, query in queries:
+        query['limit'] = args.limit
+
+        def search():
+            response = client.post('/search_tasks', json=query)
+            assert response.status_code == 200, response.get_data()
+            return response.json
+
+        tasks, fts_ms = median_ms(search, args.repeat)
+        print(json.dumps({'query': name, 'engine': 'fts5', 'returned': len(tasks), 'median_ms': fts_ms}))
+        if ' ' not in query['query'] and 'team_id' not in query:
+            with app.app_context():
+                rows, like_ms = median_ms(lambda: like_search(query['query'].rstrip('*'), args.limit), args.repeat)
+            print(json.dumps({'query': name, 'engine': 'like', 'returned': len(rows), 'median_ms': like_ms}))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""
+Measure the per-request serialization cost of the list and describe responses, before and after the
+prebuilt schemas, the RowSerializer fast path and the orjson provider.
+
+    python benchmarks/serialization_benchmark.py --rows 1 100 1000
+
+Prints one json line per response size with the mean microseconds per request of each path.
+"""
+import argparse
+import json
+import timeit
+from datetime import datetime
+from types import SimpleNamespace
+
+import common  # noqa: F401  makes the code_base modules importable
+from flask import Flask, jsonify
+from flask.json.provider import DefaultJSONProvider
+
+from serializers import FastJSONProvider
+from user_base import UserSchema, user_serializer
+
+
+def make_users(count):
+    now = datetime.utcnow()
+    return [SimpleNamespace(id=i, user_name='user{}'.format(i), display_name='User {}'.format(i), creation_time=now)
+            for i in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, nargs='+', default=[1, 100, 1000])
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    before_app = Flask('before')
+    before_app.json = DefaultJSONProvider(before_app)
+    after_app = Flask('after')
+    after_app.json = FastJSONProvider(after_app)
+
+    def before(users):
+        with before_app.app_context():
+            return jsonify(UserSchema(many=True).dump(users))
+
+    def after(users):
+        with after_app.app_context():
+            return jsonify(user_serializer.dump_many(users))
+
+    for count in args.rows:
+        users = make_users(count)
+        assert json.loads(before(users).data) == json.loads(after(users).data)
+        result = {'rows': count}
+        for name, fn in (('before', before), ('after', after)):
+            seconds = timeit.timeit(lambda: fn(users), number=args.repeat)
+            result[name + '_us'] = round(seconds / args.repeat * 1e6, 1)
+        result['speedup'] = round(result['before_us'] / result['after_us'], 1)
+        print(json.dumps(result))
+
+
+if __name__ == '__main__':
+    main()
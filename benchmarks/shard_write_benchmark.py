@@ -0,0 +1,107 @@
+"""
+Measure the task write throughput of concurrent writers on a single database file and on N shards.
+
+    python benchmarks/shard_write_benchmark.py --shards 2 4 --writers 8 --seconds 5 --synchronous FULL
+
+Each writer is a process with its own app, like the workers of a WSGI server, adding tasks to a board of
+its own team; teams are spread over the shards by the import of database/sharding.py. Every layout starts
+from the same seeded database. With --synchronous FULL every commit waits for its fsync, the case where the
+single writer lock of one file is the bottleneck. Prints one json line per layout with the writes per second,
+the p99 latency and the failed writes ("database is locked").
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+
+from common import make_app
+from datagen import Scale, seed
+
+from config import Config
+from database.database import db
+from database.sharding import import_global
+from server_app import setup_database
+
+
+def layout(seeded_path, shards, synchronous):
+    """
+    Copy the seeded database and spread its teams over `shards` shards.
+    :return: the config of the writer apps
+    """
+    directory = tempfile.mkdtemp(prefix='flask_jira_shards_')
+    global_path = os.path.join(directory, 'global.database')
+    shutil.copyfile(seeded_path, global_path)
+    shard_paths = [os.path.join(directory, 'shard{}.database'.format(i)) for i in range(shards)]
+    config = {'SQLALCHEMY_BINDS': {'shard{}'.format(i): 'sqlite:///' + path for i, path in enumerate(shard_paths)},
+              'SHARD_BINDS': ['shard{}'.format(i) for i in range(shards)],
+              'SQLITE_PRAGMAS': dict(Config.SQLITE_PRAGMAS, synchronous=synchronous)}
+    setup_database(make_app('sqlite:///' + global_path, **config))
+    if shards:
+        import_global(global_path, shard_paths)
+    return global_path, config
+
+
+def writer(global_path, config, board_id, deadline, results):
+    client = make_app('sqlite:///' + global_path, **config).test_client()
+    latencies = []
+    errors = 0
+    while time.time() < deadline:
+        start = time.perf_counter()
+        response = client.post('/add_task', json={'title': 'bench{}-{}'.format(os.getpid(), len(latencies) + errors),
+                                                  'description': 'Bench', 'user_id': 1, 'board_id': board_id})
+        if response.status_code == 201:
+            latencies.append(time.perf_counter() - start)
+        else:
+            errors += 1
+    results.put((latencies, errors))
+
+
+def run(global_path, config, scale, writers, seconds):
+    results = multiprocessing.Queue()
+    # the writers build their app first, the clock starts once they all had time to
+    deadline = time.time() + 2 + seconds
+    processes = [multiprocessing.Process(target=writer, args=(
+        global_path, config, (i % scale.teams) * scale.boards_per_team + 1, deadline, results))
+        for i in range(writers)]
+    for process in processes:
+        process.start()
+    latencies, errors = [], 0
+    for _ in processes:
+        process_latencies, process_errors = results.get()
+        latencies += process_latencies
+        errors += process_errors
+    for process in processes:
+        process.join()
+    latencies.sort()
+    return {'writes_per_s': round(len(latencies) / seconds, 1),
+            'p99_ms': round(latencies[int(len(latencies) * 0.99)] * 1000, 2) if latencies else None,
+            'write_errors': errors}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--shards', type=int, nargs='+', default=[2, 4])
+    parser.add_argument('--writers', type=int, default=8)
+    parser.add_argument('--teams', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--synchronous', default='NORMAL', choices=['OFF', 'NORMAL', 'FULL'])
+    args = parser.parse_args()
+
+    scale = Scale(users=1000, teams=args.teams, members_per_team=10, boards_per_team=2, tasks_per_board=500)
+    seeded = make_app()
+    seed(seeded, scale)
+    with seeded.app_context():
+        seeded_path = db.engine.url.database
+        db.engine.dispose()
+
+    for shards in [0] + args.shards:
+        result = run(*layout(seeded_path, shards, args.synchronous), scale, args.writers, args.seconds)
+        print(json.dumps(dict({'layout': '{} shards'.format(shards) if shards else 'single file',
+                               'writers': args.writers, 'synchronous': args.synchronous}, **result)))
+
+
+if __name__ == '__main__':
+    main()
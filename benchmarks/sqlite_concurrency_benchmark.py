@@ -0,0 +1,68 @@
+"""
+Measure read/write throughput of concurrent requests with and without the tuned SQLite profile.
+
+    python benchmarks/sqlite_concurrency_benchmark.py --readers 8 --writers 4 --seconds 5
+
+Readers page through /userlist while writers create users; each thread drives its own Flask test client
+against a shared app and file database. Prints one json line per profile with operations per second and the
+number of failed requests ("database is locked").
+"""
+import argparse
+import itertools
+import json
+import threading
+import time
+
+from common import make_app
+
+
+def run(tuned, args):
+    app = make_app(SQLITE_TUNED=tuned)
+    client = app.test_client()
+    client.post('/create_users', json=[{'user_name': 'seed{}'.format(i), 'display_name': 'Seed'}
+                                       for i in range(args.seed_users)])
+    names = itertools.count()
+    counts = {'reads': 0, 'writes': 0, 'read_errors': 0, 'write_errors': 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + args.seconds
+
+    def reader():
+        client = app.test_client()
+        while time.perf_counter() < deadline:
+            ok = client.get('/userlist?limit=50&after_id=100').status_code == 200
+            with lock:
+                counts['reads' if ok else 'read_errors'] += 1
+
+    def writer():
+        client = app.test_client()
+        while time.perf_counter() < deadline:
+            response = client.post('/create_user', json={'user_name': 'user{}'.format(next(names)),
+                                                         'display_name': 'Writer'})
+            with lock:
+                counts['writes' if response.status_code == 201 else 'write_errors'] += 1
+
+    threads = [threading.Thread(target=reader) for _ in range(args.readers)] + \
+              [threading.Thread(target=writer) for _ in range(args.writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return {'profile': 'tuned' if tuned else 'default',
+            'reads_per_s': round(counts['reads'] / args.seconds, 1),
+            'writes_per_s': round(counts['writes'] / args.seconds, 1),
+            'read_errors': counts['read_errors'], 'write_errors': counts['write_errors']}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--seed-users', type=int, default=1000)
+    args = parser.parse_args()
+    for tuned in (False, True):
+        print(json.dumps(run(tuned, args)))
+
+
+if __name__ == '__main__':
+    main()
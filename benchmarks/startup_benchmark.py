@@ -0,0 +1,62 @@
+"""
+Measure worker start up: time from importing the app to the first response, and the resident memory after it.
+
+    python benchmarks/startup_benchmark.py --runs 5
+
+Every run is a fresh interpreter. Also checks that none of the HEAVY_MODULES is imported on the way, they must
+only be loaded by the code paths that use them; the script exits with status 1 otherwise.
+Prints one json line with the median of the runs.
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+from common import ROOT, temp_database_uri
+
+HEAVY_MODULES = ('pandas', 'numpy', 'tabulate')
+
+PROBE = '''
+import json, resource, sys, time
+start = time.perf_counter()
+sys.path[:0] = [{root!r}, {code_base!r}]
+from server_app import create_app, setup_database
+app = create_app({{'SQLALCHEMY_DATABASE_URI': {uri!r}}})
+created = time.perf_counter()
+setup_database(app)
+ready = time.perf_counter()
+status = app.test_client().get('/userlist?limit=1').status_code
+first_response = time.perf_counter()
+print(json.dumps({{
+    'create_app_ms': (created - start) * 1000,
+    'first_response_ms': (first_response - ready + created - start) * 1000,
+    'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    'status': status,
+    'heavy_modules': [name for name in {heavy!r} if name in sys.modules],
+}}))
+'''
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    probe = PROBE.format(root=ROOT, code_base=ROOT + '/code_base', uri=temp_database_uri(), heavy=HEAVY_MODULES)
+    runs = [json.loads(subprocess.run([sys.executable, '-W', 'ignore', '-c', probe], check=True,
+                                      capture_output=True, text=True).stdout)
+            for _ in range(args.runs)]
+    heavy = sorted({name for run in runs for name in run['heavy_modules']})
+    print(json.dumps({
+        'runs': args.runs,
+        'create_app_ms': round(statistics.median(run['create_app_ms'] for run in runs), 1),
+        'first_response_ms': round(statistics.median(run['first_response_ms'] for run in runs), 1),
+        'max_rss_mb': round(statistics.median(run['max_rss_mb'] for run in runs), 1),
+        'heavy_modules': heavy,
+    }))
+    return 1 if heavy else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,56 @@
+"""
+Compare exporting every board of a team one /export_board request at a time with a single /export_team archive.
+
+    python benchmarks/team_export_benchmark.py --boards-per-team 20 --tasks-per-board 5000
+
+The export cache is disabled so every board is rendered from the database. Prints one json line per variant
+with its latency and the bytes sent.
+"""
+import argparse
+import json
+import time
+
+from common import make_app, temp_database_uri
+from datagen import add_scale_arguments, scale_from_arguments, seed
+
+
+def export_boards(client, board_ids):
+    size = 0
+    for board_id in board_ids:
+        response = client.post('/export_board', json={'id': board_id})
+        size += len(response.get_data())
+        response.close()
+    return size
+
+
+def export_team(client, team_id):
+    response = client.post('/export_team', json={'team_id': team_id})
+    size = len(response.get_data())
+    response.close()
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    add_scale_arguments(parser)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4])
+    args = parser.parse_args()
+
+    scale = scale_from_arguments(args)
+    database_uri = temp_database_uri()
+    seed(make_app(database_uri), scale)
+    board_ids = range(1, scale.boards_per_team + 1)
+
+    variants = [('export_board x{}'.format(len(board_ids)), 1, lambda client: export_boards(client, board_ids))]
+    variants += [('export_team', workers, lambda client: export_team(client, 1)) for workers in args.workers]
+    for name, workers, export in variants:
+        client = make_app(database_uri, EXPORT_CACHE_MAX_BYTES=0, EXPORT_WORKERS=workers).test_client()
+        start = time.perf_counter()
+        size = export(client)
+        print(json.dumps({'variant': name, 'workers': workers, 'boards': len(board_ids),
+                          'tasks_per_board': scale.tasks_per_board, 'bytes': size,
+                          'seconds': round(time.perf_counter() - start, 3)}))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,486 @@
+import csv
+import io
+import re
+import threading
+import unicodedata
+import zipfile
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from itertools import groupby, islice
+from operator import itemgetter
+
+from sqlalchemy import LargeBinary, String, cast, func, select
+
+from database.database import db
+from flask import json
+
+from database.flask_models import Task, User
+from query_utils import chunked, closing_session, read_snapshot
+from versions import versions
+
+STATUSES = ('OPEN', 'IN_PROGRESS', 'COMPLETE')
+DEFAULT_CHUNK_SIZE = 1000
+# tabulate pads every header with at least two blanks
+MIN_HEADER_PADDING = 2
+
+
+def task_label():
+    """
+    SQL expression rendering a task cell as "<id>--><title>(<user_name>)".
+    """
+    return cast(Task.id, String) + '-->' + Task.title + '(' + User.user_name + ')'
+
+
+def non_ascii(label):
+    """
+    SQL condition true when `label` has a character outside ASCII: its size in bytes exceeds its length.
+    """
+    return func.length(cast(label, LargeBinary)) != func.length(label)
+
+
+def board_widths_statement(board_id):
+    """
+    Single aggregate query grouped by status returning the length of the longest ASCII label of each status,
+    so the table can be laid out before any task row is read. The other labels are measured with
+    display_width, see board_wide_labels_statement.
+    """
+    label = task_label()
+    return select(Task.status, func.max(func.length(label))) \
+        .join(User, User.id == Task.user_id) \
+        .where(Task.board_id == board_id, ~non_ascii(label)) \
+        .group_by(Task.status)
+
+
+def board_wide_labels_statement(board_id):
+    """
+    Query of the (status, label) of the tasks of a board whose label has non ASCII characters, whose display
+    width SQLite can not measure.
+    """
+    label = task_label()
+    return select(Task.status, label) \
+        .join(User, User.id == Task.user_id) \
+        .where(Task.board_id == board_id, non_ascii(label))
+
+
+def board_rows_statement(board_id):
+    """
+    Query of the (label, status) pair of every task of a board, in the order of the table.
+    """
+    return select(task_label(), Task.status) \
+        .join(User, User.id == Task.user_id) \
+        .where(Task.board_id == board_id) \
+        .order_by(Task.id)
+
+
+def boards_rows_statement(board_ids):
+    """
+    board_rows_statement for several boards at once, as (board_id, label, status) ordered by board then task.
+    """
+    return select(Task.board_id, task_label(), Task.status) \
+        .join(User, User.id == Task.user_id) \
+        .where(Task.board_id.in_(board_ids)) \
+        .order_by(Task.board_id, Task.id)
+
+
+def board_tasks_statement(board_id):
+    """
+    Query of the (id, title, user_name, status, creation_time) of every task of a board, ordered by id.
+    """
+    return select(Task.id, Task.title, User.user_name, Task.status, Task.creation_time) \
+        .outerjoin(User, User.id == Task.user_id) \
+        .where(Task.board_id == board_id) \
+        .order_by(Task.id)
+
+
+def board_task_count_statement(board_id):
+    return select(func.count(Task.id)).where(Task.board_id == board_id)
+
+
+def display_width(text):
+    """
+    Number of columns `text` takes on a terminal, as tabulate measured its cells with wcwidth: East Asian wide
+    and fullwidth characters take two, combining characters none, any other character one.
+    """
+    if text.isascii():
+        return len(text)
+    return sum(0 if unicodedata.combining(char) else 2 if unicodedata.east_asian_width(char) in 'WF' else 1
+               for char in text)
+
+
+def column_widths(longest, wide_labels=()):
+    """
+    :param longest: the length of the longest label of each status, as returned by board_widths_statement
+    :param wide_labels: the (status, label) of the labels left out of `longest`, see board_wide_labels_statement
+    :return: the width of each status column
+    """
+    longest = {status: length or 0 for status, length in dict(longest).items()}
+    for status, label in wide_labels:
+        longest[status] = max(longest.get(status, 0), display_width(label or ''))
+    return [max(len(status) + MIN_HEADER_PADDING, longest.get(status, 0)) for status in STATUSES]
+
+
+def format_table(widths, rows, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Render (label, status) rows as a psql style table with one OPEN / IN_PROGRESS / COMPLETE column per
+    status and one line per task, the layout tabulate produced for the pivoted board. Cells are padded to
+    their display width, so wide characters stay aligned.
+    Lines are yielded in chunks of `chunk_size` so the whole table never has to be held in memory.
+    """
+    border = '+' + '+'.join('-' * (width + 2) for width in widths) + '+'
+    header = '| ' + ' | '.join(status.ljust(width) for status, width in zip(STATUSES, widths)) + ' |'
+    header_separator = '|' + '+'.join('-' * (width + 2) for width in widths) + '|'
+    blanks = [' ' * width for width in widths]
+    # Each status has a fixed text on the left and on the right of its cell
+    layout = {}
+    for position, status in enumerate(STATUSES):
+        left = '| ' + ''.join(blank + ' | ' for blank in blanks[:position])
+        right = ''.join(' | ' + blank for blank in blanks[position + 1:]) + ' |\n'
+        layout[status] = (left, widths[position], right)
+
+    lines = [border + '\n', header + '\n', header_separator + '\n']
+    for label, status in rows:
+        if status not in layout:
+            continue
+        left, width, right = layout[status]
+        label = label or ''
+        lines.append(left + label + ' ' * (width - display_width(label)) + right)
+        if len(lines) >= chunk_size:
+            yield ''.join(lines)
+            lines = []
+    lines.append(border)
+    yield ''.join(lines)
+
+
+def render_board_table(board_id, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Export a board as a psql style table, reading its tasks in chunks straight from the database.
+    The column widths are computed eagerly, the returned generator then streams the table. Both queries
+    read the same snapshot, so a task written in between can not overflow its column.
+    """
+    session = db.session()
+    read_snapshot(session)
+    widths = column_widths(session.execute(board_widths_statement(board_id)).all(),
+                           session.execute(board_wide_labels_statement(board_id)).all())
+    rows = session.execute(board_rows_statement(board_id).execution_options(yield_per=chunk_size))
+    return closing_session(session, format_table(widths, rows, chunk_size))
+
+
+# Columns of the machine readable exports, in the order of board_tasks_statement
+TASK_COLUMNS = ('id', 'title', 'user_name', 'status', 'creation_time')
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+    'json': 'application/json',
+}
+
+
+def task_records(rows):
+    for row in rows:
+        record = dict(zip(TASK_COLUMNS, row))
+        if record['creation_time'] is not None:
+            record['creation_time'] = record['creation_time'].isoformat()
+        yield record
+
+
+def format_csv(rows, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    CSV with a header line. CSV has no room for a trailer, the total is only sent in the X-Total-Rows header.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    writer.writerow(TASK_COLUMNS)
+    for count, record in enumerate(task_records(rows), 1):
+        writer.writerow(record.values())
+        if count % chunk_size == 0:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode()
+
+
+def iter_encoded(parts, chunk_size, size):
+    """
+    Join `parts` into utf-8 chunks of `chunk_size` parts, adding the length of every chunk to size[0].
+    """
+    parts = iter(parts)
+    while True:
+        chunk = ''.join(islice(parts, chunk_size)).encode()
+        if not chunk:
+            return
+        size[0] += len(chunk)
+        yield chunk
+
+
+def format_ndjson(rows, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    One json object per line, then a trailer line {"total_rows": <count>, "bytes": <bytes of the task lines>}
+    where the count is the number of lines sent.
+    """
+    total = [0]
+
+    def lines():
+        for record in task_records(rows):
+            total[0] += 1
+            yield json.dumps(record) + '\n'
+
+    size = [0]
+    yield from iter_encoded(lines(), chunk_size, size)
+    yield (json.dumps({'total_rows': total[0], 'bytes': size[0]}) + '\n').encode()
+
+
+def format_json(rows, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    A single document {"tasks": [...], "total_rows": <count>, "bytes": <bytes of the tasks array>} where the
+    count is the number of tasks in the array.
+    """
+    total = [0]
+
+    def parts():
+        separator = '['
+        for record in task_records(rows):
+            total[0] += 1
+            yield separator + json.dumps(record)
+            separator = ','
+        yield ']' if separator == ',' else '[]'
+
+    size = [0]
+    yield b'{"tasks":'
+    yield from iter_encoded(parts(), chunk_size, size)
+    yield ',"total_rows":{},"bytes":{}}}'.format(total[0], size[0]).encode()
+
+
+FORMATTERS = {
+    'csv': format_csv,
+    'ndjson': format_ndjson,
+    'json': format_json,
+}
+
+
+def render_board_tasks(board_id, export_format, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Export the tasks of a board in one of EXPORT_FORMATS, reading them `chunk_size` rows at a time.
+    :return: (total, chunks) where total is the number of tasks. The count and the rows are read in one
+    explicit read transaction, so it matches what is streamed
+    """
+    session = db.session()
+    read_snapshot(session)
+    total = session.execute(board_task_count_statement(board_id)).scalar()
+    rows = session.execute(board_tasks_statement(board_id).execution_options(yield_per=chunk_size))
+    return total, closing_session(session, FORMATTERS[export_format](rows, chunk_size))
+
+
+def board_version(board_id):
+    """
+    :return: the version of the export of a board: the write counters of its tasks and of the user names
+    shown in the task labels
+    """
+    return versions.get('board', board_id), versions.get('user_names')
+
+
+def board_versions(board_ids):
+    """
+    :return: {board_id: board_version(board_id)} read with one query per chunk of boards
+    """
+    user_names = versions.get('user_names')
+    counters = {}
+    for ids_chunk in chunked(board_ids):
+        counters.update(versions.get_many('board', ids_chunk))
+    return {board_id: (counters.get(board_id, 0), user_names) for board_id in board_ids}
+
+
+class ExportCache:
+    """
+    LRU cache of rendered board exports keyed by (board_id, version).
+
+    Every write to the tasks of a board, or to a user name, bumps its version, which makes the previous
+    rendering unreachable: it is never served again and ages out of the LRU. The version is board_version,
+    the one the board export ETags are built on. It is read from the database, so each worker keeps its own
+    cache but sees the writes of all of them.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.max_bytes = app.config['EXPORT_CACHE_MAX_BYTES']
+
+    def get(self, board_id, version=None):
+        """
+        :param version: the current board_version of the board, read when not given
+        :return: (version, table) where table is the cached export of the current version of the board
+        or None on a miss. On a miss the table must be rendered and stored under the returned version.
+        """
+        board_id = int(board_id)
+        if version is None:
+            version = board_version(board_id)
+        with self._lock:
+            table = self._entries.get((board_id, version))
+            if table is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._entries.move_to_end((board_id, version))
+            return version, table
+
+    def put(self, board_id, version, table):
+        size = len(table)
+        if size > self.max_bytes:
+            return
+        key = (int(board_id), version)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous)
+            self._entries[key] = table
+            self._size += size
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def tee(self, board_id, version, chunks):
+        """
+        Pass the chunks of a rendering through while keeping a copy, stored once the rendering completes.
+        The copy is dropped as soon as it outgrows the cache.
+        """
+        kept = []
+        size = 0
+        for chunk in chunks:
+            if kept is not None:
+                kept.append(chunk)
+                size += len(chunk)
+                if size > self.max_bytes:
+                    kept = None
+            yield chunk
+        if kept is not None:
+            self.put(board_id, version, ''.join(kept))
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._entries), 'bytes': self._size}
+
+
+class ZipStream:
+    """
+    Write-only file object collecting what zipfile writes so it can be streamed out. zipfile detects it is
+    not seekable and writes each entry with a data descriptor, so the archive is never staged on disk.
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def archive_name(board_id, name):
+    return '{}-{}.txt'.format(board_id, re.sub(r'[^\w.-]+', '_', name or '').strip('_') or 'board')
+
+
+class TeamExporter:
+    """
+    Render all the boards of a team into a zip archive.
+
+    Boards whose export is cached are taken from the export cache. The tasks of the other boards are read
+    in a single ordered pass over the database, in the request thread, and the tables are measured and
+    formatted on a pool of EXPORT_WORKERS threads. Entries are written in board order as soon as they are
+    ready, with at most two tables per worker in flight, so memory is bounded by a few boards, not the team.
+    """
+
+    def __init__(self, max_workers=4):
+        self.max_workers = max_workers
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        with self._lock:
+            if self._executor is not None and self.max_workers != app.config['EXPORT_WORKERS']:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+            self.max_workers = app.config['EXPORT_WORKERS']
+
+    @property
+    def executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix='board-export')
+            return self._executor
+
+    @staticmethod
+    def _render(board_id, version, rows):
+        # The rows of the board are in memory already, measuring them is cheaper than a second query
+        longest = {}
+        for label, status in rows:
+            longest[status] = max(longest.get(status, 0), display_width(label or ''))
+        table = ''.join(format_table(column_widths(longest), rows))
+        export_cache.put(board_id, version, table)
+        return table
+
+    def iter_tables(self, session, boards, chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        Yield (board_id, name, table) for each (board_id, name) of `boards`, sorted by board id.
+        """
+        boards = sorted(boards)
+        versions = board_versions([board_id for board_id, _ in boards])
+        cached = {}
+        for board_id, _ in boards:
+            _, table = export_cache.get(board_id, versions[board_id])
+            if table is not None:
+                cached[board_id] = table
+        missing = [board_id for board_id, _ in boards if board_id not in cached]
+
+        def board_rows():
+            for ids_chunk in chunked(missing):
+                yield from session.execute(boards_rows_statement(ids_chunk).execution_options(yield_per=chunk_size))
+
+        groups = groupby(board_rows(), key=itemgetter(0))
+        group = next(groups, None)
+        pending = deque()
+        for board_id, name in boards:
+            if board_id in cached:
+                result = Future()
+                result.set_result(cached[board_id])
+            else:
+                rows = []
+                if group is not None and group[0] == board_id:
+                    rows = [(label, status) for _, label, status in group[1]]
+                    group = next(groups, None)
+                result = self.executor.submit(self._render, board_id, versions[board_id], rows)
+            pending.append((board_id, name, result))
+            while len(pending) > 2 * self.max_workers:
+                board_id, name, result = pending.popleft()
+                yield board_id, name, result.result()
+        while pending:
+            board_id, name, result = pending.popleft()
+            yield board_id, name, result.result()
+
+    def archive(self, session, boards, chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        Stream a zip archive with one "<board_id>-<board_name>.txt" table per board and close `session` when done.
+        """
+        def generate():
+            stream = ZipStream()
+            with zipfile.ZipFile(stream, 'w', zipfile.ZIP_DEFLATED, compresslevel=1) as archive:
+                for board_id, name, table in self.iter_tables(session, boards, chunk_size):
+                    archive.writestr(archive_name(board_id, name), table)
+                    yield stream.pop()
+            yield stream.pop()
+
+        return closing_session(session, generate())
+
+
+export_cache = ExportCache()
+team_exporter = TeamExporter()
@@ -0,0 +1,67 @@
+class Config:
+    """
+    Default application settings, override them with the mapping given to create_app.
+    """
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///test.database'
+
+    # Bind keys of SQLALCHEMY_BINDS holding the boards and tasks, by team, see database/sharding.py. The order
+    # matters, a team is pinned to a shard by its index. Empty keeps everything in SQLALCHEMY_DATABASE_URI
+    SHARD_BINDS = []
+
+    # Total size of the rendered board exports kept in memory
+    EXPORT_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+    # Threads rendering the boards of a /export_team archive
+    EXPORT_WORKERS = 4
+
+    # Background board exports, see export_jobs.py: render threads, max jobs queued or running, and the
+    # spool directory of the results (a flask_jira_export directory of the temp dir by default), its size
+    # cap and how long a result is kept
+    EXPORT_JOB_WORKERS = 2
+    EXPORT_JOB_MAX_QUEUED = 100
+    EXPORT_SPOOL_DIR = None
+    EXPORT_SPOOL_MAX_BYTES = 1024 * 1024 * 1024
+    EXPORT_SPOOL_TTL = 3600
+
+    # Read-through cache of the user, team and board lookups, see entity_cache.py. The backend is a
+    # CacheBackend class or its import path, None disables the cache
+    ENTITY_CACHE_BACKEND = 'entity_cache.LocalBackend'
+    ENTITY_CACHE_MAX_ENTRIES = 10000
+    ENTITY_CACHE_TTL = 60
+
+    # Most recent matches of a /search_tasks query ranked by relevance, None to rank every match
+    SEARCH_MAX_CANDIDATES = 10000
+
+    # Group commit of /add_task and /update_task, see group_commit.py: the writes are committed by a writer
+    # thread in batches of at most GROUP_COMMIT_MAX_BATCH, gathered for at most GROUP_COMMIT_MAX_WAIT_MS
+    GROUP_COMMIT = False
+    GROUP_COMMIT_MAX_BATCH = 64
+    GROUP_COMMIT_MAX_WAIT_MS = 2
+
+    # Max number of tasks accepted by a single /add_tasks request
+    ADD_TASKS_MAX_ITEMS = 5000
+
+    # Max number of tasks listed in a single /update_tasks request
+    UPDATE_TASKS_MAX_ITEMS = 5000
+
+    # Max number of users accepted by a single /create_users request
+    CREATE_USERS_MAX_ITEMS = 100000
+
+    # Max number of users added to a team by a single request
+    TEAM_MEMBERSHIP_MAX_USERS = 50
+
+    # SQLite engine profile, see database.database.init_db
+    SQLITE_TUNED = True
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,
+        'mmap_size': 256 * 1024 * 1024,
+        'cache_size': -64 * 1024,
+        'temp_store': 'MEMORY',
+    }
+    SQLITE_POOL_SIZE = 5
+    SQLITE_POOL_MAX_OVERFLOW = 10
+
+    # Max SQL statements a request may issue before a warning is logged, None to disable
+    REQUEST_QUERY_BUDGET = 20
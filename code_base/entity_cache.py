@@ -0,0 +1,172 @@
+import threading
+import time
+from collections import OrderedDict
+
+from werkzeug.utils import import_string
+
+from database.database import db
+from database.flask_models import Board, Team, User
+
+# Columns snapshot for each kind of entity, the cached value is the result row of a query on them
+ENTITY_COLUMNS = {
+    'user': (User.id, User.user_name, User.display_name, User.creation_time),
+    'team': (Team.id, Team.name, Team.description, Team.admin, Team.creation_time),
+    'board': (Board.id, Board.name, Board.description, Board.team_id, Board.status, Board.creation_time),
+}
+
+
+class CacheBackend:
+    """
+    Storage interface of the entity cache. A backend shared between workers (memcached, redis...) can be
+    plugged in with the ENTITY_CACHE_BACKEND setting, it is built with the app config.
+    """
+
+    def __init__(self, config):
+        pass
+
+    def get(self, key):
+        """
+        :return: the value stored under key or None
+        """
+        raise NotImplementedError
+
+    def set(self, key, value, ttl):
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def __len__(self):
+        return 0
+
+
+class LocalBackend(CacheBackend):
+    """
+    In process LRU with a time to live, holding at most ENTITY_CACHE_MAX_ENTRIES values.
+    """
+
+    def __init__(self, config):
+        self.max_entries = config['ENTITY_CACHE_MAX_ENTRIES']
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class EntityCache:
+    """
+    Read-through cache of the user, team and board rows looked up by id on the hot paths.
+
+    Values are immutable result rows with the columns of ENTITY_COLUMNS, never ORM objects, so they can be
+    shared between sessions and threads. Missing entities are not cached, creating one needs no
+    invalidation; every write updating an entity row must call invalidate once it is committed.
+    Entries otherwise expire after ENTITY_CACHE_TTL seconds, which bounds how long another worker
+    may serve a stale row.
+    """
+
+    def __init__(self):
+        self.backend = None
+        self.ttl = 0
+        self.hits = 0
+        self.misses = 0
+        # Bumped by every invalidation, a row loaded while one happened may be stale and is not stored
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        backend = app.config['ENTITY_CACHE_BACKEND']
+        if isinstance(backend, str):
+            backend = import_string(backend)
+        with self._lock:
+            self.backend = backend(app.config) if backend is not None else None
+            self.ttl = app.config['ENTITY_CACHE_TTL']
+            self.hits = self.misses = 0
+
+    def get(self, kind, entity_id):
+        """
+        :return: the row of the entity of the given kind ('user', 'team' or 'board') and id, or None when
+        it does not exist. It is read from the database on a miss.
+        """
+        try:
+            entity_id = int(entity_id)
+        except (TypeError, ValueError):
+            return None
+        key = (kind, entity_id)
+        if self.backend is not None:
+            row = self.backend.get(key)
+            if row is not None:
+                with self._lock:
+                    self.hits += 1
+                return row
+        with self._lock:
+            self.misses += 1
+            generation = self._generation
+        columns = ENTITY_COLUMNS[kind]
+        row = db.session.query(*columns).filter(columns[0] == entity_id).first()
+        if row is not None and self.backend is not None:
+            with self._lock:
+                if generation == self._generation:
+                    self.backend.set(key, row, self.ttl)
+        return row
+
+    def user(self, user_id):
+        return self.get('user', user_id)
+
+    def team(self, team_id):
+        return self.get('team', team_id)
+
+    def board(self, board_id):
+        return self.get('board', board_id)
+
+    def invalidate(self, kind, entity_id):
+        with self._lock:
+            self._generation += 1
+            if self.backend is not None:
+                self.backend.delete((kind, int(entity_id)))
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            if self.backend is not None:
+                self.backend.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {'hits': self.hits, 'misses': self.misses,
+                    'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+                    'entries': len(self.backend) if self.backend is not None else 0}
+
+
+entity_cache = EntityCache()
@@ -0,0 +1,309 @@
+import hashlib
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app, json
+
+from board_export import EXPORT_FORMATS, render_board_table, render_board_tasks
+from database.database import current_shard, shard_scope
+
+# Mimetype and file suffix of the result of a job in each export format
+JOB_FORMATS = {
+    'table': ('text/plain', '.txt'),
+    'csv': (EXPORT_FORMATS['csv'], '.csv'),
+    'ndjson': (EXPORT_FORMATS['ndjson'], '.ndjson'),
+    'json': (EXPORT_FORMATS['json'], '.json'),
+}
+# Suffix of the record of a job, next to its result
+RECORD_SUFFIX = '.job'
+# Files of the spool are named after their job id: records, results, results in progress ending with .part
+# and records being written ending with .tmp
+SPOOL_FILE = re.compile(r'^[0-9a-f]{32}\.\w+(\.part|\.[0-9a-f]{32}\.tmp)?$')
+JOB_ID = re.compile(r'^[0-9a-f]{32}$')
+
+
+def job_id(key):
+    """
+    :return: the id of the job of an export key, the same in every worker
+    """
+    return hashlib.blake2b(repr(key).encode(), digest_size=16).hexdigest()
+
+
+class ExportJob:
+    """
+    A board export rendered in the background. Its state goes from queued to running, then done or failed.
+    """
+
+    def __init__(self, id, board_id, export_format, shard=None, state='queued', size=0, error=None, submitted=None,
+                 finished=None):
+        self.id = id
+        self.board_id = board_id
+        self.format = export_format
+        # the shard of the board in the sharded mode, the worker renders it from there
+        self.shard = shard
+        self.state = state
+        self.size = size
+        self.error = error
+        self.submitted = time.time() if submitted is None else submitted
+        self.finished = finished
+        # the result file in the spool, set by ExportJobs
+        self.path = None
+
+    @property
+    def mimetype(self):
+        return JOB_FORMATS[self.format][0]
+
+    @property
+    def filename(self):
+        return 'board_{}{}'.format(self.board_id, JOB_FORMATS[self.format][1])
+
+    def describe(self):
+        return {'job_id': self.id, 'board_id': self.board_id, 'format': self.format, 'status': self.state,
+                'size': self.size, 'error': self.error}
+
+    def record(self):
+        return {'id': self.id, 'board_id': self.board_id, 'format': self.format, 'shard': self.shard,
+                'state': self.state, 'size': self.size, 'error': self.error, 'submitted': self.submitted,
+                'finished': self.finished}
+
+    @classmethod
+    def from_record(cls, record):
+        return cls(record['id'], record['board_id'], record['format'], record['shard'], record['state'],
+                   record['size'], record['error'], record['submitted'], record['finished'])
+
+
+class ExportJobs:
+    """
+    Board exports rendered off the request workers, on a pool of EXPORT_JOB_WORKERS threads.
+
+    Submitting an export returns a job at once. The id of a job is derived from its (board_id, format, board
+    version): a submission matching a queued, running or finished job of the same version gets that job back,
+    so identical requests render once. Results are written to the EXPORT_SPOOL_DIR directory and kept
+    EXPORT_SPOOL_TTL seconds; past EXPORT_SPOOL_MAX_BYTES the oldest results are deleted first. At most
+    EXPORT_JOB_MAX_QUEUED jobs of a worker wait or run at a time, its further submissions are refused.
+
+    Each job has a json record next to its result, "<job_id>.job", written atomically: the workers sharing the
+    spool read the jobs from there, so a job can be polled and downloaded from any of them and is only rendered
+    by the first worker submitting it. A job left queued or running by a worker that died expires with the ttl.
+    """
+
+    def __init__(self):
+        self.max_workers = 2
+        self.max_queued = 100
+        self.spool_dir = None
+        self.max_bytes = 0
+        self.ttl = 0
+        self.rendered = 0
+        self.coalesced = 0
+        self._pending = 0
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        with self._lock:
+            if self._executor is not None and self.max_workers != app.config['EXPORT_JOB_WORKERS']:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+            self.max_workers = app.config['EXPORT_JOB_WORKERS']
+            self.max_queued = app.config['EXPORT_JOB_MAX_QUEUED']
+            self.spool_dir = app.config['EXPORT_SPOOL_DIR'] or os.path.join(tempfile.gettempdir(), 'flask_jira_export')
+            self.max_bytes = app.config['EXPORT_SPOOL_MAX_BYTES']
+            self.ttl = app.config['EXPORT_SPOOL_TTL']
+        os.makedirs(self.spool_dir, exist_ok=True)
+        self._remove_stale_files()
+
+    @property
+    def executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix='export-job')
+            return self._executor
+
+    def submit(self, board_id, export_format, version):
+        """
+        Queue the export of a board in one of JOB_FORMATS, unless a job already covers this version of it.
+
+        :param version: the version parts of the board, see board_export.board_version
+        :return: (job, created), job is None when too many jobs are queued already
+        """
+        job = self.get(job_id((board_id, export_format) + tuple(version)), failed=True)
+        if job is not None and job.state != 'failed':
+            with self._lock:
+                self.coalesced += 1
+            return job, False
+        with self._lock:
+            if self._pending >= self.max_queued:
+                return None, False
+            self._pending += 1
+        previous = job
+        job = ExportJob(job_id((board_id, export_format) + tuple(version)), board_id, export_format, current_shard())
+        if previous is not None:
+            # a failed job is submitted again
+            self._remove(self._record_path(job.id))
+        if not self._write_record(job, exclusive=True):
+            # submitted by another worker in between
+            with self._lock:
+                self._pending -= 1
+                self.coalesced += 1
+            return self.get(job.id, failed=True), False
+        self.executor.submit(self._run, current_app._get_current_object(), job)
+        return job, True
+
+    def get(self, job_id, failed=True):
+        """
+        :param failed: return failed jobs too
+        :return: the job of that id, None when it is unknown or its result expired
+        """
+        if not JOB_ID.match(job_id):
+            return None
+        try:
+            with open(self._record_path(job_id)) as record_file:
+                job = ExportJob.from_record(json.load(record_file))
+        except (FileNotFoundError, KeyError, ValueError):
+            # a record removed while it was opened, or damaged
+            return None
+        if self._expired(job, time.time() - self.ttl):
+            self._forget(job)
+            return None
+        if job.state == 'failed' and not failed:
+            return None
+        job.path = self._result_path(job)
+        return job
+
+    def _record_path(self, job_id):
+        return os.path.join(self.spool_dir, job_id + RECORD_SUFFIX)
+
+    def _result_path(self, job):
+        return os.path.join(self.spool_dir, job.id + JOB_FORMATS[job.format][1])
+
+    def _write_record(self, job, exclusive=False):
+        """
+        Write the record of a job atomically: it is written aside then moved in place.
+        :param exclusive: only write it when the job has no record yet
+        :return: False when `exclusive` and the job has a record already
+        """
+        path = self._record_path(job.id)
+        temporary = '{}.{}.tmp'.format(path, uuid.uuid4().hex)
+        with open(temporary, 'w') as record_file:
+            json.dump(job.record(), record_file)
+        try:
+            if not exclusive:
+                os.replace(temporary, path)
+                return True
+            try:
+                os.link(temporary, path)
+            except FileExistsError:
+                return False
+            return True
+        finally:
+            self._remove(temporary)
+
+    def _run(self, app, job):
+        job.state = 'running'
+        self._write_record(job)
+        path = self._result_path(job)
+        part = path + '.part'
+        try:
+            with app.app_context(), shard_scope(job.shard):
+                if job.format == 'table':
+                    chunks = render_board_table(job.board_id)
+                else:
+                    _, chunks = render_board_tasks(job.board_id, job.format)
+                with open(part, 'wb') as spool_file:
+                    for chunk in chunks:
+                        spool_file.write(chunk.encode() if isinstance(chunk, str) else chunk)
+            os.replace(part, path)
+        except Exception as err:
+            app.logger.exception('export job %s of board %s failed', job.id, job.board_id)
+            self._remove(part)
+            job.state, job.error, job.finished = 'failed', str(err), time.time()
+        else:
+            job.state, job.size, job.finished = 'done', os.path.getsize(path), time.time()
+            with self._lock:
+                self.rendered += 1
+        finally:
+            with self._lock:
+                self._pending -= 1
+        self._write_record(job)
+        self._sweep()
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _forget(self, job):
+        # the record goes first, a job is never seen without its result
+        self._remove(self._record_path(job.id))
+        self._remove(self._result_path(job))
+
+    @staticmethod
+    def _expired(job, deadline):
+        # unfinished jobs too, their worker may have died
+        return (job.finished if job.finished is not None else job.submitted) < deadline
+
+    def _records(self):
+        """
+        :return: the jobs of the spool, of every worker
+        """
+        jobs = []
+        with os.scandir(self.spool_dir) as entries:
+            for entry in entries:
+                if entry.name.endswith(RECORD_SUFFIX) and SPOOL_FILE.match(entry.name):
+                    try:
+                        with open(entry.path) as record_file:
+                            jobs.append(ExportJob.from_record(json.load(record_file)))
+                    except (FileNotFoundError, KeyError, ValueError):
+                        continue
+        return jobs
+
+    def _sweep(self):
+        """
+        Forget the expired jobs, then the oldest results while the spool is over its size.
+        """
+        deadline = time.time() - self.ttl
+        done = []
+        for job in self._records():
+            if self._expired(job, deadline):
+                self._forget(job)
+            elif job.state == 'done':
+                done.append(job)
+        spool_bytes = sum(job.size for job in done)
+        for job in sorted(done, key=lambda job: job.finished):
+            if spool_bytes <= self.max_bytes:
+                return
+            self._forget(job)
+            spool_bytes -= job.size
+
+    def _remove_stale_files(self):
+        # Results and records past their ttl, and files left by interrupted writes
+        deadline = time.time() - self.ttl
+        with os.scandir(self.spool_dir) as entries:
+            for entry in entries:
+                try:
+                    if SPOOL_FILE.match(entry.name) and entry.stat().st_mtime < deadline:
+                        os.remove(entry.path)
+                except FileNotFoundError:
+                    # removed by another worker sharing the spool
+                    pass
+
+    def stats(self):
+        states = {}
+        spool_bytes = 0
+        for job in self._records():
+            states[job.state] = states.get(job.state, 0) + 1
+            if job.state == 'done':
+                spool_bytes += job.size
+        with self._lock:
+            return {'jobs': states, 'rendered': self.rendered, 'coalesced': self.coalesced,
+                    'spool_bytes': spool_bytes}
+
+
+export_jobs = ExportJobs()
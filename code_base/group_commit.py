@@ -0,0 +1,144 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from flask import current_app
+
+from database.database import current_shard, db, shard_scope
+
+
+class GroupCommitWriter:
+    """
+    Thread applying the queued writes of one database in shared transactions. A batch holds the writes
+    arriving within max_wait seconds of its first one, up to max_batch of them. Each write runs in its own
+    SAVEPOINT so a failing one is rolled back alone and the others still commit.
+    """
+
+    def __init__(self, app, bind_key, stats, max_batch, max_wait):
+        self.app = app
+        self.bind_key = bind_key
+        self.stats = stats
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='group-commit', daemon=True)
+        self._thread.start()
+
+    def submit(self, write):
+        future = Future()
+        self._queue.put((write, future))
+        return future
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get(timeout=max(deadline - time.perf_counter(), 0)))
+                except queue.Empty:
+                    break
+            self._commit(batch)
+
+    def _commit(self, batch):
+        outcomes = []
+        try:
+            with self.app.app_context(), shard_scope(self.bind_key):
+                session = db.session
+                # Take the writer lock at once: the driver would only begin at the first write, and the
+                # first SAVEPOINT would open the transaction and commit it on release
+                session.connection().exec_driver_sql('BEGIN IMMEDIATE')
+                for write, future in batch:
+                    try:
+                        with session.begin_nested():
+                            outcomes.append((future, write(session), None))
+                    except Exception as err:
+                        outcomes.append((future, None, err))
+                session.commit()
+        except Exception as err:
+            # the transaction is lost, so are the writes that went through
+            outcomes = [(future, None, error or err) for future, _, error in outcomes]
+            outcomes += [(future, None, err) for _, future in batch[len(outcomes):]]
+        self.stats.record(len(batch), sum(error is not None for _, _, error in outcomes))
+        for future, result, error in outcomes:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+
+class GroupCommitStats:
+    """
+    Batches committed by the writers, the writes they held and the writes that failed.
+    """
+
+    def __init__(self):
+        self.batches = 0
+        self.writes = 0
+        self.failed = 0
+        self.largest = 0
+        self._lock = threading.Lock()
+
+    def record(self, size, failed):
+        with self._lock:
+            self.batches += 1
+            self.writes += size
+            self.failed += failed
+            self.largest = max(self.largest, size)
+
+    def snapshot(self):
+        with self._lock:
+            return {'batches': self.batches, 'writes': self.writes, 'failed': self.failed,
+                    'largest_batch': self.largest,
+                    'mean_batch': round(self.writes / self.batches, 2) if self.batches else 0}
+
+
+class GroupCommit:
+    """
+    Commit the task writes of concurrent requests together. On SQLite each commit takes the writer lock and
+    syncs the journal, with GROUP_COMMIT the writes are handed to one writer thread per database which
+    commits them in batches of up to GROUP_COMMIT_MAX_BATCH, waiting at most GROUP_COMMIT_MAX_WAIT_MS for a
+    batch to fill. A request then waits for the commit of its batch and gets back its own result or error.
+
+    Writes are functions of the session, they must not commit. Off by default, a write is then applied in
+    the session of the request and committed at once.
+    """
+
+    def __init__(self):
+        self.counters = GroupCommitStats()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        app.extensions['group_commit'] = {}
+
+    def run(self, write):
+        """
+        Apply write(session) and commit it.
+        :return: what write returned
+        :raises: what write or the commit raised
+        """
+        if not current_app.config['GROUP_COMMIT']:
+            result = write(db.session)
+            db.session.commit()
+            return result
+        return self._writer(current_shard()).submit(write).result()
+
+    def _writer(self, bind_key):
+        writers = current_app.extensions['group_commit']
+        writer = writers.get(bind_key)
+        if writer is None:
+            with self._lock:
+                writer = writers.get(bind_key)
+                if writer is None:
+                    config = current_app.config
+                    writer = writers[bind_key] = GroupCommitWriter(
+                        current_app._get_current_object(), bind_key, self.counters, config['GROUP_COMMIT_MAX_BATCH'],
+                        config['GROUP_COMMIT_MAX_WAIT_MS'] / 1000)
+        return writer
+
+    def stats(self):
+        return self.counters.snapshot()
+
+
+group_commit = GroupCommit()
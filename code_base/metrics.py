@@ -0,0 +1,136 @@
+import threading
+import time
+
+from flask import current_app, g, has_app_context, request
+from sqlalchemy import event
+
+from database.database import db
+
+# Upper bounds of the latency histogram buckets, in milliseconds
+LATENCY_BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, float('inf'))
+
+
+class EndpointStats:
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.latency_buckets = [0] * len(LATENCY_BUCKETS_MS)
+        self.latency_ms_total = 0.0
+        self.latency_ms_max = 0.0
+        self.sql_statements_total = 0
+        self.sql_statements_max = 0
+        self.sql_ms_total = 0.0
+        self.over_query_budget = 0
+        self.response_bytes_total = 0
+        self.streamed_responses = 0
+
+    def record(self, latency_ms, status_code, sql_statements, sql_ms, response_bytes, over_budget):
+        self.requests += 1
+        self.errors += status_code >= 500
+        for index, bound in enumerate(LATENCY_BUCKETS_MS):
+            if latency_ms <= bound:
+                self.latency_buckets[index] += 1
+                break
+        self.latency_ms_total += latency_ms
+        self.latency_ms_max = max(self.latency_ms_max, latency_ms)
+        self.sql_statements_total += sql_statements
+        self.sql_statements_max = max(self.sql_statements_max, sql_statements)
+        self.sql_ms_total += sql_ms
+        self.over_query_budget += over_budget
+        if response_bytes is None:
+            self.streamed_responses += 1
+        else:
+            self.response_bytes_total += response_bytes
+
+    def snapshot(self):
+        return {
+            'requests': self.requests,
+            'errors': self.errors,
+            'latency_ms': {
+                'histogram': [{'le': 'inf' if bound == float('inf') else bound, 'count': count}
+                              for bound, count in zip(LATENCY_BUCKETS_MS, self.latency_buckets)],
+                'mean': round(self.latency_ms_total / self.requests, 3),
+                'max': round(self.latency_ms_max, 3),
+            },
+            'sql_statements': {
+                'mean': round(self.sql_statements_total / self.requests, 2),
+                'max': self.sql_statements_max,
+                'over_budget': self.over_query_budget,
+            },
+            'sql_ms_mean': round(self.sql_ms_total / self.requests, 3),
+            'response_bytes_mean': round(self.response_bytes_total / max(1, self.requests - self.streamed_responses)),
+            'streamed_responses': self.streamed_responses,
+        }
+
+
+class Metrics:
+    """
+    Per endpoint request instrumentation: latency histogram, number and duration of the SQL statements issued
+    (counted with SQLAlchemy cursor events) and response size. A warning is logged when a request issues more
+    statements than REQUEST_QUERY_BUDGET, which usually means an N+1 query pattern.
+
+    The statements run while a streamed response is written out come after the request is recorded, they
+    are not counted.
+    """
+
+    def __init__(self):
+        self._endpoints = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        app.before_request(self._start_request)
+        app.after_request(self._end_request)
+        with app.app_context():
+            for engine in db.engines.values():
+                event.listen(engine, 'before_cursor_execute', self._start_statement)
+                event.listen(engine, 'after_cursor_execute', self._end_statement)
+
+    @staticmethod
+    def _start_request():
+        g.metrics_start = time.perf_counter()
+        g.sql_statements = 0
+        g.sql_seconds = 0.0
+
+    def _end_request(self, response):
+        if 'metrics_start' not in g:
+            return response
+        latency_ms = (time.perf_counter() - g.metrics_start) * 1000
+        endpoint = request.endpoint or 'unmatched'
+        budget = current_app.config['REQUEST_QUERY_BUDGET']
+        over_budget = budget is not None and g.sql_statements > budget
+        if over_budget:
+            current_app.logger.warning('%s issued %d SQL statements, over the budget of %d',
+                                       endpoint, g.sql_statements, budget)
+        response_bytes = response.content_length
+        if response_bytes is None and not response.is_streamed:
+            response_bytes = response.calculate_content_length()
+        with self._lock:
+            stats = self._endpoints.get(endpoint)
+            if stats is None:
+                stats = self._endpoints[endpoint] = EndpointStats()
+            stats.record(latency_ms, response.status_code, g.sql_statements, g.sql_seconds * 1000,
+                         response_bytes, over_budget)
+        return response
+
+    @staticmethod
+    def _start_statement(conn, cursor, statement, parameters, context, executemany):
+        if has_app_context() and 'sql_statements' in g:
+            g.sql_statements += 1
+            g.sql_statement_start = time.perf_counter()
+
+    @staticmethod
+    def _end_statement(conn, cursor, statement, parameters, context, executemany):
+        if has_app_context() and 'sql_statement_start' in g:
+            g.sql_seconds += time.perf_counter() - g.pop('sql_statement_start')
+
+    def snapshot(self):
+        with self._lock:
+            return {endpoint: stats.snapshot() for endpoint, stats in sorted(self._endpoints.items())}
+
+    def reset(self):
+        with self._lock:
+            self._endpoints.clear()
+
+
+metrics = Metrics()
@@ -1,14 +1,30 @@
 
-import os
-from datetime import datetime
+from datetime import datetime, timezone
 
-import pandas as pd
-from flask import jsonify, json, send_file
-from marshmallow import Schema, fields, ValidationError
-from tabulate import tabulate
+from flask import current_app, jsonify, Response, send_file, stream_with_context
+from marshmallow import Schema, fields, validate, validates_schema, ValidationError
+from sqlalchemy.exc import IntegrityError
 
+from board_export import (EXPORT_FORMATS, STATUSES, board_version, export_cache, render_board_table, render_board_tasks,
+                          team_exporter)
 from database.database import db
-from database.flask_models import Board, Task, User
+from database.flask_models import Board, BoardStatusCount, Task
+from database.sharding import any_row, merged_page
+from entity_cache import entity_cache
+from export_jobs import JOB_FORMATS, export_jobs
+from group_commit import group_commit
+from query_utils import MAX_PAGE_SIZE, chunked, request_data
+from serializers import RowSerializer
+from task_query import decode_cursor, encode_cursor, task_query_statement
+from task_search import match_expression, search_statement, skipped_statement
+from versions import versions
+
+DEFAULT_SEARCH_LIMIT = 50
+# Deep pages of a ranked search cost as much as all the pages before them
+MAX_SEARCH_OFFSET = 10000
+DEFAULT_QUERY_LIMIT = 100
+QUERY_TASKS_FILTERS = ('user_id', 'status', 'board_id', 'team_id', 'created_after', 'created_before')
+STATUS_VALIDATOR = validate.OneOf(STATUSES)
 
 
 class TaskSchema(Schema):
@@ -20,7 +36,56 @@ class TaskSchema(Schema):
 
 class TaskStatusSchema(Schema):
     id = fields.Int(required=True)
-    status = fields.Str(required=True, validate=lambda s: s in ['OPEN', 'IN_PROGRESS', 'COMPLETE'])
+    status = fields.Str(required=True, validate=STATUS_VALIDATOR)
+
+class TaskFilterSchema(Schema):
+    board_id = fields.Int(required=True)
+    status = fields.Str(validate=STATUS_VALIDATOR)
+
+class BatchTaskStatusSchema(Schema):
+    tasks = fields.List(fields.Nested(TaskStatusSchema))
+    filter = fields.Nested(TaskFilterSchema)
+    status = fields.Str(validate=STATUS_VALIDATOR)
+
+    @validates_schema
+    def validate_selection(self, data, **kwargs):
+        if ('tasks' in data) == ('filter' in data):
+            raise ValidationError('Either tasks or filter is required')
+        if 'filter' in data and 'status' not in data:
+            raise ValidationError('The new status is required with a filter', 'status')
+
+class SearchTasksSchema(Schema):
+    query = fields.Str(required=True, validate=validate.Length(min=1, max=256))
+    board_id = fields.Int()
+    team_id = fields.Int()
+    status = fields.Str(validate=STATUS_VALIDATOR)
+    limit = fields.Int(load_default=DEFAULT_SEARCH_LIMIT, validate=validate.Range(min=1, max=MAX_PAGE_SIZE))
+    offset = fields.Int(load_default=0, validate=validate.Range(min=0, max=MAX_SEARCH_OFFSET))
+
+class QueryTasksSchema(Schema):
+    user_id = fields.Int()
+    status = fields.Str(validate=STATUS_VALIDATOR)
+    board_id = fields.Int()
+    team_id = fields.Int()
+    created_after = fields.AwareDateTime(default_timezone=timezone.utc)
+    created_before = fields.AwareDateTime(default_timezone=timezone.utc)
+    order = fields.Str(load_default='asc', validate=validate.OneOf(['asc', 'desc']))
+    limit = fields.Int(load_default=DEFAULT_QUERY_LIMIT, validate=validate.Range(min=1, max=MAX_PAGE_SIZE))
+    cursor = fields.Str()
+
+    @validates_schema
+    def validate_filters(self, data, **kwargs):
+        if not any(key in data for key in QUERY_TASKS_FILTERS):
+            raise ValidationError('At least one of {} is required'.format(', '.join(QUERY_TASKS_FILTERS)))
+
+class QueriedTaskSchema(Schema):
+    id = fields.Int()
+    title = fields.Str()
+    description = fields.Str()
+    user_id = fields.Int()
+    status = fields.Str()
+    board_id = fields.Int()
+    creation_time = fields.DateTime()
 
 class BoardSchema(Schema):
     id = fields.Int(dump_only=True)
@@ -34,6 +99,17 @@ class CreateBoardRequestSchema(Schema):
 
 
 
+task_schema = TaskSchema()
+tasks_schema = TaskSchema(many=True)
+task_status_schema = TaskStatusSchema()
+batch_task_status_schema = BatchTaskStatusSchema()
+create_board_request_schema = CreateBoardRequestSchema()
+search_tasks_schema = SearchTasksSchema()
+query_tasks_schema = QueryTasksSchema()
+queried_task_serializer = RowSerializer.from_schema(QueriedTaskSchema)
+board_serializer = RowSerializer.from_schema(BoardSchema)
+
+
 class ProjectBoardBase:
     """
     A project board is a unit of delivery for a project. Each board will have a set of tasks assigned to a user.
@@ -56,11 +132,10 @@ class ProjectBoardBase:
          * board name can be max 64 characters
          * description can be max 128 characters
         """
-        schema = CreateBoardRequestSchema()
         try:
-            data = schema.load(request.get_json())
-        except ValidationError  as errors:
-            return jsonify(errors), 400
+            data = create_board_request_schema.load(request.get_json())
+        except ValidationError as errors:
+            return jsonify({'error': errors.messages}), 400
         name = data['name']
         description = data['description']
         team_id = data['team_id']
@@ -94,26 +169,113 @@ class ProjectBoardBase:
         """
         # Parse and validate the request data
         data = request.get_json()
-        schema = TaskSchema()
         try:
-            task_data= schema.load(data)
+            task_data= task_schema.load(data)
         except ValidationError as errors:
-            return jsonify({'error': errors}), 400
+            return jsonify({'error': errors.messages}), 400
 
         # Check if the board is open
-        board = Board.query.filter_by(id=task_data['board_id']).first()
+        board = entity_cache.board(task_data['board_id'])
         if not board:
             return jsonify({'error': 'Board not found'}), 404
         if board.status != 'OPEN':
             return jsonify({'error': 'Cannot add task to closed board'}), 400
 
         # Create the task
-        task = Task(title=task_data['title'], description=task_data['description'], user_id=task_data['user_id'],
-                    creation_time=datetime.utcnow(), board_id=board.id)
-        db.session.add(task)
-        db.session.commit()
+        def insert_task(session):
+            task = Task(title=task_data['title'], description=task_data['description'], user_id=task_data['user_id'],
+                        creation_time=datetime.utcnow(), board_id=board.id)
+            session.add(task)
+            session.flush()
+            return task.id
+
+        task_id = group_commit.run(insert_task)
 
-        return jsonify({'id': task.id}), 201
+        return jsonify({'id': task_id}), 201
+
+    def add_tasks(self, request):
+        """
+        :param request: A json list of tasks, each with the same fields as for add_task
+        [
+            {
+                "title" : "<task title>",
+                "description" : "<description>",
+                "user_id" : "<user id>",
+                "board_id" : "<board id>"
+            }
+        ]
+        :return: A json string with one result per task, in the order of the request
+        {
+            "results" : [
+                {"status" : 201, "id" : "<task_id>"},
+                {"status" : "<4xx>", "error" : "<reason the task was not created>"}
+            ]
+        }
+        The response is 201 when every task was created, 207 when only some were and 400 when none was.
+
+        All the boards are checked with a single query and the valid tasks are inserted in a single transaction.
+        Same constraints as add_task, plus a cap of ADD_TASKS_MAX_ITEMS tasks per request.
+        """
+        data = request.get_json()
+        if not isinstance(data, list):
+            return jsonify({'error': 'A list of tasks is expected'}), 400
+        max_items = current_app.config['ADD_TASKS_MAX_ITEMS']
+        if len(data) > max_items:
+            return jsonify({'error': 'more than {} tasks not allowed'.format(max_items)}), 400
+
+        results = [None] * len(data)
+        for index, messages in tasks_schema.validate(data).items():
+            results[index] = {'status': 400, 'error': messages}
+        indexes = [index for index, result in enumerate(results) if result is None]
+        tasks = dict(zip(indexes, tasks_schema.load([data[index] for index in indexes])))
+
+        # Check all the target boards at once
+        board_ids = {task['board_id'] for task in tasks.values()}
+        board_status = dict(db.session.query(Board.id, Board.status).filter(Board.id.in_(board_ids)).all()) \
+            if board_ids else {}
+
+        # Titles must not be taken, neither on the boards nor earlier in the batch
+        titles = {task['title'] for task in tasks.values()}
+        taken = set()
+        for titles_chunk in chunked(titles):
+            taken.update(title for title, in db.session.query(Task.title).filter(Task.title.in_(titles_chunk)))
+
+        creation_time = datetime.utcnow()
+        rows = {}
+        for index, task in tasks.items():
+            status = board_status.get(task['board_id'])
+            if status is None:
+                results[index] = {'status': 404, 'error': 'Board not found'}
+            elif status != 'OPEN':
+                results[index] = {'status': 400, 'error': 'Cannot add task to closed board'}
+            elif task['title'] in taken:
+                results[index] = {'status': 400, 'error': 'Task title already exists'}
+            else:
+                taken.add(task['title'])
+                rows[index] = {'title': task['title'], 'description': task.get('description'),
+                               'user_id': task['user_id'], 'creation_time': creation_time,
+                               'board_id': task['board_id'], 'status': 'OPEN'}
+
+        if rows:
+            try:
+                db.session.execute(Task.__table__.insert(), list(rows.values()))
+                ids = {}
+                for titles_chunk in chunked(row['title'] for row in rows.values()):
+                    ids.update(db.session.query(Task.title, Task.id).filter(Task.title.in_(titles_chunk)).all())
+                db.session.commit()
+            except IntegrityError as e:
+                db.session.rollback()
+                return jsonify({'error': str(e.orig)}), 400
+            for index, row in rows.items():
+                results[index] = {'status': 201, 'id': ids[row['title']]}
+
+        if len(rows) == len(results):
+            status_code = 201
+        elif rows:
+            status_code = 207
+        else:
+            status_code = 400
+        return jsonify({'results': results}), status_code
 
     def update_task_status(self, request: str):
         """
@@ -125,59 +287,388 @@ class ProjectBoardBase:
         """
 
         data = request.get_json()
-        schema = TaskStatusSchema()
         try:
-            task_data = schema.load(data)
+            task_data = task_status_schema.load(data)
         except ValidationError as errors:
-            return jsonify({'error': errors}), 400
-
-        # Check if the task exists
-        task = Task.query.get(task_data['id'])
-        if not task:
+            return jsonify({'error': errors.messages}), 400
+
+        def set_status(session):
+            # Check if the task exists
+            task = session.get(Task, task_data['id'])
+            if not task:
+                return None
+            # Update the task status
+            task.status = task_data['status']
+            return task.board_id
+
+        board_id = group_commit.run(set_status)
+        if board_id is None:
             return jsonify({'error': 'Task not found'}), 404
 
-        # Update the task status
-        task.status = task_data['status']
+        return jsonify({'status': 'success'}), 200
+
+
+    def update_tasks_status(self, request):
+        """
+        :param request: A json string with either the new status of each task
+        {
+            "tasks" : [{"id" : "<task_id>", "status" : "OPEN | IN_PROGRESS | COMPLETE"}]
+        }
+        or a filter selecting the tasks of a board, optionally only those in a given status, and their new status
+        {
+            "filter" : {"board_id" : "<board_id>", "status" : "OPEN | IN_PROGRESS | COMPLETE"},
+            "status" : "OPEN | IN_PROGRESS | COMPLETE"
+        }
+        :return: A json string with the number of tasks moved to each status {"updated" : {"<status>" : <count>}}
+
+        The tasks are updated with one UPDATE ... WHERE statement per status and chunk of ids, in a single transaction.
+
+        Constraint:
+        * Cap the tasks listed in a request to UPDATE_TASKS_MAX_ITEMS
+        """
+        try:
+            data = batch_task_status_schema.load(request.get_json())
+        except ValidationError as errors:
+            return jsonify({'error': errors.messages}), 400
+
+        task_table = Task.__table__
+        updated = {}
+        if 'filter' in data:
+            board_id = data['filter']['board_id']
+            statement = task_table.update().where(task_table.c.board_id == board_id)
+            if 'status' in data['filter']:
+                statement = statement.where(task_table.c.status == data['filter']['status'])
+            result = db.session.execute(statement.values(status=data['status']))
+            updated[data['status']] = result.rowcount
+        else:
+            max_items = current_app.config['UPDATE_TASKS_MAX_ITEMS']
+            if len(data['tasks']) > max_items:
+                return jsonify({'error': 'more than {} tasks not allowed'.format(max_items)}), 400
+            # The last status given for a task wins
+            statuses = {task['id']: task['status'] for task in data['tasks']}
+            ids_by_status = {}
+            for task_id, status in statuses.items():
+                ids_by_status.setdefault(status, []).append(task_id)
+            for status, ids in ids_by_status.items():
+                updated[status] = 0
+                for ids_chunk in chunked(ids):
+                    result = db.session.execute(
+                        task_table.update().where(task_table.c.id.in_(ids_chunk)).values(status=status))
+                    updated[status] += result.rowcount
         db.session.commit()
 
-        return jsonify({'status': 'success'}), 200
+        return jsonify({'updated': updated}), 200
 
+    def search_tasks(self, request):
+        """
+        :param request: A json string with the text to look for in the task titles and descriptions, and
+        optional filters
+        {
+            "query" : "<words>",
+            "board_id" : "<board_id>",
+            "team_id" : "<team_id>",
+            "status" : "OPEN | IN_PROGRESS | COMPLETE",
+            "limit" : "<max number of tasks, 50 by default>",
+            "offset" : "<number of tasks to skip>"
+        }
+        :return: A json list of the tasks containing every word, best match first
+        [
+            {"id" : "<task_id>", "title" : "<title>", "description" : "<description>", "status" : "<status>",
+             "board_id" : "<board_id>", "rank" : "<bm25 score, lower is better>"}
+        ]
+        When the page is full the offset of the next one is sent back in the X-Next-Offset header.
+
+        Words are matched on the FTS5 index of task, a trailing * matches a prefix, e.g. "deploy*".
+        Only the SEARCH_MAX_CANDIDATES most recent matching tasks are ranked, when older ones were left out
+        the response carries an X-Search-Truncated: true header.
+        In the sharded mode a search without board_id and team_id runs on every shard, the ranks computed by
+        each one are merged and SEARCH_MAX_CANDIDATES applies per shard.
+        """
+        try:
+            data = search_tasks_schema.load(request.get_json())
+        except ValidationError as errors:
+            return jsonify({'error': errors.messages}), 400
+        match = match_expression(data['query'])
+        if match is None:
+            return jsonify({'error': {'query': ['No word to search for']}}), 400
+        filters = (data.get('board_id'), data.get('team_id'), data.get('status'))
+        max_candidates = current_app.config['SEARCH_MAX_CANDIDATES']
+        rows = merged_page(search_statement(match, *filters, max_candidates), lambda row: (row.rank, row.id),
+                           data['limit'], data['offset'])
+        tasks = [dict(row._mapping) for row in rows]
+        response = jsonify(tasks)
+        if len(tasks) == data['limit']:
+            response.headers['X-Next-Offset'] = str(data['offset'] + len(tasks))
+        if max_candidates is not None and any_row(skipped_statement(match, *filters, max_candidates)):
+            response.headers['X-Search-Truncated'] = 'true'
+        return response
+
+    def query_tasks(self, request):
+        """
+        :param request: A json string with optional filters, every given one must match
+        {
+            "user_id" : "<id of the user the tasks are assigned to>",
+            "status" : "OPEN | IN_PROGRESS | COMPLETE",
+            "board_id" : "<board_id>",
+            "team_id" : "<team_id>",
+            "created_after" : "<date:time, inclusive>",
+            "created_before" : "<date:time, exclusive>",
+            "order" : "asc | desc, on creation_time then id, asc by default",
+            "limit" : "<max number of tasks, 100 by default>",
+            "cursor" : "<X-Next-Cursor of the previous page>"
+        }
+        Times without an offset are taken as UTC.
+        :return: A json list of the matching tasks, oldest first or newest first
+        [
+            {"id" : "<task_id>", "title" : "<title>", "description" : "<description>", "user_id" : "<user_id>",
+             "status" : "<status>", "board_id" : "<board_id>", "creation_time" : "<date:time>"}
+        ]
+        When the page is full the cursor of the next one is sent back in the X-Next-Cursor header.
+
+        Pages are keyset paginated on (creation_time, id), each one seeks its first task in an index.
+        In the sharded mode a query without board_id and team_id reads a page from every shard and merges them.
+
+        Constraint:
+            * at least one filter is required, export_board lists the whole board
+        """
+        try:
+            data = query_tasks_schema.load(request.get_json())
+            after = decode_cursor(data['cursor']) if 'cursor' in data else None
+        except ValidationError as errors:
+            return jsonify({'error': errors.messages}), 400
+        except ValueError as error:
+            return jsonify({'error': {'cursor': [str(error)]}}), 400
+        # creation_time is stored as naive UTC
+        for key in ('created_after', 'created_before'):
+            if key in data:
+                data[key] = data[key].astimezone(timezone.utc).replace(tzinfo=None)
+        statement = task_query_statement(data.get('user_id'), data.get('status'), data.get('board_id'),
+                                         data.get('team_id'), data.get('created_after'), data.get('created_before'),
+                                         data['order'] == 'desc', after)
+        tasks = merged_page(statement, lambda row: (row.creation_time, row.id), data['limit'],
+                            descending=data['order'] == 'desc')
+        response = jsonify(queried_task_serializer.dump_many(tasks))
+        if len(tasks) == data['limit']:
+            response.headers['X-Next-Cursor'] = encode_cursor(tasks[-1])
+        return response
 
     def list_board(self,request):
+        """
+        :param request: A json string with the team identifier, or the same as query arguments of a GET
+        {
+            "team_id" : "<team_id>"
+        }
+        :return: A json list with the id and name of every board of the team. GET responses carry an ETag,
+        send it back in If-None-Match to get a 304 while the boards of the team have not changed.
+        """
         # Parse and validate the request data
-        data = request.get_json()
-        team_id=data['team_id']
+        data = request_data(request)
+        try:
+            team_id = int(data['team_id'])
+        except (KeyError, TypeError, ValueError):
+            return jsonify({'error': 'A team id is required'}), 400
         # Get the boards for the team
-        boards = Board.query.filter_by(team_id=team_id).all()
+        boards = db.session.query(Board.id, Board.name).filter_by(team_id=team_id).all()
         if not boards:
             return jsonify({'error': 'No boards found for the team'}), 404
         # Serialize the boards
-        schema = BoardSchema(many=True)
-        result = schema.dump(boards)
+        result = board_serializer.dump_many(boards)
         return jsonify(result), 200
 
+    def list_board_version(self, request):
+        """
+        :return: the version token parts of the board list of a team, see versions.conditional
+        """
+        try:
+            team_id = int(request_data(request)['team_id'])
+        except (KeyError, TypeError, ValueError):
+            return None
+        return 'boards', team_id, versions.get('boards', team_id)
+
+    def export_board_version(self, request):
+        """
+        :return: the version token parts of a board export, see versions.conditional and
+        board_export.board_version
+        """
+        data = request_data(request)
+        try:
+            board_id = int(data['id'])
+        except (KeyError, ValueError):
+            return None
+        export_format = data.get('format', 'table')
+        if export_format != 'table' and export_format not in EXPORT_FORMATS:
+            return None
+        return ('board', board_id, export_format) + board_version(board_id)
+
+    def board_summary(self, request):
+        """
+        :param request: A json string with the team identifier
+        {
+            "team_id" : "<team_id>"
+        }
+        :return: A json list with the number of tasks in each status of every board of the team
+        [
+            {"id" : "<board_id>", "name" : "<board_name>", "counts" : {"OPEN" : 0, "IN_PROGRESS" : 0, "COMPLETE" : 0}}
+        ]
+        The counts come from the board_status_count table, kept up to date on every task write, so the
+        summary reads one row per board and status and never the tasks themselves.
+        """
+        data = request.get_json()
+        try:
+            team_id = int(data['team_id'])
+        except (KeyError, TypeError, ValueError):
+            return jsonify({'error': 'A team id is required'}), 400
+        rows = db.session.query(Board.id, Board.name, BoardStatusCount.status, BoardStatusCount.count) \
+            .outerjoin(BoardStatusCount, BoardStatusCount.board_id == Board.id) \
+            .filter(Board.team_id == team_id) \
+            .order_by(Board.id) \
+            .all()
+        if not rows:
+            return jsonify({'error': 'No boards found for the team'}), 404
+        boards = {}
+        for board_id, name, status, count in rows:
+            board = boards.get(board_id)
+            if board is None:
+                board = boards[board_id] = {'id': board_id, 'name': name, 'counts': dict.fromkeys(STATUSES, 0)}
+            if status is not None:
+                board['counts'][status] = count
+        return jsonify(list(boards.values())), 200
+
     def export_board(self,request):
-        json_data = json.loads(request.data)
-        id = json_data['id']
-        # df=pd.read_sql(db.session.query(Task.id,Task.title,User.name,Task.status).filter(Task.board_id==id).\
-        #     join(User,User.id==Task.user_id).statement,db.engine)
-        df = pd.read_sql(db.session.query(Task.id, Task.title, User.user_name, Task.status).filter(Task.board_id == id). \
-                         join(User, User.id == Task.user_id).statement, db.engine)
-        df['task'] = df['id'].map(str) + '-->' + df['title'] + '(' + df['user_name'] + ')'
-        df = df[['task', 'status']]
-        df = df.pivot(columns='status', values='task')
-        df = df.reindex(columns=['OPEN', 'IN_PROGRESS', 'COMPLETE'],fill_value=None)
-        df = df.fillna('')
-        file_path = os.path.abspath("../out/board_{}.txt".format(id))
-        print(file_path)
-
-
-        with open(file_path, 'w') as the_file:
-            the_file.write(tabulate(df, headers='keys', showindex=False, tablefmt='psql'))
-            # Check if the file exists
-            if not os.path.exists(file_path):
-                return jsonify({'error': 'File not found'}), 404
-        return send_file(file_path,mimetype='text/plain')
+        """
+        :param request: A json string with the board identifier and optionally the export format, or the same
+        as query arguments of a GET
+        {
+            "id" : "<board_id>",
+            "format" : "table | csv | ndjson | json"
+        }
+        :return: By default the board as a psql style table with an OPEN, IN_PROGRESS and COMPLETE column, one
+        task per line. Exports are cached until a task of the board is added or updated.
+        The other formats list the id, title, user_name, status and creation_time of every task, ordered by id:
+         * csv: a header line then one line per task
+         * ndjson: one object per line then a trailer line {"total_rows" : <count>, "bytes" : <size of the task lines>}
+         * json: {"tasks" : [...], "total_rows" : <count>, "bytes" : <size of the tasks array>}
+        They are sent with the number of tasks in the X-Total-Rows header.
+        Every export is streamed as the tasks are read, in chunks, nothing is written to disk. GET responses
+        carry an ETag, send it back in If-None-Match to get a 304 while the tasks of the board have not changed.
+        """
+        json_data = request_data(request)
+        try:
+            id = int(json_data['id'])
+        except (KeyError, TypeError, ValueError):
+            return jsonify({'error': 'A board id is required'}), 400
+        export_format = json_data.get('format', 'table')
+        if export_format in EXPORT_FORMATS:
+            total, chunks = render_board_tasks(id, export_format)
+            response = Response(stream_with_context(chunks), mimetype=EXPORT_FORMATS[export_format])
+            response.headers['X-Total-Rows'] = str(total)
+            return response
+        if export_format != 'table':
+            return jsonify({'error': 'Unknown export format {}'.format(export_format)}), 400
+        version, table = export_cache.get(id)
+        if table is not None:
+            return Response(table, mimetype='text/plain')
+        table = export_cache.tee(id, version, render_board_table(id))
+        return Response(stream_with_context(table), mimetype='text/plain')
+
+    def export_team(self, request):
+        """
+        :param request: A json string with the team identifier
+        {
+            "team_id" : "<team_id>"
+        }
+        :return: A zip archive with the export of every board of the team, one "<board_id>-<board_name>.txt"
+        psql style table per board, the same table as export_board. The archive is streamed as the boards
+        are rendered, nothing is written to disk.
+        """
+        data = request.get_json()
+        try:
+            team_id = int(data['team_id'])
+        except (KeyError, TypeError, ValueError):
+            return jsonify({'error': 'A team id is required'}), 400
+        session = db.session()
+        boards = session.query(Board.id, Board.name).filter(Board.team_id == team_id).all()
+        if not boards:
+            return jsonify({'error': 'No boards found for the team'}), 404
+        archive = team_exporter.archive(session, [tuple(board) for board in boards])
+        response = Response(stream_with_context(archive), mimetype='application/zip')
+        response.headers['Content-Disposition'] = 'attachment; filename=team_{}.zip'.format(team_id)
+        return response
 
+    def submit_export_job(self, request):
+        """
+        :param request: A json string with the board identifier and optionally the export format, as for
+        export_board
+        {
+            "id" : "<board_id>",
+            "format" : "table | csv | ndjson | json"
+        }
+        :return: A json string with the export job, 202 while it is rendered in the background
+        {
+            "job_id" : "<job_id>",
+            "board_id" : "<board_id>",
+            "format" : "<format>",
+            "status" : "queued | running | done | failed",
+            "size" : "<size of the result in bytes>",
+            "error" : "<reason of a failure>"
+        }
+        The job url is sent in the Location header, poll it until the job is done then download the result
+        from <job url>/file. Submitting the export of a board that has not changed since a previous
+        submission returns the job of that submission.
+        """
+        data = request.get_json()
+        try:
+            board_id = int(data['id'])
+        except (KeyError, TypeError, ValueError):
+            return jsonify({'error': 'A board id is required'}), 400
+        export_format = data.get('format', 'table')
+        if export_format not in JOB_FORMATS:
+            return jsonify({'error': 'Unknown export format {}'.format(export_format)}), 400
+        if entity_cache.board(board_id) is None:
+            return jsonify({'error': 'Board not found'}), 404
+        job, _ = export_jobs.submit(board_id, export_format, board_version(board_id))
+        if job is None:
+            return jsonify({'error': 'Too many exports in progress, retry later'}), 503
+        response = jsonify(job.describe())
+        response.status_code = 200 if job.state == 'done' else 202
+        response.headers['Location'] = '/export_jobs/{}'.format(job.id)
+        return response
+
+    def export_job_status(self, job_id):
+        """
+        :param job_id: the id of a job returned by submit_export_job
+        :return: A json string with the export job, as returned by submit_export_job. Jobs are forgotten once
+        their result expires.
+        """
+        job = export_jobs.get(job_id)
+        if job is None:
+            return jsonify({'error': 'Unknown or expired export job'}), 404
+        return jsonify(job.describe()), 200
 
+    def download_export_job(self, job_id):
+        """
+        :param job_id: the id of a job returned by submit_export_job
+        :return: the result of the job, an attachment in the format of the export. 409 while the job is not done.
+        """
+        job = export_jobs.get(job_id)
+        if job is None:
+            return jsonify({'error': 'Unknown or expired export job'}), 404
+        if job.state != 'done':
+            return jsonify(job.describe()), 409
+        try:
+            return send_file(job.path, mimetype=job.mimetype, as_attachment=True, download_name=job.filename)
+        except FileNotFoundError:
+            # evicted from the spool since the job was looked up
+            return jsonify({'error': 'Unknown or expired export job'}), 404
 
+    def export_cache_stats(self):
+        """
+        :return: A json string with the export cache counters
+        {
+            "hits" : "<exports served from the cache>",
+            "misses" : "<exports rendered from the database>",
+            "entries" : "<cached exports>",
+            "bytes" : "<size of the cached exports>"
+        }
+        """
+        return jsonify(export_cache.stats()), 200
@@ -0,0 +1,124 @@
+from flask import Response, json, jsonify, stream_with_context
+from marshmallow import EXCLUDE, Schema, fields, validate
+
+DEFAULT_STREAM_CHUNK_SIZE = 1000
+MAX_PAGE_SIZE = 1000
+# Stay well below the bound parameter limit of older SQLite builds (999)
+IN_CLAUSE_CHUNK_SIZE = 500
+
+
+class PageArgsSchema(Schema):
+    class Meta:
+        # other query arguments, e.g. the cache busters of HTTP clients, are not ours to reject
+        unknown = EXCLUDE
+
+    after_id = fields.Integer(load_default=None, validate=validate.Range(min=0))
+    limit = fields.Integer(load_default=None, validate=validate.Range(min=1, max=MAX_PAGE_SIZE))
+    stream = fields.Boolean(load_default=False)
+
+
+page_args_schema = PageArgsSchema()
+
+
+def page_args(request):
+    """
+    Parse the keyset pagination arguments of a list request.
+
+    :param request: the incoming request, e.g. GET /userlist?after_id=100&limit=50&stream=true
+    :return: a dict with "after_id", "limit" and "stream"
+    :raises ValidationError: on malformed arguments
+    """
+    return page_args_schema.load(request.args)
+
+
+def request_data(request, silent=False):
+    """
+    Arguments of a request that may be sent either way: the query arguments of a GET or HEAD request, which
+    can be answered from the HTTP caches, the json body of the other methods.
+
+    :param silent: return None instead of raising when the body is not json
+    """
+    if request.method in ('GET', 'HEAD'):
+        return request.args.to_dict()
+    return request.get_json(force=True, silent=silent)
+
+
+def keyset_page(query, id_column, after_id=None, limit=None):
+    """
+    Restrict a query to the rows following the cursor `after_id`, walking the primary-key index
+    instead of using OFFSET so every page costs the same whatever its position.
+    Works on ORM queries as well as on select() statements.
+    """
+    if after_id is not None:
+        query = query.filter(id_column > after_id)
+    query = query.order_by(id_column)
+    if limit is not None:
+        query = query.limit(limit)
+    return query
+
+
+def page_response(rows, dump, limit=None):
+    """
+    Serialize a page of rows as a json list. When the page is full the id of its last row is returned in
+    the X-Next-After-Id header, to be passed back as `after_id` to fetch the next page.
+    """
+    response = jsonify(dump(rows))
+    if limit is not None and len(rows) == limit:
+        response.headers['X-Next-After-Id'] = str(rows[-1].id)
+    return response
+
+
+def stream_json_array(query, dump_row, chunk_size=DEFAULT_STREAM_CHUNK_SIZE):
+    """
+    Stream the rows of a query as a json array. Rows are fetched `chunk_size` at a time and written out
+    as soon as they are serialized, so memory stays flat however large the table is.
+    """
+    def generate():
+        yield '['
+        separator = ''
+        chunk = []
+        for row in query.yield_per(chunk_size):
+            chunk.append(json.dumps(dump_row(row)))
+            if len(chunk) == chunk_size:
+                yield separator + ','.join(chunk)
+                separator = ','
+                chunk = []
+        if chunk:
+            yield separator + ','.join(chunk)
+        yield ']'
+
+    return Response(stream_with_context(closing_session(query.session, generate())), mimetype='application/json')
+
+
+def closing_session(session, chunks):
+    """
+    Pass streamed chunks through and close `session` once they are consumed or the client goes away.
+
+    The session of a view is closed at the end of the request, before the response is streamed. Running the
+    queries of the stream reopens it and nothing else would close it again, leaking its connection.
+    """
+    try:
+        yield from chunks
+    finally:
+        session.close()
+
+
+def read_snapshot(session):
+    """
+    Make the next queries of `session` read the same snapshot of the database.
+
+    pysqlite only opens a transaction before a write, every SELECT otherwise runs in autocommit and reads
+    the database as it is at that moment. The explicit BEGIN lasts until the session is committed or closed.
+    """
+    connection = session.connection()
+    if not connection.connection.driver_connection.in_transaction:
+        connection.exec_driver_sql('BEGIN')
+
+
+def chunked(values, size=IN_CLAUSE_CHUNK_SIZE):
+    """
+    Split a sequence into lists of at most `size` items, e.g. to bound the parameters of an IN clause.
+    """
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
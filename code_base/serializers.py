@@ -0,0 +1,65 @@
+from flask.json.provider import DefaultJSONProvider
+from marshmallow import fields
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is an optional speedup
+    orjson = None
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    Flask json provider encoding with orjson when it is installed. Values orjson does not handle the way Flask
+    does (datetimes, dataclasses) are passed through to Flask's default hook so responses keep the same content.
+    Falls back to the standard json module otherwise, or when pretty printing is requested.
+    """
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs.get('indent') is not None or 'cls' in kwargs:
+            return super().dumps(obj, **kwargs)
+        option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS | orjson.OPT_NON_STR_KEYS
+        if kwargs.get('sort_keys', self.sort_keys):
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=kwargs.get('default', self.default), option=option).decode()
+
+
+class RowSerializer:
+    """
+    Dump flat rows, ORM objects or query result rows, to dicts without going through marshmallow.
+
+    It is built once from a schema whose fields are all plain columns and produces the same dict as the
+    schema's dump: strings and numbers are copied as is and datetimes are rendered in ISO 8601.
+    """
+
+    PLAIN_FIELDS = (fields.String, fields.Integer, fields.Float, fields.Boolean)
+
+    def __init__(self, attributes, datetime_attributes=(), keys=None):
+        self.attributes = tuple(attributes)
+        self.keys = tuple(keys or attributes)
+        self.datetime_keys = tuple(key for key, attribute in zip(self.keys, self.attributes)
+                                   if attribute in datetime_attributes)
+
+    @classmethod
+    def from_schema(cls, schema_class):
+        schema = schema_class()
+        attributes, datetime_attributes, keys = [], [], []
+        for name, field in schema.dump_fields.items():
+            attribute = field.attribute or name
+            if isinstance(field, fields.DateTime) and field.format in (None, 'iso'):
+                datetime_attributes.append(attribute)
+            elif not isinstance(field, cls.PLAIN_FIELDS):
+                raise ValueError('{}.{} is not a plain column field'.format(schema_class.__name__, name))
+            attributes.append(attribute)
+            keys.append(field.data_key or name)
+        return cls(attributes, datetime_attributes, keys)
+
+    def dump(self, row):
+        data = {key: getattr(row, attribute) for key, attribute in zip(self.keys, self.attributes)}
+        for key in self.datetime_keys:
+            value = data[key]
+            if value is not None:
+                data[key] = value.isoformat()
+        return data
+
+    def dump_many(self, rows):
+        return [self.dump(row) for row in rows]
@@ -2,24 +2,54 @@ from flask import Flask
 
 
 from api.board_api import board_bp
+from api.metrics_api import metrics_bp
 from api.team_api import team_bp
 from api.user_api import user_bp
-from database.database import db
+from board_export import export_cache, team_exporter
+from entity_cache import entity_cache
+from export_jobs import export_jobs
+from group_commit import group_commit
+from config import Config
+from database.database import db, init_db
+from metrics import metrics
+from serializers import FastJSONProvider
 
 
-def create_app():
+def create_app(config=None):
     app = Flask(__name__)
+    app.json = FastJSONProvider(app)
+    app.config.from_object(Config)
+    app.config.from_prefixed_env()
+    if config:
+        app.config.update(config)
     # configure SQLAlchemy
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///test.database'
-    db.init_app(app)
+    init_db(app)
+    export_cache.init_app(app)
+    team_exporter.init_app(app)
+    export_jobs.init_app(app)
+    group_commit.init_app(app)
+    entity_cache.init_app(app)
+    metrics.init_app(app)
     app.register_blueprint(user_bp)
     app.register_blueprint(team_bp)
     app.register_blueprint(board_bp)
+    app.register_blueprint(metrics_bp)
     return app
 
 def setup_database(app):
+    from database.migrations import migrate
+
     with app.app_context():
-        db.create_all()
+        # binding the shards registers an empty metadata for each on db, shared by every app, they are prepared below
+        db.create_all(bind_key=None)
+        migrate(db.engine)
+        if app.config['SHARD_BINDS']:
+            from database.sharding import prepare
+
+            prepare(db.engine.url.database, [db.engines[key].url.database for key in app.config['SHARD_BINDS']])
+            # connections opened before the shards had their tables have no global database attached
+            for key in app.config['SHARD_BINDS']:
+                db.engines[key].dispose()
 
 
 
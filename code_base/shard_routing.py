@@ -0,0 +1,118 @@
+from functools import wraps
+
+from flask import current_app, g, jsonify, request
+
+from database.flask_models import Board, Task
+from database.sharding import SHARD_ID_SPAN, block_shard, row_shard, rows_shards, team_shard
+from query_utils import request_data
+
+
+class CrossShardBatch(Exception):
+    """
+    Raised by a locator when the items of a batch are in several shards.
+    """
+
+    def __init__(self, indexes):
+        super().__init__(indexes)
+        # indexes of the items outside the shard of the first one
+        self.indexes = indexes
+
+
+def sharded(locate):
+    """
+    View decorator routing the statements of a board API request to the shard of its team, see
+    database/sharding.py. It does nothing unless SHARD_BINDS is set.
+
+    :param locate: called with the arguments of the request, see query_utils.request_data, returns the index of
+    its shard. It raises KeyError, IndexError, TypeError or ValueError when they name no team, board or task
+    to route on, CrossShardBatch for a batch spanning shards, the request is then answered with a 400, and None
+    when the request reads or writes no board, the view then runs unrouted.
+    The shard stays set for the rest of the request, streamed responses included.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            bind_keys = current_app.config['SHARD_BINDS']
+            if not bind_keys:
+                return view(*args, **kwargs)
+            try:
+                shard = locate(request_data(request, silent=True))
+            except CrossShardBatch as err:
+                return jsonify({'error': 'The items {} are in another shard than the first one, a batch must stay '
+                                         'within one shard'.format(err.indexes)}), 400
+            except (KeyError, IndexError, TypeError, ValueError):
+                return jsonify({'error': 'A team_id, board_id or task id is required in the sharded mode'}), 400
+            if shard is None:
+                return view(*args, **kwargs)
+            g.shard = bind_keys[shard]
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def by_team(field='team_id', pin=False):
+    """
+    :param pin: pin the team to its default shard when it has none, for the requests creating its boards
+    """
+    return lambda data: team_shard(int(data[field]), pin)
+
+
+def by_board(field='board_id'):
+    return lambda data: row_shard(Board, int(data[field]))
+
+
+def by_task(field='id'):
+    return lambda data: row_shard(Task, int(data[field]))
+
+
+def by_items(model, field, items=lambda data: data):
+    """
+    :param items: returns the list of items of the request
+    :return: a locator routing a batch on the shard of the boards or tasks named by its items. Items naming
+    none that exists are left to the view, a batch naming none at all goes to the shard of the first id block.
+    It raises CrossShardBatch when the items are in several shards, an empty list is left to the view.
+    """
+    def locate(data):
+        batch = items(data)
+        if not isinstance(batch, list):
+            return None
+        ids = {}
+        for index, item in enumerate(batch):
+            try:
+                ids[index] = int(item[field])
+            except (KeyError, TypeError, ValueError):
+                continue
+        if not ids:
+            return None
+        shards = rows_shards(model, set(ids.values()))
+        located = {index: shards[row_id] for index, row_id in ids.items() if row_id in shards}
+        if not located:
+            return block_shard(next(iter(ids.values())) // SHARD_ID_SPAN) or 0
+        shard = located[min(located)]
+        crossing = [index for index, other in located.items() if other != shard]
+        if crossing:
+            raise CrossShardBatch(crossing)
+        return shard
+    return locate
+
+
+def every_shard(data):
+    """
+    Locator of the requests reading from every shard, the view merges their rows, see
+    database.sharding.merged_page.
+    """
+    return None
+
+
+def first_of(*locators):
+    """
+    :return: a locator trying each of `locators` in turn, for requests that may name a board or a team
+    """
+    def locate(data):
+        for locator in locators[:-1]:
+            try:
+                return locator(data)
+            except (KeyError, IndexError, TypeError):
+                continue
+        return locators[-1](data)
+    return locate
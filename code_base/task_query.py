@@ -0,0 +1,77 @@
+import base64
+from datetime import datetime
+
+from flask import json
+from sqlalchemy import select, tuple_
+from sqlalchemy.sql.elements import UnaryExpression
+from sqlalchemy.sql.operators import custom_op
+
+from database.flask_models import Board, Task
+
+TASK_QUERY_COLUMNS = (Task.id, Task.title, Task.description, Task.user_id, Task.status, Task.board_id,
+                      Task.creation_time)
+
+
+def encode_cursor(row):
+    """
+    :return: the opaque cursor of the position following the task `row` in a task query
+    """
+    position = [row.creation_time.isoformat() if row.creation_time is not None else None, row.id]
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+
+def decode_cursor(cursor):
+    """
+    :return: the (creation_time, task id) position encoded in `cursor`
+    :raises ValueError: when the cursor is malformed
+    """
+    try:
+        creation_time, task_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if not isinstance(task_id, int):
+            raise ValueError(task_id)
+        return datetime.fromisoformat(creation_time), task_id
+    except (TypeError, ValueError, UnicodeError) as err:
+        raise ValueError('Malformed cursor') from err
+
+
+def task_query_statement(user_id=None, status=None, board_id=None, team_id=None, created_after=None,
+                         created_before=None, descending=False, after=None):
+    """
+    Tasks matching every given filter ordered on (creation_time, id), following the position `after`
+    when given.
+
+    Each filter combination is served by the index starting with its equality columns followed by
+    creation_time, the page seeks its first task there and reads on:
+        user_id (+ status, + created range)   ix_task_user_status_created
+        board_id (+ status)                   ix_task_board_status_created
+        team_id (+ status)                    ix_task_board_status_created, one seek per board of the team
+        status (+ created range)              ix_task_status_created
+        created range                         ix_task_creation_time
+    The tasks of a user on any status, of a board or of a team are sorted once read, the sort is bounded by
+    their number and not by the size of the table.
+    """
+    statement = select(*TASK_QUERY_COLUMNS)
+    if user_id is not None:
+        statement = statement.where(Task.user_id == user_id)
+    if status is not None:
+        # Without statistics SQLite would rather walk every task of the status in creation order than sort
+        # the tasks of a team, the unary + keeps the status of a team query off ix_task_status_created
+        if team_id is not None and user_id is None and board_id is None:
+            statement = statement.where(UnaryExpression(Task.status, operator=custom_op('+')) == status)
+        else:
+            statement = statement.where(Task.status == status)
+    if board_id is not None:
+        statement = statement.where(Task.board_id == board_id)
+    if team_id is not None:
+        statement = statement.where(Task.board_id.in_(select(Board.id).where(Board.team_id == team_id)))
+    if created_after is not None:
+        statement = statement.where(Task.creation_time >= created_after)
+    if created_before is not None:
+        statement = statement.where(Task.creation_time < created_before)
+
+    key = tuple_(Task.creation_time, Task.id)
+    if after is not None:
+        statement = statement.where(key < tuple_(*after) if descending else key > tuple_(*after))
+    if descending:
+        return statement.order_by(Task.creation_time.desc(), Task.id.desc())
+    return statement.order_by(Task.creation_time, Task.id)
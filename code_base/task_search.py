@@ -0,0 +1,69 @@
+import re
+
+from sqlalchemy import func, literal_column, select
+from sqlalchemy.sql import column, table
+
+from database.flask_models import Board, Task
+
+# bm25 weight of a match in the title and in the description, titles are short and to the point
+TITLE_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+MAX_TERMS = 16
+
+# The FTS5 table is created by database.flask_models.TASK_SEARCH_DDL, it is not a model of the metadata
+task_fts = table('task_fts', column('rowid'))
+
+
+def match_expression(text):
+    """
+    Turn free text into an FTS5 query matching the tasks containing every word, in any order.
+    Words are quoted so FTS5 operators typed by users are searched as text, a trailing * keeps a prefix search.
+
+    :return: the query, None when the text holds no word
+    """
+    terms = re.findall(r'\w+\*?', text)[:MAX_TERMS]
+    if not terms:
+        return None
+    return ' '.join('"{}"{}'.format(term.rstrip('*'), '*' if term.endswith('*') else '') for term in terms)
+
+
+def _matching(statement, match, board_id, team_id, status):
+    statement = statement.select_from(task_fts) \
+        .join(Task, Task.id == task_fts.c.rowid) \
+        .where(literal_column('task_fts').op('MATCH')(match))
+    if board_id is not None:
+        statement = statement.where(Task.board_id == board_id)
+    if status is not None:
+        statement = statement.where(Task.status == status)
+    if team_id is not None:
+        statement = statement.join(Board, Board.id == Task.board_id).where(Board.team_id == team_id)
+    return statement
+
+
+def search_statement(match, board_id=None, team_id=None, status=None, max_candidates=None):
+    """
+    Tasks matching the FTS5 query `match`, best match first, with their bm25 rank (lower is better).
+    The full text index yields the matching task ids, filters are then checked on task and board by primary key.
+
+    Ranking costs a bm25 computation per matching task, so with max_candidates only the most recent
+    matches are ranked: a first pass walks the index by descending rowid, without scoring, to find the
+    id of the oldest candidate and the ranked pass is bounded to the ids above it.
+    """
+    rank = func.bm25(literal_column('task_fts'), TITLE_WEIGHT, DESCRIPTION_WEIGHT).label('rank')
+    statement = _matching(select(Task.id, Task.title, Task.description, Task.status, Task.board_id, rank),
+                          match, board_id, team_id, status)
+    if max_candidates is not None:
+        candidates = _matching(select(task_fts.c.rowid), match, board_id, team_id, status) \
+            .order_by(task_fts.c.rowid.desc()).limit(max_candidates).subquery()
+        oldest = select(func.coalesce(func.min(candidates.c.rowid), 0)).scalar_subquery()
+        statement = statement.where(task_fts.c.rowid >= oldest)
+    return statement.order_by(rank, Task.id)
+
+
+def skipped_statement(match, board_id=None, team_id=None, status=None, max_candidates=None):
+    """
+    Query of the most recent match left out of the ranking of search_statement with the same max_candidates,
+    it returns no row when every match was ranked. It walks the index like the first pass, without scoring.
+    """
+    return _matching(select(task_fts.c.rowid), match, board_id, team_id, status) \
+        .order_by(task_fts.c.rowid.desc()).limit(1).offset(max_candidates)
@@ -1,9 +1,14 @@
-from flask import jsonify
+from flask import current_app, jsonify
 from marshmallow import Schema, fields, validates, ValidationError
+from sqlalchemy import literal, select
 
 from database.database import db
-from database.flask_models import Team, User
+from database.flask_models import Team, User, UserTeam
+from entity_cache import entity_cache
+from query_utils import chunked, keyset_page, page_args, page_response, stream_json_array
+from serializers import RowSerializer
 from user_base import UserSchema
+from versions import versions
 
 
 
@@ -35,6 +40,16 @@ class CreateTeamRequestSchema(Schema):
     #     if name:
     #         raise ValidationError('Team name must be unique')
 
+class TeamSchema(CreateTeamRequestSchema):
+    id = fields.Integer(dump_only=True)
+
+create_team_request_schema = CreateTeamRequestSchema()
+update_team_schema = UpdateaTeamSchema()
+add_remove_user_schema = AddRemoveUserSchema()
+team_serializer = RowSerializer.from_schema(CreateTeamRequestSchema)
+user_team_serializer = RowSerializer.from_schema(TeamSchema)
+
+
 class TeamBase:
     """
     Base interface implementation for API's to manage teams.
@@ -61,9 +76,8 @@ class TeamBase:
             * Description can be max 128 characters
         """
         request_json = request.get_json()
-        schema = CreateTeamRequestSchema()
         try:
-            request_data = schema.load(request_json)
+            request_data = create_team_request_schema.load(request_json)
         except ValidationError as err:
             return jsonify({"error": err.messages}), 400
         existing_team = Team.query.filter_by(name=request_json['name']).first()
@@ -74,8 +88,12 @@ class TeamBase:
         db.session.commit()
         return jsonify({'id': team.id}), 201
 
-    def list_teams(self) -> str:
+    def list_teams(self, request) -> str:
         """
+        :param request: Optional query arguments
+            after_id : only list teams with an id greater than this cursor
+            limit : max number of teams to return, the id of the last one is sent back in X-Next-After-Id
+            stream : stream the json array instead of building it in memory
         :return: A json list with the response.
         [
           {
@@ -86,10 +104,60 @@ class TeamBase:
           }
         ]
         """
-        teams = db.session.query(Team).all()
-        create_team_request_schema = CreateTeamRequestSchema(many=True)
-        teams_dict_list = create_team_request_schema.dump(teams)
-        return jsonify(teams_dict_list)
+        try:
+            args = page_args(request)
+        except ValidationError as err:
+            return jsonify({'error': err.messages}), 400
+        columns = db.session.query(Team.id, Team.name, Team.description, Team.admin, Team.creation_time)
+        query = keyset_page(columns, Team.id, args['after_id'], args['limit'])
+        if args['stream']:
+            return stream_json_array(query, team_serializer.dump)
+        teams = query.all()
+        return page_response(teams, team_serializer.dump_many, args['limit'])
+
+    def list_teams_version(self, request):
+        """
+        :return: the version token parts of the team list, see versions.conditional
+        """
+        return 'teams', versions.get('teams')
+
+    def list_user_teams(self, request):
+        """
+        :param request: A json string with the user identifier
+        {
+          "id" : "<user_id>"
+        }
+        and optional query arguments, as for /team_list
+            after_id : only list the teams with an id greater than this cursor
+            limit : max number of teams to return, the id of the last one is sent back in X-Next-After-Id
+            stream : stream the json array instead of building it in memory
+        :return: The teams the user belongs to ordered by team id
+        [
+          {
+            "id" : "<team_id>",
+            "name" : "<team_name>",
+            "description" : "<some description>",
+            "creation_time" : "<some date:time format>",
+            "admin": "<id of a user>"
+          }
+        ]
+
+        A page is read with a single join walking the (user_id, team_id) primary key of user_team.
+        """
+        try:
+            args = page_args(request)
+        except ValidationError as err:
+            return jsonify({'error': err.messages}), 400
+        user_id = request.get_json().get('id')
+        if entity_cache.user(user_id) is None:
+            return jsonify({'error': 'User not found'}), 404
+        teams = db.session.query(Team.id, Team.name, Team.description, Team.admin, Team.creation_time) \
+            .join(UserTeam, UserTeam.team_id == Team.id) \
+            .filter(UserTeam.user_id == user_id)
+        query = keyset_page(teams, UserTeam.team_id, args['after_id'], args['limit'])
+        if args['stream']:
+            return stream_json_array(query, user_team_serializer.dump)
+        return page_response(query.all(), user_team_serializer.dump_many, args['limit'])
 
     def update_team(self, request):
         """
@@ -110,7 +178,6 @@ class TeamBase:
             * Name can be max 64 characters
             * Description can be max 128 characters
         """
-        update_team_schema = UpdateaTeamSchema(many=False)
         try:
             data = update_team_schema.load(request.get_json())
         except ValidationError as err:
@@ -122,12 +189,13 @@ class TeamBase:
         team_name = team.get("name")
         description = team.get("description")
         admin=team.get('admin')
-        team = Team.query.get(team_id)
+        team = entity_cache.team(team_id)
         if team is None or team.name != team_name:
             return jsonify({"error": "team name cannot be updated"}), 400
-        team.description = description
-        team.admin=admin
+        db.session.execute(Team.__table__.update().where(Team.id == team.id)
+                           .values(description=description, admin=admin))
         db.session.commit()
+        entity_cache.invalidate('team', team.id)
         # Return a success response
         return "Team updated successfully", 200
 
@@ -140,63 +208,84 @@ class TeamBase:
           "users" : ["user_id 1", "user_id2"]
         }
 
-        :return:
+        :return: A json string with the number of memberships created {"message": "...", "added": <count>}
+
+        Users that do not exist or are already members are skipped. The memberships are written with one
+        INSERT OR IGNORE ... SELECT statement on user_team per chunk of users, in a single transaction.
 
         Constraint:
-        * Cap the max users that can be added to 50
+        * Cap the max users that can be added to TEAM_MEMBERSHIP_MAX_USERS
         """
         data = request.get_json()
-        add_remove_user_schema=AddRemoveUserSchema()
-        req_data=add_remove_user_schema.load(data)
+        try:
+            req_data = add_remove_user_schema.load(data)
+        except ValidationError as err:
+            return jsonify({'error': err.messages}), 400
         team_id=req_data['id']
         user_ids = req_data['users']
-        if len(user_ids)>50:
-            return jsonify({'error': 'more than 50 users not allowed'}), 404
+        max_users = current_app.config['TEAM_MEMBERSHIP_MAX_USERS']
+        if len(user_ids)>max_users:
+            return jsonify({'error': 'more than {} users not allowed'.format(max_users)}), 400
 
         # Get the team from the database
-        team = Team.query.get(team_id)
+        team = entity_cache.team(team_id)
         if not team:
             # Return an error if the team does not exist
             return jsonify({'error': 'Team not found'}), 404
 
-        # Get the list of user IDs from the request data
-
-
-        # Update the users in the team
-        users = User.query.filter(User.id.in_(user_ids)).all()
-        for user in users:
-            if user:
-                team.users.append(user)
-
+        # Add the existing users to the team, ignoring those already in it
+        user_team = UserTeam.__table__
+        added = 0
+        for ids_chunk in chunked(set(user_ids)):
+            existing_users = select(User.id, literal(team_id)).where(User.id.in_(ids_chunk))
+            result = db.session.execute(
+                user_team.insert().prefix_with('OR IGNORE', dialect='sqlite')
+                .from_select([user_team.c.user_id, user_team.c.team_id], existing_users))
+            added += result.rowcount
 
         # Commit the changes to the database
         db.session.commit()
 
         # Return a success message
-        return jsonify({'message': 'Team updated successfully'})
+        return jsonify({'message': 'Team updated successfully', 'added': added})
 
     def remove_users_from_team(self,request):
+        """
+        :param request: A json string with the team details
+        {
+          "id" : "<team_id>",
+          "users" : ["user_id 1", "user_id2"]
+        }
+
+        :return: A json string with the number of memberships removed {"message": "...", "removed": <count>}
+
+        The memberships are deleted with one DELETE ... WHERE user_id IN (...) statement on user_team per
+        chunk of users, in a single transaction.
+        """
         # Get the request data
         data = request.get_json()
-        add_remove_user_schema = AddRemoveUserSchema()
-        req_data = add_remove_user_schema.load(data)
+        try:
+            req_data = add_remove_user_schema.load(data)
+        except ValidationError as err:
+            return jsonify({'error': err.messages}), 400
         team_id = req_data['id']
         user_ids = req_data['users']
         # Get the team from the database
-        team = Team.query.get(team_id)
+        team = entity_cache.team(team_id)
         if not team:
             # Return an error if the team does not exist
             return jsonify({'error': 'Team not found'}), 404
 
         # Remove the users from the team
-        users = User.query.filter(User.id.in_(user_ids)).all()
-        for user in users:
-            if user:
-                team.users.remove(user)
+        user_team = UserTeam.__table__
+        removed = 0
+        for ids_chunk in chunked(set(user_ids)):
+            result = db.session.execute(
+                user_team.delete().where(user_team.c.team_id == team_id, user_team.c.user_id.in_(ids_chunk)))
+            removed += result.rowcount
 
         # Commit the changes to the database
         db.session.commit()
 
         # Return a success message
-        return jsonify({'message': 'Users removed from team successfully'})
-
+        return jsonify({'message': 'Users removed from team successfully', 'removed': removed})
@@ -1,11 +1,18 @@
-from flask import request, jsonify, Blueprint
+from datetime import datetime
+
+from flask import current_app, request, jsonify, Blueprint
 
 
 
 from marshmallow import Schema, fields, validate, ValidationError
+from sqlalchemy.exc import IntegrityError
 
 from database.database import db
-from database.flask_models import User, Team
+from database.flask_models import User, UserTeam
+from entity_cache import entity_cache
+from query_utils import chunked, keyset_page, page_args, page_response, stream_json_array
+from serializers import RowSerializer
+from versions import versions
 
 
 class UpdateUserSchema(Schema):
@@ -26,6 +33,14 @@ class TeamUserSchema(Schema):
     display_name = fields.String(required=True, validate=validate.Length(max=64))
     creation_time = fields.DateTime(dump_only=True)
 
+# Schemas and serializers are built once, instantiating a schema is far more costly than using it
+user_schema = UserSchema()
+users_schema = UserSchema(many=True)
+update_user_schema = UpdateUserSchema()
+user_serializer = RowSerializer.from_schema(UserSchema)
+team_user_serializer = RowSerializer.from_schema(TeamUserSchema)
+
+
 class UserBase():
 
     def create_user(self,request):
@@ -43,7 +58,6 @@ class UserBase():
                     * display name can be max 64 characters
                 """
         user_data = request.get_json()
-        user_schema = UserSchema()
         try:
             user_data = user_schema.load(user_data)
         except ValidationError as err:
@@ -56,8 +70,94 @@ class UserBase():
         db.session.commit()
         return jsonify({'id': user.id}), 201
 
-    def list_users(self) -> str:
+    def create_users(self, request):
+        """
+        :param request: A json list of users, each with the same fields as for create_user
+        [
+          {
+            "user_name" : "<user_name>",
+            "display_name" : "<display name>"
+          }
+        ]
+        :return: A json string with the id of every created user and the errors of the rejected ones,
+        keyed by their position in the request
+        {
+          "ids" : {"<user_name>" : "<user_id>"},
+          "errors" : {"<index>" : "<reason the user was not created>"}
+        }
+        The response is 201 when every user was created, 207 when only some were and 400 when none was.
+
+        Existing user names are looked up with one IN query per chunk of names and the new users are
+        inserted in chunks of executemany statements, all in a single transaction. When a concurrent request
+        takes one of the names in between, the transaction is rolled back, the clashing names are reported
+        in errors and the other users are inserted again.
+
+        Constraint:
+            * same as create_user
+            * cap the users of a request to CREATE_USERS_MAX_ITEMS
         """
+        user_data = request.get_json()
+        if not isinstance(user_data, list):
+            return jsonify({'error': 'A list of users is expected'}), 400
+        max_items = current_app.config['CREATE_USERS_MAX_ITEMS']
+        if len(user_data) > max_items:
+            return jsonify({'error': 'more than {} users not allowed'.format(max_items)}), 400
+
+        errors = users_schema.validate(user_data)
+        indexes = [index for index in range(len(user_data)) if index not in errors]
+        users = dict(zip(indexes, users_schema.load([user_data[index] for index in indexes])))
+
+        taken = set()
+        for names in chunked({user['user_name'] for user in users.values()}):
+            taken.update(name for name, in db.session.query(User.user_name).filter(User.user_name.in_(names)))
+
+        creation_time = datetime.utcnow()
+        rows = {}
+        for index, user in users.items():
+            if user['user_name'] in taken:
+                errors[index] = 'User name already exists'
+                continue
+            taken.add(user['user_name'])
+            rows[index] = {'user_name': user['user_name'], 'display_name': user['display_name'],
+                           'creation_time': creation_time}
+
+        ids = {}
+        while rows:
+            try:
+                for rows_chunk in chunked(rows.values(), 1000):
+                    db.session.execute(User.__table__.insert(), rows_chunk)
+                    names = [row['user_name'] for row in rows_chunk]
+                    ids.update(db.session.query(User.user_name, User.id).filter(User.user_name.in_(names)).all())
+                db.session.commit()
+                break
+            except IntegrityError:
+                db.session.rollback()
+                ids = {}
+                clashing = set()
+                for names in chunked(row['user_name'] for row in rows.values()):
+                    clashing.update(name for name, in
+                                    db.session.query(User.user_name).filter(User.user_name.in_(names)))
+                if not clashing:
+                    raise
+                for index in [index for index, row in rows.items() if row['user_name'] in clashing]:
+                    errors[index] = 'User name already exists'
+                    del rows[index]
+
+        if not errors:
+            status_code = 201
+        elif ids:
+            status_code = 207
+        else:
+            status_code = 400
+        return jsonify({'ids': ids, 'errors': {str(index): error for index, error in sorted(errors.items())}}), \
+            status_code
+
+    def list_users(self, request) -> str:
+        """
+        :param request: Optional query arguments
+            after_id : only list users with an id greater than this cursor
+            limit : max number of users to return, the id of the last one is sent back in X-Next-After-Id
+            stream : stream the json array instead of building it in memory
         :return: A json list with the response
         [
           {
@@ -67,10 +167,22 @@ class UserBase():
           }
         ]
         """
-        users = db.session.query(User).all()
-        users_schema = UserSchema(many=True)
-        users_dict_list = users_schema.dump(users)
-        return jsonify(users_dict_list)
+        try:
+            args = page_args(request)
+        except ValidationError as err:
+            return jsonify({'error': err.messages}), 400
+        columns = db.session.query(User.id, User.user_name, User.display_name, User.creation_time)
+        query = keyset_page(columns, User.id, args['after_id'], args['limit'])
+        if args['stream']:
+            return stream_json_array(query, user_serializer.dump)
+        users = query.all()
+        return page_response(users, user_serializer.dump_many, args['limit'])
+
+    def list_users_version(self, request):
+        """
+        :return: the version token parts of the user list, see versions.conditional
+        """
+        return 'users', versions.get('users')
 
     def describe_user(self,request):
         """
@@ -92,14 +204,13 @@ class UserBase():
 
         # Extract the "id" field from the request payload
         user_id = data.get("id")
-        user = User.query.get(user_id)
+        user = entity_cache.user(user_id)
         if user is None:
             # Return a 404 Not Found if the user does not exist
             return "User not found", 404
 
         # Serialize the user to a dictionary
-        user_schema = UserSchema(many=False)
-        user_dict = user_schema.dump(user)
+        user_dict = user_serializer.dump(user)
 
         # Return the serialized user as a JSON response
         return jsonify(user_dict),200
@@ -122,7 +233,6 @@ class UserBase():
             * name can be max 64 characters
             * display name can be max 128 characters
         """
-        update_user_schema=UpdateUserSchema(many=False)
         try:
             data = update_user_schema.load(request.get_json())
         except ValidationError as err:
@@ -134,11 +244,12 @@ class UserBase():
         user = data.get("user")
         user_name = user.get("user_name")
         display_name = user.get("display_name")
-        user = User.query.get(user_id)
+        user = entity_cache.user(user_id)
         if user is None or user.user_name != user_name:
             return jsonify({"error": "Username cannot be updated"}), 400
-        user.display_name = display_name
+        db.session.execute(User.__table__.update().where(User.id == user.id).values(display_name=display_name))
         db.session.commit()
+        entity_cache.invalidate('user', user.id)
         # Return a success response
         return "User updated successfully", 200
 
@@ -148,8 +259,12 @@ class UserBase():
         {
           "id" : "<team_id>"
         }
+        and optional query arguments, as for /userlist
+            after_id : only list the members with a user id greater than this cursor
+            limit : max number of members to return, the id of the last one is sent back in X-Next-After-Id
+            stream : stream the json array instead of building it in memory
 
-        :return:
+        :return: The members of the team ordered by user id
         [
           {
             "id" : "<user_id>",
@@ -157,12 +272,24 @@ class UserBase():
             "display_name" : "<display name>"
           }
         ]
+
+        A page is read with a single join walking the (team_id, user_id) index of user_team, so it costs the
+        same number of statements whatever the size of the team.
         """
+        try:
+            args = page_args(request)
+        except ValidationError as err:
+            return jsonify({'error': err.messages}), 400
         req_data=request.get_json()
         team_id=req_data.get('id')
-        team = Team.query.get(team_id)
+        team = entity_cache.team(team_id)
         if not team:
             # Return an error if the team does not exist
             return jsonify({'error': 'Team not found'}), 404
-        team_user_schema = TeamUserSchema(many=True)
-        return team_user_schema.dumps(team.users)
+        members = db.session.query(User.id, User.user_name, User.display_name, User.creation_time) \
+            .join(UserTeam, UserTeam.user_id == User.id) \
+            .filter(UserTeam.team_id == team_id)
+        query = keyset_page(members, UserTeam.user_id, args['after_id'], args['limit'])
+        if args['stream']:
+            return stream_json_array(query, team_user_serializer.dump)
+        return page_response(query.all(), team_user_serializer.dump_many, args['limit'])
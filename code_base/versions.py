@@ -0,0 +1,69 @@
+from functools import wraps
+
+from flask import current_app, make_response, request
+from sqlalchemy import select
+
+from database.database import db, shard_scope
+from database.flask_models import ResourceVersion
+
+
+class Versions:
+    """
+    Write counters of the listed resources, e.g. ('users', 0), ('boards', <team_id>) or ('board', <board_id>).
+    They live in the resource_version table, bumped by triggers in the transaction of every write, so all
+    the workers read the same versions whatever process made the change.
+    """
+    # Kinds counting writes to the global tables, read from the global database in the sharded mode
+    GLOBAL_KINDS = ('users', 'teams', 'user_names')
+
+    def get(self, kind, key=0):
+        return self.get_many(kind, [key]).get(key, 0)
+
+    def get_many(self, kind, keys):
+        """
+        :return: {key: version} of the resources of `kind` written at least once among `keys`
+        """
+        statement = select(ResourceVersion.key, ResourceVersion.version) \
+            .where(ResourceVersion.kind == kind, ResourceVersion.key.in_(keys))
+        if kind in self.GLOBAL_KINDS:
+            with shard_scope(None):
+                return dict(db.session.execute(statement).all())
+        return dict(db.session.execute(statement).all())
+
+    def etag(self, *parts):
+        return '-'.join(str(part) for part in parts)
+
+
+versions = Versions()
+
+
+def conditional(version):
+    """
+    View decorator answering If-None-Match GET and HEAD requests with a 304 when the resource has not changed.
+    The other methods run the view as is, they are not cacheable.
+
+    :param version: called with the request, returns the parts of the version token of the requested
+    resource, or None when the request is not valid; the view then runs and reports the error.
+    The token is computed before the view runs, so a write landing in between only costs a full
+    response on the next poll. Successful responses carry it in their ETag header.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(*args, **kwargs)
+            parts = version(request)
+            if parts is None:
+                return view(*args, **kwargs)
+            etag = versions.etag(*parts)
+            if etag in request.if_none_match:
+                not_modified = current_app.response_class(status=304)
+                not_modified.set_etag(etag)
+                return not_modified
+            response = make_response(view(*args, **kwargs))
+            if response.status_code == 200:
+                response.set_etag(etag)
+            return response
+        return wrapper
+
+    return decorator
@@ -1,5 +1,126 @@
+from contextlib import contextmanager
+
+from flask import g, has_app_context
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+
+# Schema name of the global database attached to the connections of a shard
+GLOBAL_SCHEMA = 'global_db'
+
+
+def current_shard():
+    """
+    :return: the bind key of the shard the session is routed to, None outside of a shard
+    """
+    return g.get('shard') if has_app_context() else None
+
+
+@contextmanager
+def shard_scope(bind_key):
+    """
+    Route the statements of db.session to the shard `bind_key` inside the block, None for the global database.
+    """
+    previous = g.get('shard')
+    g.shard = bind_key
+    try:
+        yield
+    finally:
+        g.shard = previous
+
+
+class ShardedSession(Session):
+    """
+    Session sending its statements to the shard of the current request, see database/sharding.py, and to the
+    bind of their model otherwise. Shards only hold the board and task tables, the global tables are read
+    through the global database attached to every shard connection.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None:
+            shard = current_shard()
+            if shard is not None:
+                return self._db.engines[shard]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+db = SQLAlchemy(session_options={'class_': ShardedSession})
+
+
+def is_sqlite_file(uri):
+    url = make_url(uri)
+    return url.get_backend_name() == 'sqlite' and url.database not in (None, '', ':memory:')
+
+
+def sqlite_engine_options(config):
+    """
+    Engine options of the tuned SQLite profile: a bounded pool of connections shared between threads
+    and the busy timeout applied by the driver while waiting for the writer lock.
+    """
+    return {
+        'poolclass': QueuePool,
+        'pool_size': config['SQLITE_POOL_SIZE'],
+        'max_overflow': config['SQLITE_POOL_MAX_OVERFLOW'],
+        'connect_args': {
+            'timeout': config['SQLITE_PRAGMAS'].get('busy_timeout', 5000) / 1000,
+            'check_same_thread': False,
+        },
+    }
+
+
+def set_sqlite_pragmas(engine, pragmas):
+    """
+    Run the pragmas on every new connection of the engine, before it is handed to the pool.
+    """
+    @event.listens_for(engine, 'connect')
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute('PRAGMA {}={}'.format(name, value))
+        cursor.close()
+
+
+def attach_global_database(engine, path):
+    """
+    Attach the global database file to every new connection of a shard engine, unqualified user and team
+    tables then resolve to it since the shard has none of its own.
+    """
+    @event.listens_for(engine, 'connect')
+    def on_connect(dbapi_connection, connection_record):
+        # SQLite keeps resolving a name in the schema it was first found in, a connection opened before the
+        # shard was prepared would write its boards to the global database: it gets none and fails instead
+        prepared = dbapi_connection.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'board'").fetchone()
+        if prepared:
+            dbapi_connection.execute('ATTACH DATABASE ? AS {}'.format(GLOBAL_SCHEMA), (path,))
 
 
+def init_db(app):
+    """
+    Bind the db to the app, applying the tuned SQLite profile when SQLITE_TUNED is set: WAL journal so readers
+    no longer block on the writer, synchronous=NORMAL, busy timeout, mmap and page cache sizes set through
+    connect time pragmas, and a pooled engine.
 
-db = SQLAlchemy()
\ No newline at end of file
+    With SHARD_BINDS the boards and tasks are kept in the listed binds of SQLALCHEMY_BINDS, the connections of
+    each shard get the global database attached.
+    """
+    tuned = app.config['SQLITE_TUNED'] and is_sqlite_file(app.config['SQLALCHEMY_DATABASE_URI'])
+    if tuned:
+        options = sqlite_engine_options(app.config)
+        options.update(app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+    db.init_app(app)
+    if tuned:
+        with app.app_context():
+            for engine in db.engines.values():
+                if engine.dialect.name == 'sqlite':
+                    set_sqlite_pragmas(engine, app.config['SQLITE_PRAGMAS'])
+    if app.config['SHARD_BINDS']:
+        with app.app_context():
+            global_path = db.engines[None].url.database
+            for bind_key in app.config['SHARD_BINDS']:
+                if not is_sqlite_file(str(db.engines[bind_key].url)):
+                    raise ValueError('Shard {} must be a SQLite database file'.format(bind_key))
+                attach_global_database(db.engines[bind_key], global_path)
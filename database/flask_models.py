@@ -1,6 +1,6 @@
 from datetime import datetime
 
-from sqlalchemy import Integer, Enum, UniqueConstraint
+from sqlalchemy import Integer, Enum, UniqueConstraint, event, text
 
 from database.database import db
 
@@ -9,6 +9,10 @@ class UserTeam(db.Model):
     __tablename__ = 'user_team'
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
     team_id = db.Column(db.Integer, db.ForeignKey('team.id'), primary_key=True)
+    # the primary key covers user -> teams lookups, this one team -> users
+    __table_args__ = (
+        db.Index('ix_user_team_team_user', 'team_id', 'user_id'),
+    )
 
 
 
@@ -38,12 +42,14 @@ class Board(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(64), nullable=False)
     description = db.Column(db.String(128))
-    team_id = db.Column(db.Integer, db.ForeignKey('team.id'), nullable=False)
+    team_id = db.Column(db.Integer, db.ForeignKey('team.id'), nullable=False, index=True)
     creation_time = db.Column(db.DateTime, index=True, default=datetime.utcnow)
     status = db.Column(status_enum, default='OPEN')
     tasks = db.relationship('Task', backref='board', lazy=True)
     __table_args__ = (
         db.UniqueConstraint('name', 'team_id', name='unique_board_name_for_team'),
+        # ids are never reused, each shard draws them from its own range, see database/sharding.py
+        {'sqlite_autoincrement': True},
     )
 
 task_status_enum = Enum('OPEN', 'IN_PROGRESS', 'COMPLETE', name='task_status_enum')
@@ -52,10 +58,186 @@ class Task(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(64), unique=True)
     description = db.Column(db.String(128))
-    user_id = db.Column(db.String(64))
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
     creation_time = db.Column(db.DateTime, index=True, default=datetime.utcnow)
     status = db.Column(task_status_enum, default='OPEN')
     board_id = db.Column(db.Integer, db.ForeignKey('board.id'), nullable=False)
     __table_args__ = (
         UniqueConstraint('title', 'board_id', name='unique_task_title_for_board'),
+        # The indexes of the task queries, see code_base/task_query.py: equality filters first, then
+        # creation_time so the matching tasks are read in the order of the query
+        db.Index('ix_task_board_status_created', 'board_id', 'status', 'creation_time'),
+        db.Index('ix_task_user_status_created', 'user_id', 'status', 'creation_time'),
+        db.Index('ix_task_status_created', 'status', 'creation_time'),
+        {'sqlite_autoincrement': True},
+    )
+
+
+class TeamShard(db.Model):
+    """
+    Shard holding the boards and tasks of a team in the sharded mode, see database/sharding.py. It lives in the
+    global database, a team gets its row when its first board is created.
+    """
+    __tablename__ = 'team_shard'
+    team_id = db.Column(db.Integer, db.ForeignKey('team.id'), primary_key=True)
+    shard = db.Column(db.Integer, nullable=False)
+
+
+class ShardBlock(db.Model):
+    """
+    Block of board and task ids, from block * SHARD_ID_SPAN up to the next block, leased to the shard allocating
+    its new ids there. It lives in the global database.
+    """
+    __tablename__ = 'shard_block'
+    block = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    shard = db.Column(db.Integer, nullable=False)
+
+
+class BoardStatusCount(db.Model):
+    """
+    Number of tasks of a board in each status, kept up to date by triggers on task so a board summary
+    never has to read the tasks.
+    """
+    __tablename__ = 'board_status_count'
+    board_id = db.Column(db.Integer, db.ForeignKey('board.id'), primary_key=True)
+    status = db.Column(task_status_enum, primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+
+class ResourceVersion(db.Model):
+    """
+    Write counter of a resource served with an ETag, see code_base/versions.py: ('users', 0), ('teams', 0),
+    ('user_names', 0), ('boards', <team_id>) and ('board', <board_id>). Kept up to date by triggers, so it
+    counts the writes of every worker and survives restarts.
+    """
+    __tablename__ = 'resource_version'
+    kind = db.Column(db.String(16), primary_key=True)
+    key = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+
+def _bump_version(kind, key):
+    return "INSERT INTO resource_version (kind, key, version) VALUES ('{}', {}, 1) " \
+           "ON CONFLICT (kind, key) DO UPDATE SET version = version + 1;".format(kind, key)
+
+
+# The triggers bumping the resource versions, by the table they are created on
+RESOURCE_VERSION_TRIGGERS = {
+    'user': (
+        'CREATE TRIGGER IF NOT EXISTS user_version_insert AFTER INSERT ON "user" BEGIN {} END'
+        .format(_bump_version('users', 0)),
+        'CREATE TRIGGER IF NOT EXISTS user_version_update AFTER UPDATE ON "user" BEGIN {} END'
+        .format(_bump_version('users', 0)),
+        # user names are part of the board exports
+        'CREATE TRIGGER IF NOT EXISTS user_name_version_update AFTER UPDATE OF user_name ON "user" '
+        'WHEN OLD.user_name IS NOT NEW.user_name BEGIN {} END'.format(_bump_version('user_names', 0)),
+        'CREATE TRIGGER IF NOT EXISTS user_version_delete AFTER DELETE ON "user" BEGIN {} {} END'
+        .format(_bump_version('users', 0), _bump_version('user_names', 0)),
+    ),
+    'team': tuple(
+        'CREATE TRIGGER IF NOT EXISTS team_version_{0} AFTER {0} ON team BEGIN {1} END'
+        .format(event_name, _bump_version('teams', 0)) for event_name in ('INSERT', 'UPDATE', 'DELETE')
+    ),
+    'board': (
+        'CREATE TRIGGER IF NOT EXISTS board_version_insert AFTER INSERT ON board BEGIN {} END'
+        .format(_bump_version('boards', 'NEW.team_id')),
+        'CREATE TRIGGER IF NOT EXISTS board_version_update AFTER UPDATE ON board BEGIN {} {} END'
+        .format(_bump_version('boards', 'OLD.team_id'), _bump_version('boards', 'NEW.team_id')),
+        'CREATE TRIGGER IF NOT EXISTS board_version_delete AFTER DELETE ON board BEGIN {} END'
+        .format(_bump_version('boards', 'OLD.team_id')),
+    ),
+    'task': (
+        'CREATE TRIGGER IF NOT EXISTS task_version_insert AFTER INSERT ON task BEGIN {} END'
+        .format(_bump_version('board', 'NEW.board_id')),
+        'CREATE TRIGGER IF NOT EXISTS task_version_update AFTER UPDATE ON task BEGIN {} {} END'
+        .format(_bump_version('board', 'OLD.board_id'), _bump_version('board', 'NEW.board_id')),
+        'CREATE TRIGGER IF NOT EXISTS task_version_delete AFTER DELETE ON task BEGIN {} END'
+        .format(_bump_version('board', 'OLD.board_id')),
+    ),
+}
+
+
+@event.listens_for(db.metadata, 'after_create')
+def create_resource_version_triggers(target, connection, **kwargs):
+    """
+    Create the triggers of the tables of the database, the shards only hold the board and task tables.
+    """
+    if connection.dialect.name != 'sqlite':
+        return
+    tables = {name for name, in connection.execute(text("SELECT name FROM sqlite_master WHERE type = 'table'"))}
+    if 'resource_version' not in tables:
+        return
+    for table, triggers in RESOURCE_VERSION_TRIGGERS.items():
+        if table in tables:
+            for trigger in triggers:
+                connection.execute(text(trigger))
+
+
+# Every write to task, whatever statement issues it, adjusts the counters in the same transaction
+BOARD_STATUS_COUNT_TRIGGERS = (
+    """
+    CREATE TRIGGER IF NOT EXISTS task_status_count_insert AFTER INSERT ON task BEGIN
+        INSERT INTO board_status_count (board_id, status, count)
+        SELECT NEW.board_id, NEW.status, 1 WHERE NEW.status IS NOT NULL
+        ON CONFLICT (board_id, status) DO UPDATE SET count = count + 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS task_status_count_update AFTER UPDATE OF status, board_id ON task
+    WHEN OLD.status IS NOT NEW.status OR OLD.board_id IS NOT NEW.board_id BEGIN
+        UPDATE board_status_count SET count = count - 1 WHERE board_id = OLD.board_id AND status = OLD.status;
+        INSERT INTO board_status_count (board_id, status, count)
+        SELECT NEW.board_id, NEW.status, 1 WHERE NEW.status IS NOT NULL
+        ON CONFLICT (board_id, status) DO UPDATE SET count = count + 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS task_status_count_delete AFTER DELETE ON task BEGIN
+        UPDATE board_status_count SET count = count - 1 WHERE board_id = OLD.board_id AND status = OLD.status;
+    END
+    """,
+)
+
+
+@event.listens_for(db.metadata, 'after_create')
+def create_board_status_count_triggers(target, connection, **kwargs):
+    if connection.dialect.name != 'sqlite':
+        return
+    for trigger in BOARD_STATUS_COUNT_TRIGGERS:
+        connection.execute(text(trigger))
+
+
+# Full text index of the task titles and descriptions. It is an external content FTS5 table: it only
+# stores the index and reads the text back from task, the triggers keep it in sync with every task write.
+TASK_SEARCH_DDL = (
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS task_fts USING fts5(
+        title, description, content='task', content_rowid='id', tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
     )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS task_fts_insert AFTER INSERT ON task BEGIN
+        INSERT INTO task_fts (rowid, title, description) VALUES (NEW.id, NEW.title, NEW.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS task_fts_update AFTER UPDATE OF title, description ON task BEGIN
+        INSERT INTO task_fts (task_fts, rowid, title, description) VALUES ('delete', OLD.id, OLD.title, OLD.description);
+        INSERT INTO task_fts (rowid, title, description) VALUES (NEW.id, NEW.title, NEW.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS task_fts_delete AFTER DELETE ON task BEGIN
+        INSERT INTO task_fts (task_fts, rowid, title, description) VALUES ('delete', OLD.id, OLD.title, OLD.description);
+    END
+    """,
+)
+
+
+@event.listens_for(db.metadata, 'after_create')
+def create_task_search_index(target, connection, **kwargs):
+    if connection.dialect.name != 'sqlite':
+        return
+    for statement in TASK_SEARCH_DDL:
+        connection.execute(text(statement))
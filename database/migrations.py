@@ -0,0 +1,119 @@
+"""
+Schema migrations of existing databases, tracked with SQLite's `PRAGMA user_version`.
+
+A new database gets the current schema from db.create_all(), the migrations then only record its version.
+Every migration must therefore be idempotent. To upgrade an existing database file:
+
+    python -m database.migrations sqlite:////path/to/test.database
+"""
+import sys
+
+from sqlalchemy import create_engine, inspect, text
+
+from database.flask_models import (Board, BoardStatusCount, ResourceVersion, ShardBlock, Task, TeamShard, UserTeam,
+                                   create_board_status_count_triggers, create_resource_version_triggers,
+                                   create_task_search_index)
+
+
+def _task_user_id_is_integer(connection):
+    columns = {column['name']: column for column in inspect(connection).get_columns('task')}
+    return str(columns['user_id']['type']).upper().startswith('INTEGER')
+
+
+def migrate_task_user_id(connection):
+    """
+    Task.user_id was a String(64) joined to the integer User.id, the cast prevented the join from using
+    the primary key of user. Rebuild task with an integer user_id and add the indexes of the hot queries.
+    """
+    if not _task_user_id_is_integer(connection):
+        indexes = connection.execute(text(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'task' AND sql IS NOT NULL"))
+        for name, in indexes.fetchall():
+            connection.execute(text('DROP INDEX "{}"'.format(name)))
+        connection.execute(text('ALTER TABLE task RENAME TO task_old'))
+        Task.__table__.create(connection)
+        connection.execute(text(
+            'INSERT INTO task (id, title, description, user_id, creation_time, status, board_id) '
+            'SELECT id, title, description, CAST(user_id AS INTEGER), creation_time, status, board_id FROM task_old'))
+        connection.execute(text('DROP TABLE task_old'))
+    for table in (Task.__table__, Board.__table__, UserTeam.__table__):
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+
+
+def migrate_board_status_count(connection):
+    """
+    Add the per board status counters maintained by triggers on task and fill them from the existing tasks.
+    """
+    BoardStatusCount.__table__.create(connection, checkfirst=True)
+    create_board_status_count_triggers(None, connection)
+    connection.execute(BoardStatusCount.__table__.delete())
+    connection.execute(text(
+        'INSERT INTO board_status_count (board_id, status, count) '
+        'SELECT board_id, status, COUNT(*) FROM task WHERE status IS NOT NULL GROUP BY board_id, status'))
+
+
+def migrate_task_search_index(connection):
+    """
+    Add the FTS5 index of the task titles and descriptions with its sync triggers and build it from task.
+    """
+    create_task_search_index(None, connection)
+    connection.execute(text("INSERT INTO task_fts (task_fts) VALUES ('rebuild')"))
+
+
+def migrate_task_query_indexes(connection):
+    """
+    Replace the (board_id, status) index of task by the creation ordered indexes of the task queries.
+    """
+    connection.execute(text('DROP INDEX IF EXISTS ix_task_board_status'))
+    for index in Task.__table__.indexes:
+        index.create(connection, checkfirst=True)
+
+
+def migrate_shard_directory(connection):
+    """
+    Add the team -> shard directory and the id blocks of the sharded mode, see database/sharding.py.
+    """
+    TeamShard.__table__.create(connection, checkfirst=True)
+    ShardBlock.__table__.create(connection, checkfirst=True)
+
+
+def migrate_resource_versions(connection):
+    """
+    Add the resource write counters behind the ETags and their triggers, see code_base/versions.py.
+    """
+    ResourceVersion.__table__.create(connection, checkfirst=True)
+    create_resource_version_triggers(None, connection)
+
+
+# (version, migration) in the order they must be applied
+MIGRATIONS = [
+    (1, migrate_task_user_id),
+    (2, migrate_board_status_count),
+    (3, migrate_task_search_index),
+    (4, migrate_task_query_indexes),
+    (5, migrate_shard_directory),
+    (6, migrate_resource_versions),
+]
+
+
+def migrate(engine):
+    """
+    Apply the migrations newer than the version of the database, each in its own transaction.
+    :return: the list of versions applied
+    """
+    applied = []
+    for version, migration in MIGRATIONS:
+        with engine.begin() as connection:
+            if connection.execute(text('PRAGMA user_version')).scalar() >= version:
+                continue
+            migration(connection)
+            connection.execute(text('PRAGMA user_version = {}'.format(int(version))))
+        applied.append(version)
+    return applied
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 2:
+        sys.exit('usage: python -m database.migrations <database uri>')
+    print('applied migrations: {}'.format(migrate(create_engine(sys.argv[1])) or 'none'))
@@ -0,0 +1,419 @@
+"""
+Sharded mode: the boards and tasks of each team live in one of the SQLite files listed by SHARD_BINDS, users,
+teams and the team -> shard directory stay in the global database of SQLALCHEMY_DATABASE_URI.
+
+    SQLALCHEMY_BINDS = {'shard0': 'sqlite:////data/shard0.database', 'shard1': 'sqlite:////data/shard1.database'}
+    SHARD_BINDS = ['shard0', 'shard1']
+
+A team is pinned to shard team_id % N when its first board is created. The board API routes each request to
+the shard of its team (code_base/shard_routing.py) and db.session then sends every statement there. Every
+shard gets its own writer lock.
+
+Board and task ids stay unique across shards: each shard draws its new ids from a block of SHARD_ID_SPAN ids
+leased to it in shard_block, block 0 holds the ids of the unsharded database. The shard of an id is the one
+its block is leased to, the other shards are probed for the ids of the teams moved since.
+
+The shards are prepared, filled from an unsharded database, inspected and rebalanced with:
+
+    python -m database.sharding --global sqlite:////data/test.database \\
+        --shard sqlite:////data/shard0.database --shard sqlite:////data/shard1.database <command>
+
+    prepare                   create the shard schemas, the directory and the id blocks
+    import                    move the boards and tasks of the global database to the shards of their teams
+    status                    boards, tasks and teams of each shard
+    move <team_id> <shard>    move a team to the shard of that index
+    rebalance                 move teams from the fullest to the emptiest shard until their tasks are even
+
+The shards are given in SHARD_BINDS order. A move copies the boards and tasks of the team into the target,
+whose triggers rebuild its status counters and search index, switches the directory and deletes them from
+the source. The source stays write locked for the whole move, its writers wait up to their busy timeout.
+A write routed to the source before the switch may still land there once the move is done, moving the team
+again to the same shard sweeps such rows in.
+"""
+import argparse
+import heapq
+import json
+import sqlite3
+from itertools import islice
+
+from flask import current_app
+from sqlalchemy import column, create_engine, func, select, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import make_url
+
+from database.database import current_shard, db, shard_scope
+from database.flask_models import Board, BoardStatusCount, ResourceVersion, ShardBlock, Task, Team, TeamShard
+
+# Ids of a block, 2**40 leaves room for 2**23 blocks in a SQLite integer
+SHARD_ID_SPAN = 2 ** 40
+# Tables kept in the shards, the other tables of the metadata are global
+SHARDED_TABLES = (Board.__table__, Task.__table__, BoardStatusCount.__table__, ResourceVersion.__table__)
+
+BOARD_COLUMNS = ', '.join(column.name for column in Board.__table__.columns)
+TASK_COLUMNS = ', '.join(column.name for column in Task.__table__.columns)
+
+
+def team_shard(team_id, pin=False):
+    """
+    :param pin: record the default shard of a team that has none yet, when the team exists
+    :return: the index of the shard holding the boards of the team, in SHARD_BINDS
+    """
+    count = len(current_app.config['SHARD_BINDS'])
+    shard = db.session.execute(select(TeamShard.shard).where(TeamShard.team_id == team_id)).scalar()
+    if shard is None and pin and db.session.execute(select(Team.id).where(Team.id == team_id)).first():
+        db.session.execute(sqlite_insert(TeamShard).values(team_id=team_id, shard=team_id % count)
+                           .on_conflict_do_nothing())
+        db.session.commit()
+        shard = db.session.execute(select(TeamShard.shard).where(TeamShard.team_id == team_id)).scalar()
+    return shard if shard is not None else team_id % count
+
+
+def block_shard(block):
+    """
+    :return: the index of the shard the id block is leased to, None for block 0 or an unknown block
+    """
+    blocks = current_app.extensions.setdefault('shard_blocks', {})
+    if block and block not in blocks:
+        # blocks are only leased by this tool, a new one is a rare miss
+        blocks.update(db.session.execute(select(ShardBlock.block, ShardBlock.shard)).all())
+    return blocks.get(block)
+
+
+def row_shard(model, row_id):
+    """
+    :return: the index of the shard holding the board or task `row_id`, the shard of its id block when
+    no shard has it
+    """
+    bind_keys = current_app.config['SHARD_BINDS']
+    home = block_shard(row_id // SHARD_ID_SPAN)
+    order = ([home] if home is not None else []) + [index for index in range(len(bind_keys)) if index != home]
+    statement = select(model.id).where(model.id == row_id)
+    for index in order:
+        with shard_scope(bind_keys[index]):
+            # a core execution on the connection the view then reuses, the orm adds nothing to a key lookup
+            if db.session.connection().execute(statement).first() is not None:
+                return index
+    return home if home is not None else 0
+
+
+def rows_shards(model, row_ids):
+    """
+    :return: {id: index of the shard holding it} of the boards or tasks of `row_ids`, ids found in no shard
+    are left out
+    """
+    shards = {}
+    missing = set(row_ids)
+    for index, bind_key in enumerate(current_app.config['SHARD_BINDS']):
+        if not missing:
+            break
+        ids = select(column('value')).select_from(func.json_each(json.dumps(sorted(missing))))
+        with shard_scope(bind_key):
+            found = db.session.connection().execute(select(model.id).where(model.id.in_(ids))).scalars().all()
+        shards.update(dict.fromkeys(found, index))
+        missing.difference_update(found)
+    return shards
+
+
+def merged_page(statement, key, limit, offset=0, descending=False):
+    """
+    Run an ordered select on the shard of the request, or on every shard when the request is routed to none,
+    and return its rows `offset` to `offset + limit`.
+    Each shard returns its first `offset + limit` rows, they are merged on `key`, the ordering of the
+    statement computed on a row, e.g. lambda row: (row.creation_time, row.id).
+    """
+    bind_keys = current_app.config['SHARD_BINDS']
+    if not bind_keys or current_shard() is not None:
+        return db.session.execute(statement.limit(limit).offset(offset)).all()
+    pages = []
+    for bind_key in bind_keys:
+        with shard_scope(bind_key):
+            pages.append(db.session.execute(statement.limit(offset + limit)).all())
+    return list(islice(heapq.merge(*pages, key=key, reverse=descending), offset, offset + limit))
+
+
+def any_row(statement):
+    """
+    :return: whether the select returns a row on the shard of the request, or on any shard when the request
+    is routed to none
+    """
+    bind_keys = current_app.config['SHARD_BINDS']
+    if not bind_keys or current_shard() is not None:
+        return db.session.execute(statement).first() is not None
+    for bind_key in bind_keys:
+        with shard_scope(bind_key):
+            if db.session.execute(statement).first() is not None:
+                return True
+    return False
+
+
+def _connect(path):
+    connection = sqlite3.connect(path, isolation_level=None, timeout=60)
+    connection.execute('PRAGMA busy_timeout = 60000')
+    return connection
+
+
+def _lease_block(global_connection, shard):
+    """
+    Lease the block following every leased one to the shard.
+    :return: the first id of the block
+    """
+    block, = global_connection.execute('SELECT COALESCE(MAX(block), 0) + 1 FROM shard_block').fetchone()
+    global_connection.execute('INSERT INTO shard_block (block, shard) VALUES (?, ?)', (block, shard))
+    return block * SHARD_ID_SPAN
+
+
+def _start_ids_at(connection, first_id):
+    for name in ('board', 'task'):
+        connection.execute('DELETE FROM sqlite_sequence WHERE name = ?', (name,))
+        connection.execute('INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)', (name, first_id))
+
+
+def prepare(global_path, shard_paths):
+    """
+    Create the directory and id block tables in the global database and the board and task tables in each shard,
+    leasing a block of ids to the shards without one. Shards already prepared are left as they are.
+    """
+    from database.migrations import MIGRATIONS
+
+    global_engine = create_engine('sqlite:///' + global_path)
+    TeamShard.__table__.create(global_engine, checkfirst=True)
+    ShardBlock.__table__.create(global_engine, checkfirst=True)
+    global_engine.dispose()
+    for shard, path in enumerate(shard_paths):
+        engine = create_engine('sqlite:///' + path)
+        db.metadata.create_all(engine, tables=SHARDED_TABLES)
+        with engine.begin() as connection:
+            # the shard starts with the current schema, migrations of the global tables do not apply
+            connection.execute(text('PRAGMA user_version = {}'.format(int(MIGRATIONS[-1][0]))))
+        engine.dispose()
+        global_connection, connection = _connect(global_path), _connect(path)
+        try:
+            global_connection.execute('BEGIN IMMEDIATE')
+            if global_connection.execute('SELECT 1 FROM shard_block WHERE shard = ?', (shard,)).fetchone() is None:
+                _start_ids_at(connection, _lease_block(global_connection, shard))
+            global_connection.execute('COMMIT')
+        finally:
+            global_connection.close()
+            connection.close()
+
+
+def _pin(global_connection, team_id, shard):
+    global_connection.execute('INSERT INTO team_shard (team_id, shard) VALUES (?, ?) '
+                              'ON CONFLICT (team_id) DO UPDATE SET shard = excluded.shard', (team_id, shard))
+
+
+def _move_rows(global_path, source_path, target_path, target, team_id):
+    """
+    Move the boards and tasks of the team from the source database to the target shard.
+    :return: (boards, tasks) moved
+    """
+    source = _connect(source_path)
+    target_connection = _connect(target_path)
+    global_connection = source if source_path == global_path else _connect(global_path)
+    try:
+        # Writers of the source wait from here until the rows are gone
+        source.execute('BEGIN IMMEDIATE')
+        target_connection.execute('BEGIN IMMEDIATE')
+        # Rows already in the target, from an interrupted move, are not copied twice
+        copied = {board_id for board_id, in target_connection.execute('SELECT id FROM board WHERE team_id = ?',
+                                                                        (team_id,))}
+        rows = source.execute('SELECT {} FROM board WHERE team_id = ?'.format(BOARD_COLUMNS), (team_id,))
+        boards = target_connection.executemany(
+            'INSERT INTO board ({}) VALUES ({})'.format(BOARD_COLUMNS, ', '.join('?' * len(Board.__table__.columns))),
+            (row for row in rows if row[0] not in copied)).rowcount
+        board_ids = json.dumps([board_id for board_id, in target_connection.execute(
+            'SELECT id FROM board WHERE team_id = ?', (team_id,))])
+        copied = {task_id for task_id, in target_connection.execute(
+            'SELECT id FROM task WHERE board_id IN (SELECT value FROM json_each(?))', (board_ids,))}
+        rows = source.execute('SELECT {} FROM task WHERE board_id IN (SELECT value FROM json_each(?))'
+                              .format(TASK_COLUMNS), (board_ids,))
+        tasks = target_connection.executemany(
+            'INSERT INTO task ({}) VALUES ({})'.format(TASK_COLUMNS, ', '.join('?' * len(Task.__table__.columns))),
+            (row for row in rows if row[0] not in copied)).rowcount
+
+        # Ids of another shard's block make the target allocate above them, it moves on to a fresh block
+        block, = global_connection.execute('SELECT MAX(block) FROM shard_block WHERE shard = ?',
+                                           (target,)).fetchone()
+        top = max(target_connection.execute('SELECT COALESCE(MAX(id), 0) FROM board').fetchone()[0],
+                  target_connection.execute('SELECT COALESCE(MAX(id), 0) FROM task').fetchone()[0])
+        if block is None or top >= (block + 1) * SHARD_ID_SPAN:
+            if global_connection is not source:
+                global_connection.execute('BEGIN IMMEDIATE')
+            _start_ids_at(target_connection, _lease_block(global_connection, target))
+            if global_connection is not source:
+                global_connection.execute('COMMIT')
+        target_connection.execute('COMMIT')
+
+        if global_connection is not source:
+            global_connection.execute('BEGIN IMMEDIATE')
+        _pin(global_connection, team_id, target)
+        if global_connection is not source:
+            global_connection.execute('COMMIT')
+
+        ids = (board_ids,)
+        source.execute('DELETE FROM task WHERE board_id IN (SELECT value FROM json_each(?))', ids)
+        source.execute('DELETE FROM board_status_count WHERE board_id IN (SELECT value FROM json_each(?))', ids)
+        source.execute('DELETE FROM board WHERE id IN (SELECT value FROM json_each(?))', ids)
+        source.execute('COMMIT')
+    except BaseException:
+        for connection in (target_connection, source, global_connection):
+            if connection.in_transaction:
+                connection.execute('ROLLBACK')
+        raise
+    finally:
+        target_connection.close()
+        source.close()
+        if global_connection is not source:
+            global_connection.close()
+    return boards, tasks
+
+
+def move_team(global_path, shard_paths, team_id, target, sources=None):
+    """
+    Move the boards and tasks of a team to the shard `target` from every other shard, or from the
+    databases of `sources`, and pin the team to it.
+    :return: (boards, tasks) moved
+    """
+    if not 0 <= target < len(shard_paths):
+        raise ValueError('No shard {}, there are {}'.format(target, len(shard_paths)))
+    if sources is None:
+        sources = [path for index, path in enumerate(shard_paths) if index != target]
+    moved = [0, 0]
+    for source_path in sources:
+        boards, tasks = _move_rows(global_path, source_path, shard_paths[target], target, team_id)
+        moved[0] += boards
+        moved[1] += tasks
+    connection = _connect(global_path)
+    try:
+        _pin(connection, team_id, target)
+    finally:
+        connection.close()
+    return tuple(moved)
+
+
+def import_global(global_path, shard_paths):
+    """
+    Move the boards and tasks of the unsharded global database to the shards of their teams, pinning the
+    teams without a shard to team_id % N.
+    :return: {team_id: (boards, tasks)} moved
+    """
+    connection = _connect(global_path)
+    try:
+        teams = [team_id for team_id, in connection.execute('SELECT DISTINCT team_id FROM board ORDER BY team_id')]
+        pinned = dict(connection.execute('SELECT team_id, shard FROM team_shard'))
+    finally:
+        connection.close()
+    return {team_id: move_team(global_path, shard_paths, team_id, pinned.get(team_id, team_id % len(shard_paths)),
+                               sources=[global_path])
+            for team_id in teams}
+
+
+def team_loads(shard_paths):
+    """
+    :return: for each shard, {team_id: number of tasks} of the teams with boards there
+    """
+    loads = []
+    for path in shard_paths:
+        connection = _connect(path)
+        try:
+            loads.append(dict(connection.execute(
+                'SELECT board.team_id, COALESCE(SUM(board_status_count.count), 0) FROM board '
+                'LEFT JOIN board_status_count ON board_status_count.board_id = board.id GROUP BY board.team_id')))
+        finally:
+            connection.close()
+    return loads
+
+
+def rebalance(global_path, shard_paths, tolerance=0.1, max_moves=10):
+    """
+    Greedily move the team evening out the fullest and the emptiest shard best, until their tasks differ by
+    less than `tolerance` of the fullest one or `max_moves` teams were moved.
+    :return: the list of (team_id, source, target, tasks) moves
+    """
+    moves = []
+    while len(moves) < max_moves:
+        loads = team_loads(shard_paths)
+        totals = [sum(load.values()) for load in loads]
+        fullest = max(range(len(totals)), key=totals.__getitem__)
+        emptiest = min(range(len(totals)), key=totals.__getitem__)
+        gap = totals[fullest] - totals[emptiest]
+        if gap <= tolerance * totals[fullest]:
+            break
+        # a team larger than the gap would only swap the roles of the two shards
+        candidates = [(abs(tasks - gap / 2), team_id, tasks) for team_id, tasks in loads[fullest].items()
+                      if 0 < tasks < gap]
+        if not candidates:
+            break
+        _, team_id, tasks = min(candidates)
+        move_team(global_path, shard_paths, team_id, emptiest, sources=[shard_paths[fullest]])
+        moves.append((team_id, fullest, emptiest, tasks))
+    return moves
+
+
+def status(global_path, shard_paths):
+    """
+    :return: for each shard its boards, tasks and teams, and the boards of teams pinned to another shard
+    """
+    connection = _connect(global_path)
+    try:
+        pinned = dict(connection.execute('SELECT team_id, shard FROM team_shard'))
+        blocks = dict(connection.execute('SELECT shard, MAX(block) FROM shard_block GROUP BY shard'))
+    finally:
+        connection.close()
+    shards = []
+    for index, (path, load) in enumerate(zip(shard_paths, team_loads(shard_paths))):
+        connection = _connect(path)
+        try:
+            boards = dict(connection.execute('SELECT team_id, COUNT(*) FROM board GROUP BY team_id'))
+        finally:
+            connection.close()
+        shards.append({'shard': index, 'path': path, 'block': blocks.get(index), 'teams': len(load),
+                       'boards': sum(boards.values()), 'tasks': sum(load.values()),
+                       'stray_boards': sum(count for team_id, count in boards.items()
+                                           if pinned.get(team_id, team_id % len(shard_paths)) != index)})
+    return shards
+
+
+def _path(uri):
+    url = make_url(uri)
+    if url.get_backend_name() != 'sqlite' or url.database in (None, '', ':memory:'):
+        raise argparse.ArgumentTypeError('{} is not a SQLite database file'.format(uri))
+    return url.database
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Manage the shards of the boards and tasks.')
+    parser.add_argument('--global', dest='global_path', type=_path, required=True,
+                        help='uri of the global database')
+    parser.add_argument('--shard', dest='shard_paths', type=_path, action='append', required=True,
+                        help='uri of a shard, in SHARD_BINDS order')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('prepare')
+    commands.add_parser('import')
+    commands.add_parser('status')
+    move = commands.add_parser('move')
+    move.add_argument('team_id', type=int)
+    move.add_argument('shard', type=int)
+    balance = commands.add_parser('rebalance')
+    balance.add_argument('--tolerance', type=float, default=0.1)
+    balance.add_argument('--max-moves', type=int, default=10)
+    args = parser.parse_args(argv)
+
+    if args.command == 'prepare':
+        prepare(args.global_path, args.shard_paths)
+    elif args.command == 'import':
+        for team_id, (boards, tasks) in import_global(args.global_path, args.shard_paths).items():
+            print('team {}: {} boards, {} tasks'.format(team_id, boards, tasks))
+    elif args.command == 'move':
+        print('{} boards, {} tasks moved'.format(*move_team(args.global_path, args.shard_paths,
+                                                            args.team_id, args.shard)))
+    elif args.command == 'rebalance':
+        for team_id, source, target, tasks in rebalance(args.global_path, args.shard_paths, args.tolerance,
+                                                        args.max_moves):
+            print('team {}: shard {} -> {}, {} tasks'.format(team_id, source, target, tasks))
+    for shard in status(args.global_path, args.shard_paths):
+        print(json.dumps(shard))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""
+Fixtures of the API tests: an app bound to a throw-away SQLite database with the current schema, and helpers
+seeding it through the models. The flat `code_base` imports are made resolvable as for the benchmarks.
+"""
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import text
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (ROOT, os.path.join(ROOT, 'code_base')):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+from database.database import db  # noqa: E402
+from database.flask_models import Board, Task, Team, User, UserTeam  # noqa: E402
+from server_app import create_app, setup_database  # noqa: E402
+
+# Creation time of the seeded rows, row i is created i minutes later
+EPOCH = datetime(2024, 1, 1)
+SHARDS = ('shard0', 'shard1')
+STATUSES = ('OPEN', 'IN_PROGRESS', 'COMPLETE')
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + str(tmp_path / 'test.database')})
+    setup_database(app)
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def sharded_app(tmp_path):
+    """
+    An app in the sharded mode, the boards and tasks in two shards, see database/sharding.py.
+    """
+    app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + str(tmp_path / 'test.database'),
+                      'SQLALCHEMY_BINDS': {key: 'sqlite:///' + str(tmp_path / (key + '.database'))
+                                           for key in SHARDS},
+                      'SHARD_BINDS': list(SHARDS)})
+    setup_database(app)
+    yield app
+    with app.app_context():
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def created(i):
+    return EPOCH + timedelta(minutes=i)
+
+
+def insert(app, model, rows):
+    """
+    Insert `rows`, dicts of column values, into the table of `model`.
+    """
+    with app.app_context():
+        db.session.execute(model.__table__.insert(), list(rows))
+        db.session.commit()
+
+
+def add_users(app, count):
+    insert(app, User, ({'id': i, 'user_name': 'user{}'.format(i), 'display_name': 'User {}'.format(i),
+                        'creation_time': created(i)} for i in range(1, count + 1)))
+
+
+def add_teams(app, count):
+    insert(app, Team, ({'id': i, 'name': 'team{}'.format(i), 'description': 'Team {}'.format(i), 'admin': 1,
+                        'creation_time': created(i)} for i in range(1, count + 1)))
+
+
+def add_members(app, team_id, user_ids):
+    insert(app, UserTeam, ({'team_id': team_id, 'user_id': user_id} for user_id in user_ids))
+
+
+def add_boards(app, team_ids):
+    """
+    Add one board per item of `team_ids`, board i + 1 belongs to team_ids[i].
+    """
+    insert(app, Board, ({'id': i, 'name': 'board{}'.format(i), 'description': 'Board', 'team_id': team_id,
+                         'status': 'OPEN', 'creation_time': created(i)} for i, team_id in enumerate(team_ids, 1)))
+
+
+def counts(client, team_id):
+    response = client.post('/board_summary', json={'team_id': team_id})
+    assert response.status_code == 200
+    return {board['id']: board['counts'] for board in response.json}
+
+
+def recounted(app):
+    """
+    :return: the summary counts of every board, counted on task
+    """
+    with app.app_context():
+        rows = db.session.execute(text('SELECT board.id, task.status, COUNT(task.id) FROM board '
+                                       'LEFT JOIN task ON task.board_id = board.id '
+                                       'GROUP BY board.id, task.status')).all()
+    result = {}
+    for board_id, status, count in rows:
+        board = result.setdefault(board_id, dict.fromkeys(STATUSES, 0))
+        if status is not None:
+            board[status] = count
+    return result
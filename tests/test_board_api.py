@@ -0,0 +1,27 @@
+import pytest
+
+from conftest import add_teams, add_users
+
+
+@pytest.fixture
+def team(app):
+    add_users(app, 1)
+    add_teams(app, 1)
+    return app
+
+
+def test_create_board(team, client):
+    response = client.post('/create_board', json={'name': 'main', 'description': 'Main', 'team_id': 1})
+    assert response.status_code == 201
+    assert client.post('/list_boards', json={'team_id': 1}).json == [{'id': response.json['id'], 'name': 'main'}]
+
+
+@pytest.mark.parametrize('payload', [
+    {'description': 'Main', 'team_id': 1},
+    {'name': 'main', 'description': 'Main', 'team_id': 'one'},
+    {'name': 'main', 'description': 'Main', 'team_id': 1, 'owner': 1},
+])
+def test_create_board_validation_errors(team, client, payload):
+    response = client.post('/create_board', json=payload)
+    assert response.status_code == 400
+    assert isinstance(response.json['error'], dict)
@@ -0,0 +1,67 @@
+import io
+import zipfile
+
+import pytest
+
+from conftest import add_boards, add_teams, add_users, created, insert
+from database.flask_models import Task
+
+# (title, status, user_id) of the tasks of board 1, the labels mix ASCII, wide, fullwidth and combining characters
+TASKS = (
+    ('Write the release notes', 'OPEN', 1),
+    ('漢字タスク', 'IN_PROGRESS', 2),
+    ('cafe\u0301 menu', 'COMPLETE', 1),
+    ('Ｆｕｌｌ width', 'OPEN', 2),
+    ('Deploy', 'COMPLETE', 2),
+)
+
+# The table tabulate rendered for these tasks with tablefmt='psql'
+EXPECTED_TABLE = (
+    '+------------------------------------+-----------------------+----------------------+\n'
+    '| OPEN                               | IN_PROGRESS           | COMPLETE             |\n'
+    '|------------------------------------+-----------------------+----------------------|\n'
+    '| 1-->Write the release notes(user1) |                       |                      |\n'
+    '|                                    | 2-->漢字タスク(user2) |                      |\n'
+    '|                                    |                       | 3-->cafe\u0301 menu(user1) |\n'
+    '| 4-->Ｆｕｌｌ width(user2)          |                       |                      |\n'
+    '|                                    |                       | 5-->Deploy(user2)    |\n'
+    '+------------------------------------+-----------------------+----------------------+'
+)
+
+EMPTY_TABLE = (
+    '+--------+---------------+------------+\n'
+    '| OPEN   | IN_PROGRESS   | COMPLETE   |\n'
+    '|--------+---------------+------------|\n'
+    '+--------+---------------+------------+'
+)
+
+
+@pytest.fixture
+def board(app):
+    add_users(app, 2)
+    add_teams(app, 1)
+    add_boards(app, [1, 1])
+    insert(app, Task, ({'id': i, 'title': title, 'user_id': user_id, 'status': status, 'board_id': 1,
+                        'creation_time': created(i)} for i, (title, status, user_id) in enumerate(TASKS, 1)))
+    return app
+
+
+def test_table_is_rendered_as_tabulate_did(board, client):
+    response = client.post('/export_board', json={'id': 1})
+    assert response.status_code == 200
+    assert response.get_data() == EXPECTED_TABLE.encode()
+    # the second export is served from the cache
+    assert client.post('/export_board', json={'id': 1}).get_data() == EXPECTED_TABLE.encode()
+
+
+def test_empty_board_table(board, client):
+    assert client.post('/export_board', json={'id': 2}).get_data() == EMPTY_TABLE.encode()
+
+
+def test_team_archive_holds_the_same_tables(board, client):
+    response = client.post('/export_team', json={'team_id': 1})
+    assert response.status_code == 200
+    with zipfile.ZipFile(io.BytesIO(response.get_data())) as archive:
+        assert archive.namelist() == ['1-board1.txt', '2-board2.txt']
+        assert archive.read('1-board1.txt') == EXPECTED_TABLE.encode()
+        assert archive.read('2-board2.txt') == EMPTY_TABLE.encode()
@@ -0,0 +1,85 @@
+import pytest
+from sqlalchemy import text
+
+from conftest import STATUSES, add_boards, add_teams, add_users, counts, created, insert, recounted
+from database.database import db
+from database.flask_models import Task
+from database.migrations import migrate
+
+
+@pytest.fixture
+def boards(app):
+    """
+    Boards 1 and 2 belong to team 1, board 3 to team 2. Board 1 has the tasks 1 to 6, OPEN then IN_PROGRESS.
+    """
+    add_users(app, 2)
+    add_teams(app, 2)
+    add_boards(app, [1, 1, 2])
+    insert(app, Task, ({'id': i, 'title': 'task{}'.format(i), 'user_id': 1, 'status': STATUSES[i % 2],
+                        'board_id': 1, 'creation_time': created(i)} for i in range(1, 7)))
+    return app
+
+
+def summary(client):
+    return {**counts(client, 1), **counts(client, 2)}
+
+
+def test_counts_follow_every_task_write(boards, client):
+    assert summary(client) == recounted(boards) == {
+        1: {'OPEN': 3, 'IN_PROGRESS': 3, 'COMPLETE': 0},
+        2: dict.fromkeys(STATUSES, 0),
+        3: dict.fromkeys(STATUSES, 0),
+    }
+
+    assert client.post('/add_task', json={'title': 'new', 'description': 'New', 'user_id': 1,
+                                          'board_id': 2}).status_code == 201
+    assert summary(client) == recounted(boards)
+    assert counts(client, 1)[2] == {'OPEN': 1, 'IN_PROGRESS': 0, 'COMPLETE': 0}
+
+    response = client.post('/add_tasks', json=[
+        {'title': 'bulk1', 'description': 'Bulk', 'user_id': 1, 'board_id': 2},
+        {'title': 'bulk2', 'description': 'Bulk', 'user_id': 2, 'board_id': 3},
+        {'title': 'new', 'description': 'Taken', 'user_id': 2, 'board_id': 3},
+    ])
+    assert response.status_code == 207
+    assert summary(client) == recounted(boards)
+    assert counts(client, 2)[3] == {'OPEN': 1, 'IN_PROGRESS': 0, 'COMPLETE': 0}
+
+    assert client.post('/update_task', json={'id': 1, 'status': 'COMPLETE'}).status_code == 200
+    # the same status again changes nothing
+    assert client.post('/update_task', json={'id': 1, 'status': 'COMPLETE'}).status_code == 200
+    assert summary(client) == recounted(boards)
+    assert counts(client, 1)[1] == {'OPEN': 3, 'IN_PROGRESS': 2, 'COMPLETE': 1}
+
+    response = client.post('/update_tasks', json={'filter': {'board_id': 1, 'status': 'OPEN'},
+                                                  'status': 'IN_PROGRESS'})
+    assert response.json == {'updated': {'IN_PROGRESS': 3}}
+    assert summary(client) == recounted(boards)
+    assert counts(client, 1)[1] == {'OPEN': 0, 'IN_PROGRESS': 5, 'COMPLETE': 1}
+
+    response = client.post('/update_tasks', json={'filter': {'board_id': 1}, 'status': 'COMPLETE'})
+    assert response.json == {'updated': {'COMPLETE': 6}}
+    response = client.post('/update_tasks', json={'tasks': [{'id': 2, 'status': 'OPEN'}, {'id': 3, 'status': 'OPEN'}]})
+    assert response.json == {'updated': {'OPEN': 2}}
+    assert summary(client) == recounted(boards)
+    assert counts(client, 1)[1] == {'OPEN': 2, 'IN_PROGRESS': 0, 'COMPLETE': 4}
+
+
+def test_summary_errors(boards, client):
+    assert client.post('/board_summary', json={'team_id': 9}).status_code == 404
+    assert client.post('/board_summary', json={}).status_code == 400
+
+
+def test_migration_fills_the_counters_of_an_existing_database(boards, client):
+    with boards.app_context():
+        with db.engine.begin() as connection:
+            for trigger in ('task_status_count_insert', 'task_status_count_update', 'task_status_count_delete'):
+                connection.execute(text('DROP TRIGGER {}'.format(trigger)))
+            connection.execute(text('DROP TABLE board_status_count'))
+            connection.execute(text('PRAGMA user_version = 1'))
+        assert migrate(db.engine)[0] == 2
+    assert summary(client) == recounted(boards)
+    assert counts(client, 1)[1] == {'OPEN': 3, 'IN_PROGRESS': 3, 'COMPLETE': 0}
+    # the triggers are back
+    client.post('/update_task', json={'id': 2, 'status': 'COMPLETE'})
+    assert counts(client, 1)[1] == {'OPEN': 2, 'IN_PROGRESS': 3, 'COMPLETE': 1}
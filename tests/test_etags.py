@@ -0,0 +1,92 @@
+import pytest
+from sqlalchemy import update
+
+from conftest import add_boards, add_teams, add_users, created, insert
+from database.database import db
+from database.flask_models import Task, User
+
+URLS = ('/userlist', '/team_list', '/list_boards?team_id=1', '/export_board?id=1', '/export_board?id=1&format=csv')
+
+
+@pytest.fixture
+def boards(app):
+    """
+    Boards 1 and 2 belong to team 1, each with two tasks of user 1.
+    """
+    add_users(app, 2)
+    add_teams(app, 2)
+    add_boards(app, [1, 1])
+    insert(app, Task, ({'id': i, 'title': 'task{}'.format(i), 'user_id': 1, 'status': 'OPEN', 'board_id': i % 2 + 1,
+                        'creation_time': created(i)} for i in range(1, 5)))
+    return app
+
+
+def etag(client, url):
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.headers['ETag']
+    return response.headers['ETag']
+
+
+@pytest.mark.parametrize('url', URLS)
+def test_unchanged_resources_are_not_sent_again(boards, client, url):
+    tag = etag(client, url)
+    assert etag(client, url) == tag
+    response = client.get(url, headers={'If-None-Match': tag})
+    assert response.status_code == 304
+    assert response.get_data() == b''
+    assert response.headers['ETag'] == tag
+    assert client.get(url, headers={'If-None-Match': '"stale"'}).status_code == 200
+
+
+@pytest.mark.parametrize('url, write', [
+    ('/userlist', lambda client: client.post('/create_user', json={'user_name': 'new', 'display_name': 'New'})),
+    ('/userlist', lambda client: client.post('/update_user', json={
+        'id': 1, 'user': {'user_name': 'user1', 'display_name': 'Renamed'}})),
+    ('/team_list', lambda client: client.post('/create_team', json={'name': 'new', 'description': 'New',
+                                                                     'admin': 1})),
+    ('/list_boards?team_id=1', lambda client: client.post('/create_board', json={'name': 'new', 'description': 'New',
+                                                                                  'team_id': 1})),
+    ('/export_board?id=1', lambda client: client.post('/add_task', json={'title': 'new', 'description': 'New',
+                                                                         'user_id': 2, 'board_id': 1})),
+    ('/export_board?id=1', lambda client: client.post('/add_tasks', json=[{'title': 'new', 'description': 'New',
+                                                                           'user_id': 2, 'board_id': 1}])),
+    ('/export_board?id=1', lambda client: client.post('/update_task', json={'id': 2, 'status': 'COMPLETE'})),
+    ('/export_board?id=1', lambda client: client.post('/update_tasks', json={
+        'tasks': [{'id': 2, 'status': 'COMPLETE'}]})),
+    ('/export_board?id=1&format=ndjson', lambda client: client.post('/update_tasks', json={
+        'filter': {'board_id': 1}, 'status': 'COMPLETE'})),
+])
+def test_writes_change_the_etag(boards, client, url, write):
+    tag = etag(client, url)
+    response = write(client)
+    assert response.status_code in (200, 201)
+    assert etag(client, url) != tag
+    assert client.get(url, headers={'If-None-Match': tag}).status_code == 200
+
+
+def test_user_rename_changes_the_board_exports(boards, client):
+    tags = {url: etag(client, url) for url in ('/export_board?id=1', '/export_board?id=2&format=json')}
+    with boards.app_context():
+        db.session.execute(update(User).where(User.id == 1).values(user_name='renamed'))
+        db.session.commit()
+    for url, tag in tags.items():
+        response = client.get(url, headers={'If-None-Match': tag})
+        assert response.status_code == 200
+        assert b'renamed' in response.get_data()
+
+
+def test_writes_to_another_board_keep_the_etag(boards, client):
+    tag = etag(client, '/export_board?id=1')
+    client.post('/update_task', json={'id': 1, 'status': 'COMPLETE'})
+    assert client.get('/export_board?id=1', headers={'If-None-Match': tag}).status_code == 304
+
+
+@pytest.mark.parametrize('url, payload', [('/list_boards', {'team_id': 1}), ('/export_board', {'id': 1})])
+def test_post_is_never_answered_with_304(boards, client, url, payload):
+    query = '?' + '&'.join('{}={}'.format(*item) for item in payload.items())
+    tag = etag(client, url + query)
+    response = client.post(url, json=payload, headers={'If-None-Match': tag})
+    assert response.status_code == 200
+    assert 'ETag' not in response.headers
+    assert response.get_data() == client.get(url + query).get_data()
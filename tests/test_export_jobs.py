@@ -0,0 +1,103 @@
+import time
+
+import pytest
+
+import project_board_baase
+from conftest import add_boards, add_teams, add_users, created, insert
+from database.flask_models import Task
+from export_jobs import ExportJobs, export_jobs
+
+
+@pytest.fixture
+def boards(app, tmp_path):
+    """
+    Board 1 of team 1 with three tasks, exports spooled to a directory of the test.
+    """
+    app.config['EXPORT_SPOOL_DIR'] = str(tmp_path / 'spool')
+    export_jobs.init_app(app)
+    add_users(app, 1)
+    add_teams(app, 1)
+    add_boards(app, [1])
+    insert(app, Task, ({'id': i, 'title': 'task{}'.format(i), 'user_id': 1, 'status': 'OPEN', 'board_id': 1,
+                        'creation_time': created(i)} for i in range(1, 4)))
+    return app
+
+
+@pytest.fixture
+def other_worker(boards):
+    """
+    The jobs of another worker sharing the spool.
+    """
+    jobs = ExportJobs()
+    jobs.init_app(boards)
+    return jobs
+
+
+def wait_done(client, job_id):
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        job = client.get('/export_jobs/{}'.format(job_id)).json
+        if job['status'] not in ('queued', 'running'):
+            return job
+        time.sleep(0.02)
+    raise AssertionError('the export job did not finish')
+
+
+def submit(client, **payload):
+    response = client.post('/export_jobs', json=dict(id=1, **payload))
+    assert response.status_code in (200, 202)
+    return response.json['job_id']
+
+
+def test_jobs_are_polled_and_downloaded_from_any_worker(boards, client, other_worker, monkeypatch):
+    job_id = submit(client, format='csv')
+    # the records are read from the spool, the other worker knows the job before its end too
+    assert other_worker.get(job_id) is not None
+    job = wait_done(client, job_id)
+    expected = client.get('/export_board?id=1&format=csv').get_data()
+    assert job['status'] == 'done' and job['size'] == len(expected)
+
+    monkeypatch.setattr(project_board_baase, 'export_jobs', other_worker)
+    assert client.get('/export_jobs/{}'.format(job_id)).json == job
+    response = client.get('/export_jobs/{}/file'.format(job_id))
+    assert response.status_code == 200
+    assert response.get_data() == expected
+    assert response.headers['Content-Disposition'] == 'attachment; filename=board_1.csv'
+
+
+def test_submissions_coalesce_across_workers(boards, client, other_worker, monkeypatch):
+    job_id = submit(client, format='json')
+    wait_done(client, job_id)
+    rendered = export_jobs.rendered
+
+    # the other worker gets the job of this version of the board back, done already
+    monkeypatch.setattr(project_board_baase, 'export_jobs', other_worker)
+    response = client.post('/export_jobs', json={'id': 1, 'format': 'json'})
+    assert response.status_code == 200
+    assert response.json == {'job_id': job_id, 'board_id': 1, 'format': 'json', 'status': 'done',
+                             'size': response.json['size'], 'error': None}
+    assert other_worker.coalesced == 1 and other_worker.rendered == 0
+    assert export_jobs.rendered == rendered
+
+    # a new version of the board is a new job, rendered by the worker submitting it
+    client.post('/update_task', json={'id': 1, 'status': 'COMPLETE'})
+    new_job_id = submit(client, format='json')
+    assert new_job_id != job_id
+    wait_done(client, new_job_id)
+    assert other_worker.rendered == 1
+    assert export_jobs.stats()['jobs'] == {'done': 2}
+
+
+def test_expired_and_unknown_jobs(boards, client, other_worker, monkeypatch):
+    job_id = submit(client)
+    wait_done(client, job_id)
+    assert client.get('/export_jobs/{}/file'.format(job_id)).status_code == 200
+    assert client.get('/export_jobs/{}'.format('0' * 32)).status_code == 404
+    assert client.get('/export_jobs/not-a-job').status_code == 404
+
+    # past its ttl in the other worker
+    other_worker.ttl = -1
+    monkeypatch.setattr(project_board_baase, 'export_jobs', other_worker)
+    assert client.get('/export_jobs/{}'.format(job_id)).status_code == 404
+    assert client.get('/export_jobs/{}/file'.format(job_id)).status_code == 404
+    assert export_jobs.stats()['jobs'] == {}
@@ -0,0 +1,98 @@
+import threading
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from conftest import add_boards, add_teams, add_users, counts, recounted
+from database.database import db
+from database.flask_models import Task
+from group_commit import group_commit
+
+
+@pytest.fixture
+def boards(app):
+    """
+    Board 1 of team 1, task writes committed in groups gathered for up to 200 ms.
+    """
+    app.config.update(GROUP_COMMIT=True, GROUP_COMMIT_MAX_WAIT_MS=200)
+    add_users(app, 1)
+    add_teams(app, 1)
+    add_boards(app, [1])
+    return app
+
+
+def add_concurrently(app, titles):
+    """
+    Send one /add_task per title, all at once from as many threads.
+    :return: the responses, in the order of `titles`
+    """
+    responses = [None] * len(titles)
+    barrier = threading.Barrier(len(titles))
+
+    def add(index):
+        client = app.test_client()
+        barrier.wait()
+        responses[index] = client.post('/add_task', json={'title': titles[index], 'description': 'Task',
+                                                          'user_id': 1, 'board_id': 1})
+
+    threads = [threading.Thread(target=add, args=(index,)) for index in range(len(titles))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return responses
+
+
+def indexed(app):
+    """
+    :return: (tasks, tasks in the search index, tasks the index finds by their title)
+    """
+    with app.app_context():
+        tasks = db.session.execute(select(Task.id, Task.title)).all()
+        indexed_count = db.session.execute(select(func.count()).select_from(db.table('task_fts'))).scalar()
+    found = sum(app.test_client().post('/search_tasks', json={'query': title}).json == [] for _, title in tasks)
+    return len(tasks), indexed_count, len(tasks) - found
+
+
+def test_a_failing_write_fails_alone(boards, client):
+    before = group_commit.stats()
+    titles = ['task{}'.format(i) for i in range(7)] + ['task0']
+    statuses = [response.status_code for response in add_concurrently(boards, titles)]
+    assert sorted(statuses) == [201] * 7 + [500]
+    assert statuses[0] == 500 or statuses[-1] == 500
+    after = group_commit.stats()
+    assert after['writes'] - before['writes'] == 8 and after['failed'] - before['failed'] == 1
+    # the writes were committed together
+    assert after['batches'] - before['batches'] < 8
+
+    # the savepoint of the failed write took its counter and index changes back with it
+    assert counts(client, 1) == recounted(boards) == {1: {'OPEN': 7, 'IN_PROGRESS': 0, 'COMPLETE': 0}}
+    assert indexed(boards) == (7, 7, 7)
+    response = client.post('/update_task', json={'id': 1, 'status': 'COMPLETE'})
+    assert response.status_code == 200
+    assert counts(client, 1) == recounted(boards)
+
+
+def test_a_failing_commit_fails_the_whole_batch(boards, client, monkeypatch):
+    commit = Session.commit
+
+    def failing_commit(session):
+        if threading.current_thread().name == 'group-commit':
+            raise OperationalError('COMMIT', {}, Exception('disk I/O error'))
+        return commit(session)
+
+    monkeypatch.setattr(Session, 'commit', failing_commit)
+    before = group_commit.stats()
+    statuses = [response.status_code for response in add_concurrently(boards, ['a', 'b', 'c', 'd'])]
+    assert statuses == [500] * 4
+    assert group_commit.stats()['failed'] - before['failed'] == 4
+    assert counts(client, 1) == recounted(boards) == {1: {'OPEN': 0, 'IN_PROGRESS': 0, 'COMPLETE': 0}}
+    assert indexed(boards) == (0, 0, 0)
+
+    # the writer goes on with the next batches
+    monkeypatch.setattr(Session, 'commit', commit)
+    assert [response.status_code for response in add_concurrently(boards, ['a', 'b'])] == [201, 201]
+    assert counts(client, 1) == recounted(boards)
+    assert indexed(boards) == (2, 2, 2)
@@ -0,0 +1,141 @@
+import sqlite3
+
+import pytest
+from sqlalchemy import event
+
+from conftest import add_members, add_teams, add_users
+from database.database import db
+
+
+@pytest.fixture
+def teams(app):
+    """
+    Team 1 has the users 1 to 7 as members, team 2 the users 1 to 40, team 3 only user 2.
+    """
+    add_users(app, 40)
+    add_teams(app, 3)
+    add_members(app, 1, range(1, 8))
+    add_members(app, 2, range(1, 41))
+    add_members(app, 3, [2])
+    return app
+
+
+def count_statements(app, client, url, payload):
+    statements = []
+
+    def count(*args):
+        statements.append(args[2])
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', count)
+    try:
+        response = client.post(url, json=payload)
+        response.get_data()
+    finally:
+        event.remove(engine, 'before_cursor_execute', count)
+    assert response.status_code == 200
+    return len(statements)
+
+
+def test_team_members_pages(teams, client):
+    pages = []
+    after_id = 0
+    while after_id is not None:
+        response = client.post('/teams_user_list?after_id={}&limit=3'.format(after_id), json={'id': 1})
+        assert response.status_code == 200
+        pages.append([member['id'] for member in response.json])
+        after_id = response.headers.get('X-Next-After-Id')
+    assert pages == [[1, 2, 3], [4, 5, 6], [7]]
+
+    response = client.post('/teams_user_list', json={'id': 1})
+    assert [member['id'] for member in response.json] == list(range(1, 8))
+    assert response.json[0]['user_name'] == 'user1'
+    assert 'X-Next-After-Id' not in response.headers
+
+
+def test_team_members_stream(teams, client):
+    response = client.post('/teams_user_list?stream=true&after_id=35', json={'id': 2})
+    assert response.status_code == 200
+    assert [member['id'] for member in response.json] == [36, 37, 38, 39, 40]
+
+
+def test_user_teams_pages(teams, client):
+    response = client.post('/users_team_list?limit=2', json={'id': 2})
+    assert [team['id'] for team in response.json] == [1, 2]
+    assert response.headers['X-Next-After-Id'] == '2'
+    response = client.post('/users_team_list?limit=2&after_id=2', json={'id': 2})
+    assert [team['id'] for team in response.json] == [3]
+    assert 'X-Next-After-Id' not in response.headers
+    response = client.post('/users_team_list', json={'id': 40})
+    assert [team['name'] for team in response.json] == ['team2']
+
+
+@pytest.mark.parametrize('url, payload, status', [
+    ('/teams_user_list', {'id': 99}, 404),
+    ('/users_team_list', {'id': 99}, 404),
+    ('/teams_user_list?limit=0', {'id': 1}, 400),
+    ('/teams_user_list?after_id=-1', {'id': 1}, 400),
+    ('/users_team_list?limit=abc', {'id': 1}, 400),
+    ('/remove_user_from_team', {'id': 1, 'users': 'all'}, 400),
+])
+def test_membership_errors(teams, client, url, payload, status):
+    response = client.post(url, json=payload)
+    assert response.status_code == status
+    assert 'error' in response.json
+
+
+def test_page_statements_do_not_grow_with_the_team(teams, client):
+    for team_id in (1, 2, 3):
+        # the first request also loads the team into the entity cache
+        client.post('/teams_user_list', json={'id': team_id})
+    counts = {(team_id, after_id): count_statements(teams, client, '/teams_user_list?limit=5&after_id={}'
+                                                    .format(after_id), {'id': team_id})
+              for team_id, after_id in ((3, 0), (1, 0), (2, 0), (2, 20), (2, 35))}
+    assert len(set(counts.values())) == 1, counts
+    for user_id in (40, 1):
+        client.post('/users_team_list', json={'id': user_id})
+    assert count_statements(teams, client, '/users_team_list?limit=5', {'id': 40}) == \
+        count_statements(teams, client, '/users_team_list?limit=5', {'id': 1})
+
+
+@pytest.fixture
+def stock_variable_limit(app):
+    """
+    Limit the bound parameters of a statement to 999, as in SQLite builds before 3.32.
+    """
+    def limit(dbapi_connection, connection_record):
+        dbapi_connection.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 999)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'connect', limit)
+    engine.dispose()
+    yield
+    event.remove(engine, 'connect', limit)
+    engine.dispose()
+
+
+def test_large_membership_changes_are_chunked(app, client, stock_variable_limit):
+    add_users(app, 1500)
+    add_teams(app, 1)
+    add_members(app, 1, range(1, 11))
+    app.config['TEAM_MEMBERSHIP_MAX_USERS'] = 2000
+    user_ids = list(range(1, 1501)) + [1, 9999]
+    response = client.patch('/add_user_to_team', json={'id': 1, 'users': user_ids})
+    assert response.status_code == 200
+    assert response.json['added'] == 1490
+    response = client.post('/remove_user_from_team', json={'id': 1, 'users': user_ids})
+    assert response.status_code == 200
+    assert response.json['removed'] == 1500
+
+
+def test_membership_cap(teams, client):
+    response = client.patch('/add_user_to_team', json={'id': 3, 'users': list(range(1, 52))})
+    assert response.status_code == 400
+    assert 'error' in response.json
+    response = client.patch('/add_user_to_team', json={'id': 3, 'users': list(range(1, 51))})
+    assert response.json['added'] == 39
+    response = client.patch('/add_user_to_team', json={'users': [1]})
+    assert response.status_code == 400
+    assert response.json['error'] == {'id': ['Missing data for required field.']}
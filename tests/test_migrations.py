@@ -0,0 +1,76 @@
+import sqlite3
+
+from sqlalchemy import create_engine, inspect, text
+
+from board_export import board_rows_statement, board_tasks_statement
+from conftest import add_boards, add_teams, add_users, insert
+from database.database import db
+from database.flask_models import Task
+from database.migrations import MIGRATIONS, migrate
+
+# The schema of a database created before the migrations, task.user_id was a string
+LEGACY_SCHEMA = """
+CREATE TABLE user (id INTEGER PRIMARY KEY, user_name VARCHAR(64) UNIQUE, display_name VARCHAR(64), creation_time DATETIME);
+CREATE TABLE team (id INTEGER PRIMARY KEY, name VARCHAR NOT NULL UNIQUE, description VARCHAR,
+                   admin INTEGER NOT NULL REFERENCES user (id), creation_time DATETIME);
+CREATE TABLE user_team (user_id INTEGER REFERENCES user (id), team_id INTEGER REFERENCES team (id),
+                        PRIMARY KEY (user_id, team_id));
+CREATE TABLE board (id INTEGER PRIMARY KEY, name VARCHAR(64) NOT NULL, description VARCHAR(128),
+                    team_id INTEGER NOT NULL REFERENCES team (id), creation_time DATETIME, status VARCHAR(6),
+                    CONSTRAINT unique_board_name_for_team UNIQUE (name, team_id));
+CREATE TABLE task (id INTEGER PRIMARY KEY, title VARCHAR(64) UNIQUE, description VARCHAR(128), user_id VARCHAR(64),
+                   creation_time DATETIME, status VARCHAR(11), board_id INTEGER NOT NULL REFERENCES board (id),
+                   CONSTRAINT unique_task_title_for_board UNIQUE (title, board_id));
+CREATE INDEX ix_task_creation_time ON task (creation_time);
+INSERT INTO user VALUES (1, 'alice', 'Alice', '2024-01-01 00:00:00');
+INSERT INTO team VALUES (1, 'core', 'Core', 1, '2024-01-01 00:00:00');
+INSERT INTO user_team VALUES (1, 1);
+INSERT INTO board VALUES (1, 'main', 'Main', 1, '2024-01-01 00:00:00', 'OPEN');
+INSERT INTO task VALUES (1, 'first', 'First', '1', '2024-01-01 00:00:00', 'OPEN', 1);
+INSERT INTO task VALUES (2, 'second', 'Second', '1', '2024-01-01 00:01:00', 'COMPLETE', 1);
+"""
+
+
+def query_plan(connection, statement):
+    compiled = statement.compile(connection, compile_kwargs={'literal_binds': True})
+    return [row[-1] for row in connection.execute(text('EXPLAIN QUERY PLAN {}'.format(compiled)))]
+
+
+def test_migrate_legacy_database(tmp_path):
+    path = str(tmp_path / 'legacy.database')
+    legacy = sqlite3.connect(path)
+    legacy.executescript(LEGACY_SCHEMA)
+    legacy.close()
+    engine = create_engine('sqlite:///' + path)
+
+    assert migrate(engine) == [version for version, _ in MIGRATIONS]
+    assert migrate(engine) == []
+
+    with engine.connect() as connection:
+        assert connection.execute(text('PRAGMA user_version')).scalar() == MIGRATIONS[-1][0]
+        columns = {column['name']: column for column in inspect(connection).get_columns('task')}
+        assert str(columns['user_id']['type']).upper().startswith('INTEGER')
+        assert connection.execute(text('SELECT id, user_id, typeof(user_id) FROM task ORDER BY id')).all() == \
+            [(1, 1, 'integer'), (2, 1, 'integer')]
+        indexes = {index['name'] for index in inspect(connection).get_indexes('task')}
+        assert {index.name for index in Task.__table__.indexes if index.name} <= indexes
+        assert 'ix_board_team_id' in {index['name'] for index in inspect(connection).get_indexes('board')}
+        # the counters and the search index are built from the existing tasks
+        assert connection.execute(text('SELECT status, count FROM board_status_count ORDER BY status')).all() == \
+            [('COMPLETE', 1), ('OPEN', 1)]
+        assert connection.execute(text("SELECT rowid FROM task_fts WHERE task_fts MATCH 'second'")).all() == [(2,)]
+    engine.dispose()
+
+
+def test_export_queries_use_indexes(app):
+    add_users(app, 3)
+    add_teams(app, 1)
+    add_boards(app, [1, 1])
+    insert(app, Task, ({'title': 'task{}'.format(i), 'user_id': i % 3 + 1, 'status': 'OPEN', 'board_id': i % 2 + 1}
+                       for i in range(20)))
+    with app.app_context():
+        connection = db.session.connection()
+        for statement in (board_rows_statement(1), board_tasks_statement(1)):
+            plan = query_plan(connection, statement)
+            assert not [step for step in plan if step.startswith('SCAN ')], plan
+            assert any('USING INTEGER PRIMARY KEY' in step for step in plan if 'user' in step), plan
@@ -0,0 +1,104 @@
+import pytest
+
+from conftest import add_boards, add_teams, add_users, created, insert
+from database.flask_models import Task
+
+STATUSES = ('OPEN', 'IN_PROGRESS', 'COMPLETE')
+
+
+@pytest.fixture
+def tasks(app):
+    """
+    Boards 1 and 2 belong to team 1, board 3 to team 2. Task i is created i minutes after the epoch,
+    assigned to user i % 3 + 1, on board i % 3 + 1, in status STATUSES[i % 2].
+    """
+    add_users(app, 3)
+    add_teams(app, 2)
+    add_boards(app, [1, 1, 2])
+    insert(app, Task, ({'id': i, 'title': 'task{}'.format(i), 'description': 'Task', 'user_id': i % 3 + 1,
+                        'status': STATUSES[i % 2], 'board_id': i % 3 + 1, 'creation_time': created(i)}
+                       for i in range(1, 31)))
+    return app
+
+
+def query_all(client, payload):
+    """
+    Follow the X-Next-Cursor headers of a query to the last page.
+    :return: the ids of every page
+    """
+    pages = []
+    while True:
+        response = client.post('/query_tasks', json=payload)
+        assert response.status_code == 200, response.json
+        pages.append([task['id'] for task in response.json])
+        cursor = response.headers.get('X-Next-Cursor')
+        if cursor is None:
+            return pages
+        payload = dict(payload, cursor=cursor)
+
+
+@pytest.mark.parametrize('filters, expected', [
+    ({'user_id': 2}, [i for i in range(1, 31) if i % 3 == 1]),
+    ({'status': 'IN_PROGRESS'}, [i for i in range(1, 31) if i % 2]),
+    ({'board_id': 3, 'status': 'OPEN'}, [i for i in range(1, 31) if i % 3 == 2 and i % 2 == 0]),
+    ({'team_id': 1}, [i for i in range(1, 31) if i % 3 != 2]),
+    ({'team_id': 2, 'user_id': 3}, [i for i in range(1, 31) if i % 3 == 2]),
+    ({'created_after': created(10).isoformat(), 'created_before': created(15).isoformat()}, [10, 11, 12, 13, 14]),
+    ({'user_id': 1, 'status': 'OPEN', 'created_after': '2024-01-01T00:12:00+00:00'}, [12, 18, 24, 30]),
+])
+def test_filters(tasks, client, filters, expected):
+    response = client.post('/query_tasks', json=filters)
+    assert response.status_code == 200
+    assert [task['id'] for task in response.json] == expected
+    assert 'X-Next-Cursor' not in response.headers
+
+
+def test_times_with_an_offset_are_converted_to_utc(tasks, client):
+    response = client.post('/query_tasks', json={'created_after': '2024-01-01T01:28:00+01:00'})
+    assert [task['id'] for task in response.json] == [28, 29, 30]
+
+
+def test_task_fields(tasks, client):
+    task, = client.post('/query_tasks', json={'created_after': created(30).isoformat()}).json
+    assert task == {'id': 30, 'title': 'task30', 'description': 'Task', 'user_id': 1, 'status': 'OPEN',
+                    'board_id': 1, 'creation_time': created(30).isoformat()}
+
+
+@pytest.mark.parametrize('order', ['asc', 'desc'])
+def test_cursor_pages(tasks, client, order):
+    pages = query_all(client, {'team_id': 1, 'order': order, 'limit': 7})
+    ids = [i for i in range(1, 31) if i % 3 != 2]
+    if order == 'desc':
+        ids.reverse()
+    assert pages == [ids[start:start + 7] for start in range(0, len(ids), 7)]
+
+
+def test_cursor_pages_on_equal_creation_times(app, client):
+    add_users(app, 1)
+    add_teams(app, 1)
+    add_boards(app, [1])
+    insert(app, Task, ({'id': i, 'title': 'task{}'.format(i), 'user_id': 1, 'status': 'OPEN', 'board_id': 1,
+                        'creation_time': created(i // 4)} for i in range(1, 11)))
+    assert query_all(client, {'board_id': 1, 'limit': 3}) == [[1, 2, 3], [4, 5, 6], [7, 8, 9], [10]]
+
+
+def test_full_last_page_has_a_cursor_to_an_empty_page(tasks, client):
+    pages = query_all(client, {'board_id': 2, 'limit': 5})
+    assert pages == [[1, 4, 7, 10, 13], [16, 19, 22, 25, 28], []]
+
+
+@pytest.mark.parametrize('payload', [
+    {},
+    {'order': 'desc'},
+    {'status': 'DONE'},
+    {'user_id': 'abc'},
+    {'board_id': 1, 'limit': 0},
+    {'board_id': 1, 'order': 'sideways'},
+    {'created_after': 'yesterday'},
+    {'board_id': 1, 'cursor': 'not a cursor'},
+    {'board_id': 1, 'cursor': 'WyIyMDI0LTAxLTAxVDAwOjAwOjAwIiwgImEiXQ=='},
+])
+def test_invalid_queries(tasks, client, payload):
+    response = client.post('/query_tasks', json=payload)
+    assert response.status_code == 400
+    assert 'error' in response.json
@@ -0,0 +1,105 @@
+import pytest
+from sqlalchemy import text, update
+
+from conftest import add_boards, add_teams, add_users, created, insert
+from database.database import db
+from database.flask_models import Task
+from database.migrations import migrate
+
+
+@pytest.fixture
+def boards(app):
+    """
+    Boards 1 and 2 belong to team 1, board 3 to team 2.
+    """
+    add_users(app, 2)
+    add_teams(app, 2)
+    add_boards(app, [1, 1, 2])
+    return app
+
+
+def search(client, **payload):
+    response = client.post('/search_tasks', json=payload)
+    assert response.status_code == 200, response.json
+    return [task['id'] for task in response.json]
+
+
+def add_task(client, title, description='', board_id=1):
+    response = client.post('/add_task', json={'title': title, 'description': description, 'user_id': 1,
+                                              'board_id': board_id})
+    assert response.status_code == 201
+    return response.json['id']
+
+
+def test_written_tasks_are_found(boards, client):
+    deploy = add_task(client, 'Deploy the API', 'Roll out to production')
+    response = client.post('/add_tasks', json=[
+        {'title': 'Fix the deploy script', 'description': 'It fails', 'user_id': 2, 'board_id': 2},
+        {'title': 'Write docs', 'description': 'Deployment guide', 'user_id': 2, 'board_id': 3},
+    ])
+    script, docs = [result['id'] for result in response.json['results']]
+
+    assert sorted(search(client, query='deploy')) == [deploy, script]
+    # titles weigh more than descriptions
+    found = search(client, query='deploy*')
+    assert sorted(found[:2]) == [deploy, script] and found[2] == docs
+    assert search(client, query='production') == [deploy]
+    assert search(client, query='deploy*', team_id=2) == [docs]
+    assert search(client, query='deploy*', board_id=2) == [script]
+
+    client.post('/update_task', json={'id': script, 'status': 'COMPLETE'})
+    assert search(client, query='deploy', status='COMPLETE') == [script]
+    assert search(client, query='deploy', status='OPEN') == [deploy]
+
+
+def test_renamed_tasks_are_found_by_their_new_title(boards, client):
+    task_id = add_task(client, 'Deploy the API')
+    with boards.app_context():
+        db.session.execute(update(Task).where(Task.id == task_id).values(title='Release the API'))
+        db.session.commit()
+    assert search(client, query='deploy') == []
+    assert search(client, query='release') == [task_id]
+    with boards.app_context():
+        db.session.execute(Task.__table__.delete().where(Task.id == task_id))
+        db.session.commit()
+    assert search(client, query='release') == []
+
+
+def test_pages_and_truncation(boards, client):
+    insert(boards, Task, ({'id': i, 'title': 'report {}'.format(i), 'user_id': 1, 'status': 'OPEN', 'board_id': 1,
+                           'creation_time': created(i)} for i in range(1, 8)))
+    response = client.post('/search_tasks', json={'query': 'report', 'limit': 5})
+    assert response.headers['X-Next-Offset'] == '5'
+    assert 'X-Search-Truncated' not in response.headers
+    assert len(search(client, query='report', limit=5, offset=5)) == 2
+
+    boards.config['SEARCH_MAX_CANDIDATES'] = 3
+    response = client.post('/search_tasks', json={'query': 'report'})
+    # only the most recent matches are ranked
+    assert sorted(task['id'] for task in response.json) == [5, 6, 7]
+    assert response.headers['X-Search-Truncated'] == 'true'
+    response = client.post('/search_tasks', json={'query': 'report', 'board_id': 2})
+    assert 'X-Search-Truncated' not in response.headers
+
+
+@pytest.mark.parametrize('payload', [{}, {'query': ''}, {'query': '***'}, {'query': 'x', 'status': 'DONE'}])
+def test_invalid_searches(boards, client, payload):
+    response = client.post('/search_tasks', json=payload)
+    assert response.status_code == 400
+    assert 'error' in response.json
+
+
+def test_migration_builds_the_index_of_an_existing_database(boards, client):
+    insert(boards, Task, ({'id': i, 'title': 'report {}'.format(i), 'user_id': 1, 'status': 'OPEN', 'board_id': 1,
+                           'creation_time': created(i)} for i in range(1, 4)))
+    with boards.app_context():
+        with db.engine.begin() as connection:
+            for trigger in ('task_fts_insert', 'task_fts_update', 'task_fts_delete'):
+                connection.execute(text('DROP TRIGGER {}'.format(trigger)))
+            connection.execute(text('DROP TABLE task_fts'))
+            connection.execute(text('PRAGMA user_version = 2'))
+        assert migrate(db.engine)[0] == 3
+    assert sorted(search(client, query='report')) == [1, 2, 3]
+    # the triggers are back
+    task_id = add_task(client, 'Quarterly report')
+    assert search(client, query='quarterly') == [task_id]
@@ -0,0 +1,202 @@
+import pytest
+from sqlalchemy import select, text
+
+from conftest import SHARDS, add_teams, add_users, created, insert
+from database.database import db, shard_scope
+from database.flask_models import ShardBlock, Task, Team
+from database.sharding import SHARD_ID_SPAN, move_team, rebalance, status
+
+
+@pytest.fixture
+def teams(sharded_app):
+    """
+    Team 1 has its board in shard1, team 2 in shard0. Task i, titled "deploy <i>", is created i minutes after
+    the epoch on the board of team i % 2 + 1, tasks 1 to 6 belong to user 1 and 7, 8 to user 2.
+    :return: the app and {team_id: board_id}
+    """
+    add_users(sharded_app, 2)
+    add_teams(sharded_app, 2)
+    client = sharded_app.test_client()
+    boards = {}
+    for team_id in (1, 2):
+        response = client.post('/create_board', json={'name': 'board{}'.format(team_id), 'description': 'Board',
+                                                      'team_id': team_id})
+        assert response.status_code == 201
+        boards[team_id] = response.json['id']
+    for i in range(1, 9):
+        team_id = i % 2 + 1
+        insert_in(sharded_app, SHARDS[team_id % 2], Task, [{
+            'title': 'deploy {}'.format(i), 'description': 'Step {}'.format(i), 'user_id': 1 if i <= 6 else 2,
+            'status': 'OPEN', 'board_id': boards[team_id], 'creation_time': created(i)}])
+    return sharded_app, boards
+
+
+def insert_in(app, bind_key, model, rows):
+    with app.app_context(), shard_scope(bind_key):
+        db.session.execute(model.__table__.insert(), list(rows))
+        db.session.commit()
+
+
+def titles(response):
+    assert response.status_code == 200, response.json
+    return [task['title'] for task in response.json]
+
+
+def test_boards_and_tasks_are_kept_in_the_shard_of_their_team(teams):
+    app, boards = teams
+    with app.app_context():
+        for bind_key, board_id in zip(SHARDS, (boards[2], boards[1])):
+            with shard_scope(bind_key):
+                assert db.session.execute(db.select(Task.board_id).distinct()).scalars().all() == [board_id]
+
+
+def test_searches_without_board_and_team_read_every_shard(teams):
+    app, boards = teams
+    client = app.test_client()
+    found = titles(client.post('/search_tasks', json={'query': 'deploy'}))
+    assert sorted(found) == ['deploy {}'.format(i) for i in range(1, 9)]
+
+    # pages of the merged ranking follow each other
+    first = client.post('/search_tasks', json={'query': 'deploy', 'limit': 5})
+    assert first.headers['X-Next-Offset'] == '5'
+    second = titles(client.post('/search_tasks', json={'query': 'deploy', 'limit': 5, 'offset': 5}))
+    assert titles(first) + second == found
+    ranks = [(task['rank'], task['id']) for task in client.post('/search_tasks', json={'query': 'deploy'}).json]
+    assert ranks == sorted(ranks)
+
+    assert titles(client.post('/search_tasks', json={'query': 'deploy', 'team_id': 1})) \
+        == titles(client.post('/search_tasks', json={'query': 'deploy', 'board_id': boards[1]}))
+    assert sorted(titles(client.post('/search_tasks', json={'query': 'step', 'team_id': 2}))) \
+        == ['deploy {}'.format(i) for i in (1, 3, 5, 7)]
+
+
+def test_truncated_searches_of_any_shard(teams):
+    app, _ = teams
+    client = app.test_client()
+    app.config['SEARCH_MAX_CANDIDATES'] = 3
+    response = client.post('/search_tasks', json={'query': 'deploy'})
+    # the 3 most recent matches of each shard
+    assert sorted(titles(response)) == ['deploy {}'.format(i) for i in range(3, 9)]
+    assert response.headers['X-Search-Truncated'] == 'true'
+    app.config['SEARCH_MAX_CANDIDATES'] = 4
+    assert 'X-Search-Truncated' not in client.post('/search_tasks', json={'query': 'deploy'}).headers
+
+
+def test_invalid_reads_of_the_sharded_mode(teams):
+    app, _ = teams
+    client = app.test_client()
+    assert client.post('/search_tasks', json={'query': 'deploy', 'board_id': 'x'}).status_code == 400
+    assert client.post('/search_tasks', json={}).status_code == 400
+    assert client.post('/query_tasks', json={}).status_code == 400
+
+
+def test_queries_without_board_and_team_read_every_shard(teams):
+    app, _ = teams
+    client = app.test_client()
+    # the tasks of user 1 are on the boards of both shards
+    first = client.post('/query_tasks', json={'user_id': 1, 'limit': 4})
+    assert titles(first) == ['deploy {}'.format(i) for i in range(1, 5)]
+    second = client.post('/query_tasks', json={'user_id': 1, 'limit': 4, 'cursor': first.headers['X-Next-Cursor']})
+    assert titles(second) == ['deploy 5', 'deploy 6']
+    assert 'X-Next-Cursor' not in second.headers
+
+    response = client.post('/query_tasks', json={'user_id': 1, 'order': 'desc', 'limit': 3})
+    assert titles(response) == ['deploy 6', 'deploy 5', 'deploy 4']
+    response = client.post('/query_tasks', json={'user_id': 1, 'order': 'desc',
+                                                  'cursor': response.headers['X-Next-Cursor']})
+    assert titles(response) == ['deploy 3', 'deploy 2', 'deploy 1']
+
+    assert titles(client.post('/query_tasks', json={'user_id': 2, 'status': 'OPEN'})) == ['deploy 7', 'deploy 8']
+    assert titles(client.post('/query_tasks', json={'created_after': created(7).isoformat()})) \
+        == ['deploy 7', 'deploy 8']
+    assert titles(client.post('/query_tasks', json={'user_id': 1, 'team_id': 2})) \
+        == ['deploy 1', 'deploy 3', 'deploy 5']
+
+
+def test_batches_spanning_shards_are_rejected(teams):
+    app, boards = teams
+    client = app.test_client()
+    ids = {task['title']: task['id'] for task in client.post('/query_tasks', json={'user_id': 1}).json}
+
+    def task(title, board_id):
+        return {'title': title, 'description': 'New', 'user_id': 1, 'board_id': board_id}
+
+    response = client.post('/add_tasks', json=[task('a', boards[1]), task('b', boards[2]), task('c', boards[1]),
+                                                task('d', boards[2])])
+    assert response.status_code == 400
+    assert '[1, 3]' in response.json['error']
+    response = client.post('/update_tasks', json={'tasks': [{'id': ids['deploy 2'], 'status': 'COMPLETE'},
+                                                             {'id': ids['deploy 1'], 'status': 'COMPLETE'}]})
+    assert response.status_code == 400
+    assert '[1]' in response.json['error']
+    assert titles(client.post('/query_tasks', json={'status': 'COMPLETE'})) == []
+
+    # a batch within one shard, items of unknown boards are reported by the view
+    response = client.post('/add_tasks', json=[task('a', 99), task('b', boards[2]), task('c', boards[2])])
+    assert response.status_code == 207
+    assert [result['status'] for result in response.json['results']] == [404, 201, 201]
+    assert titles(client.post('/query_tasks', json={'team_id': 2, 'created_after': created(9).isoformat()})) \
+        == ['b', 'c']
+    response = client.post('/update_tasks', json={'tasks': [{'id': ids['deploy 1'], 'status': 'COMPLETE'},
+                                                             {'id': ids['deploy 3'], 'status': 'COMPLETE'}]})
+    assert response.json == {'updated': {'COMPLETE': 2}}
+    assert client.post('/add_tasks', json=[task('e', 99)]).json['results'] == [{'status': 404,
+                                                                                'error': 'Board not found'}]
+
+
+def shard_paths(app):
+    with app.app_context():
+        return db.engine.url.database, [db.engines[key].url.database for key in SHARDS]
+
+
+def shard_counts(app, bind_key):
+    with app.app_context(), shard_scope(bind_key):
+        return {name: db.session.execute(text('SELECT COUNT(*) FROM {}'.format(name))).scalar()
+                for name in ('board', 'task', 'board_status_count', 'task_fts')}
+
+
+def test_moved_teams_keep_their_ids(teams):
+    app, boards = teams
+    client = app.test_client()
+    global_path, paths = shard_paths(app)
+    before = client.post('/query_tasks', json={'team_id': 1}).json
+    summary = client.post('/board_summary', json={'team_id': 1}).json
+
+    assert move_team(global_path, paths, 1, 0) == (1, 4)
+    assert shard_counts(app, 'shard1') == {'board': 0, 'task': 0, 'board_status_count': 0, 'task_fts': 0}
+    assert shard_counts(app, 'shard0') == {'board': 2, 'task': 8, 'board_status_count': 2, 'task_fts': 8}
+    # the triggers of the target rebuilt its counters and search index
+    assert client.post('/query_tasks', json={'team_id': 1}).json == before
+    assert client.post('/board_summary', json={'team_id': 1}).json == summary
+    assert sorted(titles(client.post('/search_tasks', json={'query': 'deploy', 'board_id': boards[1]}))) \
+        == ['deploy {}'.format(i) for i in (2, 4, 6, 8)]
+
+    # the ids moved in are above the block of shard0, it draws new ones from a fresh block
+    response = client.post('/add_task', json={'title': 'new', 'description': 'New', 'user_id': 1,
+                                              'board_id': boards[1]})
+    assert response.status_code == 201
+    with app.app_context():
+        blocks = dict(db.session.execute(select(ShardBlock.block, ShardBlock.shard)).all())
+    assert blocks == {1: 0, 2: 1, 3: 0}
+    assert response.json['id'] // SHARD_ID_SPAN == 3
+    assert status(global_path, paths)[0]['block'] == 3
+
+
+def test_rebalance_evens_out_the_shards(teams):
+    app, boards = teams
+    client = app.test_client()
+    insert(app, Team, [{'id': 3, 'name': 'team3', 'description': 'Team 3', 'admin': 1, 'creation_time': created(3)}])
+    response = client.post('/create_board', json={'name': 'board3', 'description': 'Board', 'team_id': 3})
+    # team 3 is pinned to shard1 next to team 1, which gets 2 more tasks
+    board_id = response.json['id']
+    assert client.post('/add_tasks', json=[{'title': 'task{}'.format(i), 'description': 'Task', 'user_id': 1,
+                                            'board_id': (board_id, boards[1])[i // 2]}
+                                           for i in range(4)]).status_code == 201
+    global_path, paths = shard_paths(app)
+    assert [shard['tasks'] for shard in status(global_path, paths)] == [4, 8]
+
+    # moving team 1 would only swap the shards
+    assert rebalance(global_path, paths, tolerance=0) == [(3, 1, 0, 2)]
+    assert [shard['tasks'] for shard in status(global_path, paths)] == [6, 6]
+    assert all(shard['stray_boards'] == 0 for shard in status(global_path, paths))
+    assert sorted(titles(client.post('/query_tasks', json={'team_id': 3}))) == ['task0', 'task1']